@@ -11,6 +11,7 @@ import re
 from typing import Dict, List
 
 from .cache import LicenseReportEntry
+from .prefixes import PrefixTrie
 
 
 class LicenseAcceptor(abc.ABC):
@@ -36,6 +37,8 @@ class JsonFileLicenseAcceptor(LicenseAcceptor):
        Any license that does not pass its acceptance is assumed to be rejected and
        not left as unknown. Hence if you support a series of acceptors, you probably
        need this one to be the last one in the list.
+
+       Raises a ValueError if a moduleName pattern is not a valid regular expression.
     """
 
     def __init__(self, json_data):
@@ -45,9 +48,7 @@ class JsonFileLicenseAcceptor(LicenseAcceptor):
         if entry.license_name:
             allowed = self._allowed_licenses.get(entry.license_name, None)
             if allowed:
-                for lic in allowed:
-                    if self._entry_matches(entry, lic):
-                        return True
+                return allowed.matches(entry.package)
             return False
         return None
 
@@ -55,35 +56,75 @@ class JsonFileLicenseAcceptor(LicenseAcceptor):
     def _get_allowed_licenses_from_json(cls, json_data) -> Dict:
         allowed = {}
         for lic in json_data['allowedLicenses']:
-            cls._get_list_by_license(allowed, lic).append(lic)
+            index = allowed.get(lic['moduleLicense'], None)
+            if index is None:
+                index = _PackageIndex()
+                allowed[lic['moduleLicense']] = index
+            index.add(lic.get('moduleName', None))
+        for index in allowed.values():
+            index.compile()
         return allowed
 
-    @classmethod
-    def _get_list_by_license(cls, allowed: Dict, lic: Dict) -> List:
-        lst = allowed.get(lic['moduleLicense'], None)
-        if lst is None:
-            lst = []
-            allowed[lic['moduleLicense']] = lst
-        return lst
 
-    @classmethod
-    def _entry_matches(cls, entry: LicenseReportEntry, allowed_license: Dict) -> bool:
-        if entry.license_name != allowed_license['moduleLicense']:
-            return False
-        if not cls._pattern_matches(entry.package, allowed_license.get('moduleName', None)):
-            return False
-        return True
+class _PackageIndex:
+    """Index of the moduleName patterns allowed for a single license. Plain names are
+       kept in a set, patterns whose only wildcard is a trailing '*' in a prefix trie,
+       and all the others in a single regular expression, so matching a package does
+       not depend on the number of patterns. Patterns that cannot be combined with the
+       others are matched one at a time.
+    """
 
-    @classmethod
-    def _pattern_matches(cls, package: str, pattern: str) -> bool:
+    _REGEX_CHARACTERS = set('\\^$*+?{}[]|()')
+
+    def __init__(self):
+        self.matches_all = False
+        self.names = set()
+        self.prefixes = PrefixTrie()
+        self.patterns = []
+        self.regex = None
+        self.separate_regexes = []
+
+    def add(self, pattern: str):
+        """Add a moduleName pattern. An empty or missing pattern matches every package.
+           Raises a ValueError if the pattern is not a valid regular expression.
+        """
         if not pattern:
+            self.matches_all = True
+            return
+        self.names.add(pattern)
+        if pattern.endswith('*') and not self._REGEX_CHARACTERS.intersection(pattern[:-1]):
+            self.prefixes.add(pattern[:-1], pattern)
+        elif self._REGEX_CHARACTERS.intersection(pattern):
+            regex = pattern.replace('.', '\\.').replace('*', '.*')
+            try:
+                self.patterns.append(re.compile(regex))
+            except re.error as ex:
+                raise ValueError("invalid moduleName pattern '%s': %s" % (pattern, ex)) from ex
+
+    def compile(self):
+        """Combine the regular expression patterns, once all of them have been added.
+           Patterns with groups are kept separate, as combining them would renumber
+           the groups their backreferences refer to. If the combined pattern is still
+           not valid, e.g. due to an inline flag, every pattern is kept separate.
+        """
+        combined = [regex.pattern for regex in self.patterns if regex.groups == 0]
+        self.separate_regexes = [regex for regex in self.patterns if regex.groups > 0]
+        self.regex = None
+        if combined:
+            try:
+                self.regex = re.compile('|'.join('(?:%s)' % p for p in combined))
+            except re.error:
+                self.separate_regexes = self.patterns
+
+    def matches(self, package: str) -> bool:
+        """Returns True if the package matches any of the patterns."""
+        if self.matches_all or package in self.names:
             return True
-        if package == pattern:
+        if self.prefixes.has_match(package):
             return True
-        regex = pattern.replace('.', '\\.').replace('*', '.*')
-        if re.fullmatch(regex, package) is not None:
+        if self.regex is not None and self.regex.fullmatch(package) is not None:
             return True
-        return False
+        return any(regex.fullmatch(package) is not None for regex in self.separate_regexes)
 
 
 def accept_all(entries: List[LicenseReportEntry],
@@ -93,12 +134,15 @@ def accept_all(entries: List[LicenseReportEntry],
     """
     unaccepted = []
     for entry in entries:
-        if not _try_all_acceptors(entry, acceptors):
+        if not is_accepted(entry, acceptors):
             unaccepted.append(entry)
     return unaccepted
 
 
-def _try_all_acceptors(entry: LicenseReportEntry, acceptors: List[LicenseAcceptor]):
+def is_accepted(entry: LicenseReportEntry, acceptors: List[LicenseAcceptor]) -> bool:
+    """Compare a single entry against all the acceptors, returning True if its
+       license has been accepted.
+    """
     if acceptors is not None:
         for acceptor in acceptors:
             result = acceptor.accept_or_reject(entry)
@@ -2,16 +2,25 @@
 """Results caching
 
 This module defines the API used for caching the license results as well as provides
-a simple file based cache implementation.
+a simple JSON file based cache implementation and an SQLite based one for large caches.
+
+Both implementations store each distinct encoded license text only once, keyed by its
+hash, and have the cached entries refer to it by that hash.
 """
 
 import abc
+import hashlib
 import json
 import logging
+import mmap
+import os
 import pathlib
+import sqlite3
+import threading
 
 from dataclasses import asdict
 from dataclasses import dataclass
+from typing import Dict, List
 
 @dataclass
 class LicenseReportEntry:
@@ -24,6 +33,11 @@ class LicenseReportEntry:
     license_recognized_at: str = None
     dependancy_scanner_name: str = None
     license_recognizer_name: str = None
+    license_etag: str = None
+    license_last_modified: str = None
+    license_failure: str = None
+    dependancy_is_indirect: bool = None
+    dependancy_version: str = None
 
     def __eq__(self, other):
         if isinstance(other, LicenseReportEntry):
@@ -33,10 +47,23 @@ class LicenseReportEntry:
                     self.license_encoded == other.license_encoded and
                     self.license_recognized_at == other.license_recognized_at and
                     self.dependancy_scanner_name == other.dependancy_scanner_name and
-                    self.license_recognizer_name == other.license_recognizer_name)
+                    self.license_recognizer_name == other.license_recognizer_name and
+                    self.license_etag == other.license_etag and
+                    self.license_last_modified == other.license_last_modified and
+                    self.license_failure == other.license_failure and
+                    self.dependancy_is_indirect == other.dependancy_is_indirect and
+                    self.dependancy_version == other.dependancy_version)
         return False
 
 
+def license_text_hash(license_encoded: str) -> str:
+    """Returns the hash identifying a base64 encoded license text. The hash is of the
+       encoding itself, so an entry is always read back with the very encoding it was
+       written with.
+    """
+    return hashlib.sha256(license_encoded.encode('ascii')).hexdigest()
+
+
 class LicenseCache(abc.ABC):
     """API for caching license results."""
 
@@ -55,44 +82,449 @@ class LicenseCache(abc.ABC):
 
 
 class JsonFileLicenseCache(LicenseCache):
-    """Cache implementation using a simple JSON file."""
+    """Cache implementation using a simple JSON file.
 
-    def __init__(self, filename: str):
+       If journal is True, the cache file is not rewritten as entries change. Instead
+       each written entry is immediately appended, as a line of JSON, to a journal file
+       next to the cache file. The journal is replayed when the cache is loaded, and is
+       compacted into the cache file when compact is called or when update_cache_file
+       finds it has grown beyond compact_threshold bytes. A journal left next to the
+       cache file is replayed even if journal is False, and is then compacted into the
+       cache file by the next update_cache_file.
+
+       If lazy is True, the cache file is not decoded when the cache is loaded. Instead
+       it is memory-mapped and only the entries that are actually read are decoded, using
+       an index of where each entry is in the file. The index is kept in a file next to
+       the cache file and is rebuilt whenever the cache file changes.
+
+       Cache files written before the license texts were stored separately are read
+       without any conversion, and are converted the next time they are written.
+    """
+
+    _JOURNAL_SUFFIX = ".journal"
+
+    def __init__(self,
+                 filename: str,
+                 journal: bool = False,
+                 compact_threshold: int = 1000000,
+                 lazy: bool = False):
         self.filename = filename
+        self.journal = journal
+        self.journal_filename = filename + self._JOURNAL_SUFFIX
+        self.compact_threshold = compact_threshold
         if not pathlib.Path(filename).exists():
             logging.info("Could not read %s, assuming an initially empty cache", filename)
-        self._resolved = self._read_cache_from_file()
+        # Reentrant, as write and compact read the stored entries while holding it.
+        self._lock = threading.RLock()
+        self._texts = {}
+        self._lazy_file = None
+        if lazy and pathlib.Path(filename).exists():
+            self._lazy_file = _open_lazy_json_file(filename)
+        self._resolved = {} if self._lazy_file is not None else self._read_cache_from_file()
         self._has_changed = False
+        self._replay_journal()
 
     def read(self, package: str) -> LicenseReportEntry:
-        jsn = self._resolved.get(package, None)
-        return None if jsn is None else LicenseReportEntry(**jsn)
+        jsn = self._get_stored(package)
+        if jsn is None:
+            return None
+        texts = {}
+        text_hash = jsn.get('license_hash', None)
+        if text_hash is not None:
+            texts[text_hash] = self._get_text(text_hash)
+        return LicenseReportEntry(**_join_license_text(jsn, texts))
 
     def write(self, entry: LicenseReportEntry):
-        jsn = asdict(entry)
-        self._resolved[entry.package] = jsn
-        self._has_changed = True
+        (jsn, text_hash) = _split_license_text(asdict(entry))
+        with self._lock:
+            is_new_text = text_hash is not None and self._get_text(text_hash) is None
+            if is_new_text:
+                self._texts[text_hash] = entry.license_encoded
+            self._resolved[entry.package] = jsn
+            self._has_changed = True
+            if self.journal:
+                with open(self.journal_filename, 'a') as journal_file:
+                    if is_new_text:
+                        text = {'license_hash': text_hash, 'license_encoded': entry.license_encoded}
+                        journal_file.write(json.dumps(text) + "\n")
+                    journal_file.write(json.dumps(jsn) + "\n")
 
     def update_cache_file(self) -> bool:
         """Creates or updates the cache file if there have been any changes. Returns
-           True if a change was made and False otherwise."""
-        if self._has_changed:
+           True if the cache file was written and False otherwise. When journaling, the
+           changes have already been written to the journal and the cache file itself is
+           only rewritten if the journal needs to be compacted."""
+        if self.journal:
+            if self._journal_size() <= self.compact_threshold:
+                return False
+        elif not self._has_changed:
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        """Rewrites the cache file with all the current entries and empties the journal."""
+        with self._lock:
+            if self._lazy_file is not None:
+                for package in self._lazy_file.packages():
+                    self._get_stored(package)
             resolved = list(self._resolved.values())
             resolved.sort(key=lambda lic: lic['package'])
-            jsn = {'resolved-licenses': resolved}
-            with open(self.filename, 'w') as json_file:
+            used_hashes = sorted({lic['license_hash'] for lic in resolved
+                                  if lic.get('license_hash', None) is not None})
+            jsn = {
+                'resolved-licenses': resolved,
+                'license-texts': {text_hash: self._get_text(text_hash)
+                                  for text_hash in used_hashes}
+            }
+            temp_filename = self.filename + ".tmp"
+            with open(temp_filename, 'w') as json_file:
                 json.dump(jsn, json_file, indent=4)
-            return True
-        return False
+            os.replace(temp_filename, self.filename)
+            if self._lazy_file is not None:
+                self._lazy_file.close()
+                self._lazy_file = _open_lazy_json_file(self.filename)
+            if self._journal_size() > 0:
+                logging.info("Compacted %s into %s", self.journal_filename, self.filename)
+                open(self.journal_filename, 'w').close()
+            self._has_changed = False
 
     def _read_cache_from_file(self):
         resolved = {}
         if pathlib.Path(self.filename).exists():
             with open(self.filename) as json_file:
                 data = json.load(json_file)
+                self._texts.update(data.get('license-texts', None) or {})
                 lics = data['resolved-licenses']
                 if lics is not None:
                     for lic in data['resolved-licenses']:
                         key = lic['package']
-                        resolved[key] = lic
+                        resolved[key] = self._to_stored_form(lic)
         return resolved
+
+    def _get_stored(self, package: str) -> Dict:
+        with self._lock:
+            jsn = self._resolved.get(package, None)
+            if jsn is None and self._lazy_file is not None:
+                lic = self._lazy_file.read_entry(package)
+                if lic is not None:
+                    jsn = self._to_stored_form(lic)
+                    self._resolved[package] = jsn
+            return jsn
+
+    def _get_text(self, text_hash: str) -> str:
+        with self._lock:
+            license_encoded = self._texts.get(text_hash, None)
+            if license_encoded is None and self._lazy_file is not None:
+                license_encoded = self._lazy_file.read_text(text_hash)
+                if license_encoded is not None:
+                    self._texts[text_hash] = license_encoded
+            return license_encoded
+
+    def _to_stored_form(self, lic: Dict) -> Dict:
+        license_encoded = lic.get('license_encoded', None)
+        (lic, text_hash) = _split_license_text(lic)
+        if text_hash is not None and license_encoded is not None:
+            self._texts.setdefault(text_hash, license_encoded)
+        return lic
+
+    def _replay_journal(self):
+        if not pathlib.Path(self.journal_filename).exists():
+            return
+        valid_length = 0
+        with open(self.journal_filename, 'rb') as journal_file:
+            for line in journal_file:
+                if not line.endswith(b"\n"):
+                    # Only the final write of a run that was interrupted can be torn,
+                    # so it is dropped to let new entries be appended after the others.
+                    logging.warning("Ignoring an incomplete entry in %s", self.journal_filename)
+                    break
+                valid_length += len(line)
+                try:
+                    lic = json.loads(line)
+                    if 'package' in lic:
+                        self._resolved[lic['package']] = lic
+                    else:
+                        self._texts[lic['license_hash']] = lic['license_encoded']
+                except (ValueError, LookupError, TypeError):
+                    logging.warning("Ignoring a corrupt entry in %s", self.journal_filename)
+                    continue
+                self._has_changed = True
+        if valid_length < self._journal_size():
+            os.truncate(self.journal_filename, valid_length)
+
+    def _journal_size(self) -> int:
+        path = pathlib.Path(self.journal_filename)
+        return path.stat().st_size if path.exists() else 0
+
+
+class _LazyJsonFile:
+    """Read only access to a JsonFileLicenseCache file that decodes only the entries and
+       license texts that are asked for. The file is memory-mapped and the position of
+       each item is found from an index file, which is built by decoding the whole file
+       once whenever the index is missing or out of date.
+    """
+
+    _INDEX_SUFFIX = ".index"
+    _INDEX_VERSION = 1
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.index_filename = filename + self._INDEX_SUFFIX
+        with open(filename, 'rb') as cache_file:
+            self._map = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(cache_file.fileno())
+        try:
+            index = self._read_index(stat)
+            if index is None:
+                index = self._build_index(stat)
+        except (OSError, ValueError, LookupError):
+            self._map.close()
+            raise
+        self._entries = index['entries']
+        self._texts = index['texts']
+
+    def packages(self) -> List[str]:
+        """Returns the names of all the packages in the file."""
+        return list(self._entries.keys())
+
+    def read_entry(self, package: str) -> Dict:
+        """Returns the decoded entry for the package, or None if there is none."""
+        return self._decode(self._entries.get(package, None))
+
+    def read_text(self, text_hash: str) -> str:
+        """Returns the license text with the given hash, or None if there is none."""
+        return self._decode(self._texts.get(text_hash, None))
+
+    def close(self):
+        """Releases the memory map."""
+        self._map.close()
+
+    def _decode(self, position: List[int]):
+        if position is None:
+            return None
+        return json.loads(self._map[position[0]:position[1]])
+
+    def _read_index(self, stat: os.stat_result) -> Dict:
+        try:
+            with open(self.index_filename) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if (index.get('version', None) != self._INDEX_VERSION or
+                index.get('size', None) != stat.st_size or
+                index.get('mtime_ns', None) != stat.st_mtime_ns):
+            return None
+        return index
+
+    def _build_index(self, stat: os.stat_result) -> Dict:
+        logging.info("Indexing %s", self.filename)
+        text = self._map[:].decode('utf-8')
+        if len(text) != len(self._map):
+            # The index holds byte positions, so the text positions found below can
+            # only be used if every character is a single byte.
+            raise ValueError("%s is not plain ASCII" % self.filename)
+        index = {
+            'version': self._INDEX_VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'entries': {},
+            'texts': {}
+        }
+
+        def add_entry(_, start, end, lic):
+            index['entries'][lic['package']] = [start, end]
+
+        def add_text(text_hash, start, end, _):
+            index['texts'][text_hash] = [start, end]
+
+        def index_value(key: str, start: int) -> (object, int):
+            if key == 'resolved-licenses' and text[start] == '[':
+                return (None, _scan_json_items(text, start, add_entry))
+            if key == 'license-texts' and text[start] == '{':
+                return (None, _scan_json_items(text, start, add_text))
+            return json.JSONDecoder().raw_decode(text, start)
+
+        _scan_json_items(text, _skip_whitespace(text, 0), lambda *args: None, index_value)
+        temp_filename = self.index_filename + ".tmp"
+        with open(temp_filename, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_filename, self.index_filename)
+        return index
+
+
+class SqliteLicenseCache(LicenseCache):
+    """Cache implementation using an SQLite database. Each entry is stored in its own
+       row keyed by the package name, so only the entries that are actually read are
+       ever loaded. Writes are collected and committed in a single transaction when
+       update_cache_file is called, or when batch_size of them are pending.
+
+       The database is opened in WAL mode, so other processes may keep reading it
+       while it is being updated.
+    """
+
+    _SCHEMA_VERSION = 2
+
+    def __init__(self, filename: str, batch_size: int = 500):
+        self.filename = filename
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_texts = {}
+        self._has_changed = False
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+    def read(self, package: str) -> LicenseReportEntry:
+        with self._lock:
+            jsn = self._pending.get(package, None)
+            if jsn is None:
+                row = self._connection.execute("SELECT entry FROM licenses WHERE package = ?",
+                                               (package,)).fetchone()
+                if row is None:
+                    return None
+                jsn = json.loads(row[0])
+            texts = {}
+            text_hash = jsn.get('license_hash', None)
+            if text_hash is not None:
+                texts[text_hash] = self._read_text(text_hash)
+        return LicenseReportEntry(**_join_license_text(jsn, texts))
+
+    def write(self, entry: LicenseReportEntry):
+        with self._lock:
+            self._add_pending(asdict(entry))
+            self._has_changed = True
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def update_cache_file(self) -> bool:
+        """Commits any pending changes to the database. Returns True if a change was
+           made since the database was opened and False otherwise."""
+        with self._lock:
+            self._flush()
+            return self._has_changed
+
+    def import_json_file(self, filename: str) -> int:
+        """Copies all the entries of a JsonFileLicenseCache file into the database,
+           replacing any that are already there. Returns the number of entries copied.
+        """
+        with open(filename) as json_file:
+            data = json.load(json_file)
+        lics = data['resolved-licenses'] or []
+        texts = data.get('license-texts', None) or {}
+        with self._lock:
+            for lic in lics:
+                self._add_pending(_join_license_text(lic, texts))
+            self._has_changed = self._has_changed or len(lics) > 0
+            self._flush()
+        logging.info("Imported %d entries from %s into %s", len(lics), filename, self.filename)
+        return len(lics)
+
+    def close(self):
+        """Commits any pending changes and closes the database."""
+        self.update_cache_file()
+        self._connection.close()
+
+    def _create_schema(self):
+        with self._connection:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > self._SCHEMA_VERSION:
+                raise RuntimeError("%s was created by a newer version of the license scanner"
+                                   % self.filename)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS licenses ("
+                                     " package TEXT PRIMARY KEY,"
+                                     " entry TEXT NOT NULL"
+                                     ") WITHOUT ROWID")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS license_texts ("
+                                     " hash TEXT PRIMARY KEY,"
+                                     " encoded TEXT NOT NULL"
+                                     ") WITHOUT ROWID")
+            self._connection.execute("PRAGMA user_version = %d" % self._SCHEMA_VERSION)
+
+    def _add_pending(self, jsn: Dict):
+        license_encoded = jsn.get('license_encoded', None)
+        (jsn, text_hash) = _split_license_text(jsn)
+        if text_hash is not None:
+            self._pending_texts.setdefault(text_hash, license_encoded)
+        self._pending[jsn['package']] = jsn
+
+    def _read_text(self, text_hash: str) -> str:
+        license_encoded = self._pending_texts.get(text_hash, None)
+        if license_encoded is None:
+            row = self._connection.execute("SELECT encoded FROM license_texts WHERE hash = ?",
+                                           (text_hash,)).fetchone()
+            if row is None:
+                logging.warning("The license text %s is missing from %s", text_hash, self.filename)
+                return None
+            license_encoded = row[0]
+        return license_encoded
+
+    def _flush(self):
+        if self._pending:
+            rows = [(package, json.dumps(jsn)) for (package, jsn) in self._pending.items()]
+            with self._connection:
+                self._connection.executemany("INSERT OR IGNORE INTO license_texts (hash, encoded)"
+                                             " VALUES (?, ?)", self._pending_texts.items())
+                self._connection.executemany("INSERT OR REPLACE INTO licenses (package, entry)"
+                                             " VALUES (?, ?)", rows)
+            self._pending = {}
+            self._pending_texts = {}
+
+
+def _split_license_text(jsn: Dict) -> (Dict, str):
+    # Returns a copy of an entry in which license_encoded has been replaced by the
+    # license_hash that refers to it, along with that hash.
+    jsn = dict(jsn)
+    license_encoded = jsn.pop('license_encoded', None)
+    if license_encoded is not None:
+        jsn['license_hash'] = license_text_hash(license_encoded)
+    return (jsn, jsn.get('license_hash', None))
+
+def _join_license_text(jsn: Dict, texts: Dict[str, str]) -> Dict:
+    # The reverse of _split_license_text, using the given texts to find the
+    # license_encoded that a license_hash refers to.
+    jsn = dict(jsn)
+    text_hash = jsn.pop('license_hash', None)
+    if text_hash is not None:
+        jsn['license_encoded'] = texts[text_hash]
+    return jsn
+
+def _open_lazy_json_file(filename: str) -> _LazyJsonFile:
+    try:
+        return _LazyJsonFile(filename)
+    except (OSError, ValueError, LookupError) as ex:
+        logging.warning("Could not index %s, reading all of it instead (%s)", filename, ex)
+        return None
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+def _scan_json_items(text: str, pos: int, on_item, decode_value=None) -> int:
+    # Calls on_item(key, start, end, value) for each item of the JSON array or object
+    # that starts at text[pos], and returns the position just past its end. The key
+    # is None for array items. Each value is decoded by decode_value(key, start), which
+    # must return (value, end), or by the JSON decoder if decode_value is not given.
+    decoder = json.JSONDecoder()
+    closing = {'[': ']', '{': '}'}[text[pos]]
+    pos = _skip_whitespace(text, pos + 1)
+    while text[pos] != closing:
+        key = None
+        if closing == '}':
+            (key, pos) = decoder.raw_decode(text, pos)
+            pos = _skip_whitespace(text, pos)
+            if text[pos] != ':':
+                raise ValueError("expected ':' at position %d" % pos)
+            pos = _skip_whitespace(text, pos + 1)
+        start = pos
+        if decode_value is None:
+            (value, end) = decoder.raw_decode(text, start)
+        else:
+            (value, end) = decode_value(key, start)
+        on_item(key, start, end, value)
+        pos = _skip_whitespace(text, end)
+        if text[pos] == ',':
+            pos = _skip_whitespace(text, pos + 1)
+    return pos + 1
@@ -0,0 +1,160 @@
+
+"""License text classification
+
+This module names a license from its text, without needing the network. The text is
+normalized and broken into overlapping runs of words (n-grams), and the set of those
+is compared to the ones of the license texts bundled in the licenses directory, which
+are computed once when the classifier is created. The bundled texts are named by
+their SPDX identifiers.
+"""
+
+import logging
+import os
+import re
+import threading
+
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+
+@dataclass
+class LicenseMatch:
+    """The license found for a text, and how closely the text matched it (from 0 to 1).
+       The name is the one used by the GitHub API.
+    """
+    spdx_id: str
+    name: str
+    score: float
+
+
+class LicenseClassifier:
+    """Classifier for license texts. A text is given the license whose bundled text it
+       is the most similar to, provided the similarity is at least the threshold. The
+       similarity is the Jaccard index of the sets of ngram_size word n-grams of the
+       two texts, after normalizing away differences in case, punctuation, spelling
+       and copyright notices. A text that also holds most of another license, such as
+       that of a dual-licensed project, is not given either of them.
+    """
+
+    def __init__(self, threshold: float = 0.9, ngram_size: int = 3, corpus_dir: str = None):
+        self.threshold = threshold
+        self.ngram_size = ngram_size
+        self.corpus_dir = corpus_dir if corpus_dir is not None else _CORPUS_DIR
+        self._templates = []
+        for filename in sorted(os.listdir(self.corpus_dir)):
+            if filename.endswith('.txt'):
+                spdx_id = filename[:-len('.txt')]
+                with open(os.path.join(self.corpus_dir, filename), encoding='utf-8') as infile:
+                    fingerprint = self.fingerprint(infile.read())
+                self._templates.append((spdx_id, fingerprint))
+        self._template_by_id = dict(self._templates)
+        # For each license, the n-grams of each of the others that it does not share.
+        self._others = {spdx_id: [other - matched for (other_id, other) in self._templates
+                                  if other_id != spdx_id and other - matched]
+                        for (spdx_id, matched) in self._templates}
+        logging.debug("  loaded %d license texts from %s", len(self._templates), self.corpus_dir)
+
+    def fingerprint(self, text: str) -> FrozenSet[int]:
+        """Returns the set of hashed word n-grams of the normalized text. The hashes
+           are those of Python, so they may only be compared within the same process.
+        """
+        words = normalize(text)
+        if len(words) < self.ngram_size:
+            return frozenset([hash(tuple(words))])
+        return frozenset(map(hash, zip(*[words[i:] for i in range(self.ngram_size)])))
+
+    def classify(self, text: str) -> Optional[LicenseMatch]:
+        """Returns the license that matches the text best, or None if none of them are
+           close enough or the text holds more than one license.
+        """
+        fingerprint = self.fingerprint(text)
+        best = None
+        best_score = self.threshold
+        for (spdx_id, template) in self._templates:
+            # The index can be no more than the ratio of the sizes, so the intersection
+            # can be skipped for the templates of very different lengths.
+            (smaller, larger) = sorted((len(fingerprint), len(template)))
+            if larger == 0 or smaller / larger < best_score:
+                continue
+            common = len(fingerprint & template)
+            score = common / (len(fingerprint) + len(template) - common)
+            if score >= best_score:
+                best = spdx_id
+                best_score = score
+        if best is None or self._holds_other_license(fingerprint, best):
+            return None
+        return LicenseMatch(spdx_id=best, name=LICENSE_NAMES.get(best, best), score=best_score)
+
+    def classify_all(self, texts: List[str]) -> List[Optional[LicenseMatch]]:
+        """Classify a batch of texts, returning the results in the same order."""
+        return [self.classify(text) for text in texts]
+
+    def _holds_other_license(self, fingerprint: FrozenSet[int], spdx_id: str) -> bool:
+        # The n-grams of the text that the matched license does not account for are
+        # compared to the other licenses, so that a second license following the first
+        # one is noticed even though it barely lowers the similarity.
+        rest = fingerprint - self._template_by_id[spdx_id]
+        for other in self._others[spdx_id]:
+            if len(rest & other) >= len(other) * _OTHER_SHARE:
+                return True
+        return False
+
+
+LICENSE_NAMES = {
+    'Apache-2.0': 'Apache License 2.0',
+    'BSD-2-Clause': 'BSD 2-Clause "Simplified" License',
+    'BSD-3-Clause': 'BSD 3-Clause "New" or "Revised" License',
+    'CC0-1.0': 'Creative Commons Zero v1.0 Universal',
+    'GPL-2.0': 'GNU General Public License v2.0',
+    'GPL-3.0': 'GNU General Public License v3.0',
+    'ISC': 'ISC License',
+    'LGPL-2.1': 'GNU Lesser General Public License v2.1',
+    'LGPL-3.0': 'GNU Lesser General Public License v3.0',
+    'MIT': 'MIT License',
+    'MPL-2.0': 'Mozilla Public License 2.0',
+    'Unlicense': 'The Unlicense'
+}
+
+
+def normalize(text: str) -> List[str]:
+    """Returns the words of a license text, ignoring case, punctuation, list numbering,
+       the copyright notices and the placeholders of the license templates. The
+       copyright holder is called the same in all the texts, including where the BSD
+       licenses name it.
+    """
+    text = _COPYRIGHT_LINE.sub(' ', text.lower())
+    text = _LIST_MARKER.sub(' ', text)
+    text = _PLACEHOLDER.sub(' ', text)
+    text = _NAMED_HOLDER.sub(r'\1 the copyright holder \2', text)
+    return [_EQUIVALENT_WORDS.get(word, word) for word in _WORD.findall(text)]
+
+
+_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'licenses')
+_OTHER_SHARE = 0.5
+_COPYRIGHT_LINE = re.compile(r'^[ \t]*(copyright|\(c\)|©|all rights reserved).*$', re.MULTILINE)
+_LIST_MARKER = re.compile(r'^[ \t]*\(?(?:[0-9]{1,2}|[a-h]|[ivx]{1,4})[.)][ \t]', re.MULTILINE)
+_PLACEHOLDER = re.compile(r'<[^<>\n]{1,40}>')
+_NAMED_HOLDER = re.compile(r'(neither\W+the\W+name\W+of)\W.{1,100}?\W(nor\W+the\W+names\W+of)',
+                           re.DOTALL)
+_WORD = re.compile(r'[a-z0-9]+')
+_EQUIVALENT_WORDS = {
+    'licence': 'license',
+    'licences': 'licenses',
+    'licenced': 'licensed',
+    'organisation': 'organization',
+    'owner': 'holder',
+    'owners': 'holders',
+    'http': 'https'
+}
+
+_DEFAULT_CLASSIFIER = None
+_DEFAULT_CLASSIFIER_LOCK = threading.Lock()
+
+
+def default_classifier() -> LicenseClassifier:
+    """Returns the LicenseClassifier used by any component that was not given one."""
+    global _DEFAULT_CLASSIFIER
+    with _DEFAULT_CLASSIFIER_LOCK:
+        if _DEFAULT_CLASSIFIER is None:
+            _DEFAULT_CLASSIFIER = LicenseClassifier()
+        return _DEFAULT_CLASSIFIER
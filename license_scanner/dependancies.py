@@ -1,20 +1,30 @@
 
 """Dependancy scanning
 
-This module defines the API required for dependancy scanning and provides two scanners,
-one for scanning using GO modules and one for scanning GO packages.
+This module defines the API required for dependancy scanning and provides scanners
+for GO module based projects: one that uses the GO toolchain, one that reads the go.mod
+and go.sum files itself and one that reads the vendor/modules.txt file of projects
+that vendor their dependancies.
 """
 
 import abc
+import copy
+import functools
+import hashlib
+import json
 import logging
 import os
 import pathlib
+import shutil
 import subprocess
+import threading
 
+from dataclasses import dataclass
 from operator import attrgetter
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 
 from .cache import LicenseReportEntry
+from .executors import Executor, SerialExecutor
 
 
 class DependancyScanner(abc.ABC):
@@ -33,74 +43,581 @@ class DependancyScanner(abc.ABC):
            'package' and 'dependancy_scanner_name' should be filled.
         """
 
+    def iter_scan(self, directory: str) -> Iterator[LicenseReportEntry]:
+        """Scan the given directory and return an iterator over the dependancies.
+           Subclasses may override this to produce each entry as soon as it is found,
+           instead of once the whole scan is complete. The default implementation
+           returns the results of scan.
+        """
+        yield from self.scan(directory)
+
+    def save(self) -> bool:
+        """Subclasses may override this to write anything they keep between runs, such
+           as a cache, once all the scans are complete. Returns True if anything was
+           written. The default implementation does nothing.
+        """
+        return False
+
 
 class GoModuleDependancyScanner(DependancyScanner):
     """Scanner implementation that will handle GO module based projects.
+
+       If a cache_filename is given, the dependancies found for a module are saved in
+       that file, keyed by a hash of its go.mod and go.sum files, the go.work file
+       that applies to it, the GOFLAGS and the version of GO. Later scans of a module
+       for which none of these have changed use the saved list instead of running
+       'go list'. The file is only written by save, once all the modules have been
+       scanned.
     """
 
     _MODULE_LIST_FILENAME = "go.mod"
+    _CHECKSUM_LIST_FILENAME = "go.sum"
     _DEPENDANCY_COLUMN = 0
     _IS_MAIN_PACKAGE_COLUMN = 1
     _IS_INDIRECT_COLUMN = 2
-    _NUMBER_OF_COLUMNS_IN_DEPENDANCY_LIST_REPORT = 3
+    _VERSION_COLUMN = 3
+    _NUMBER_OF_COLUMNS_IN_DEPENDANCY_LIST_REPORT = 4
+
+    def __init__(self, cache_filename: str = None):
+        self._cache = _DependancyListCache(cache_filename) if cache_filename else None
 
     def can_handle(self, directory: str) -> bool:
+        # 'go list -m all' cannot be used on a vendored module, which is left for the
+        # VendorDependancyScanner.
         filename = directory + "/" + self._MODULE_LIST_FILENAME
-        return pathlib.Path(filename).exists()
+        return pathlib.Path(filename).exists() and not is_vendored(directory)
 
     def scan(self, directory: str) -> List[LicenseReportEntry]:
-        ret = []
-        cwd = os.getcwd()
-        os.chdir(directory)
-        cmd = subprocess.Popen('go list -m -f "{{.Path}} {{.Main}} {{.Indirect}}" all',
-                               shell=True, stdout=subprocess.PIPE)
-        for line in cmd.stdout:
-            line = line.decode('utf-8')
-            entry = self._line_as_tuple(line)
-            if entry is None:
-                logging.warning("  ignoring unrecognized line %s", line.strip())
-                continue
+        return list(self.iter_scan(directory))
 
-            if entry[self._IS_MAIN_PACKAGE_COLUMN]:
-                logging.debug("  ignoring main package entry %s", line.strip())
-                continue
+    def save(self) -> bool:
+        return self._cache.save() if self._cache is not None else False
 
-            dep = entry[self._DEPENDANCY_COLUMN]
-            logging.debug("  found dependancy %s", dep)
-            ret.append(LicenseReportEntry(package=dep, dependancy_scanner_name=type(self).__name__))
-        os.chdir(cwd)
-        return ret
+    def iter_scan(self, directory: str) -> Iterator[LicenseReportEntry]:
+        if self._cache is None:
+            yield from self._iter_go_list(directory)
+            return
+        key = self._module_files_hash(directory)
+        cached = self._cache.read(key)
+        if cached is not None:
+            logging.info("  using the cached dependancies of %s", directory)
+            for fields in cached:
+                yield LicenseReportEntry(dependancy_scanner_name=type(self).__name__, **fields)
+            return
+        entries = []
+        if (yield from self._iter_go_list(directory, entries)):
+            self._cache.write(key, [_scanned_fields(e) for e in entries])
+
+    def _iter_go_list(self,
+                      directory: str,
+                      found: List[LicenseReportEntry] = None) -> Iterator[LicenseReportEntry]:
+        # Adds the entries to found as they are produced. Returns True once all of them
+        # have been produced, or False if go list failed.
+        with subprocess.Popen('go list -m -f "{{.Path}} {{.Main}} {{.Indirect}} {{.Version}}" all',
+                              shell=True, stdout=subprocess.PIPE, cwd=directory) as cmd:
+            for line in cmd.stdout:
+                line = line.decode('utf-8')
+                entry = self._line_as_tuple(line)
+                if entry is None:
+                    logging.warning("  ignoring unrecognized line %s", line.strip())
+                    continue
+
+                if entry[self._IS_MAIN_PACKAGE_COLUMN]:
+                    logging.debug("  ignoring main package entry %s", line.strip())
+                    continue
+
+                dep = entry[self._DEPENDANCY_COLUMN]
+                logging.debug("  found dependancy %s", dep)
+                item = LicenseReportEntry(package=dep,
+                                          dependancy_scanner_name=type(self).__name__,
+                                          dependancy_is_indirect=entry[self._IS_INDIRECT_COLUMN],
+                                          dependancy_version=entry[self._VERSION_COLUMN])
+                if found is not None:
+                    found.append(item)
+                yield item
+        if cmd.returncode != 0:
+            logging.error("  go list failed in %s, returncode=%d", directory, cmd.returncode)
+            return False
+        return True
+
+    def _module_files_hash(self, directory: str) -> str:
+        (go_version, go_flags, go_work) = self._go_env(directory)
+        digest = hashlib.sha256()
+        digest.update(go_version.encode('utf-8') + b'\0' + go_flags.encode('utf-8') + b'\0')
+        filenames = [directory + "/" + self._MODULE_LIST_FILENAME,
+                     directory + "/" + self._CHECKSUM_LIST_FILENAME]
+        if go_work:
+            filenames += [go_work, go_work + ".sum"]
+        for filename in filenames:
+            digest.update(os.path.basename(filename).encode('utf-8') + b'\0')
+            try:
+                with open(filename, 'rb') as infile:
+                    digest.update(hashlib.sha256(infile.read()).digest())
+            except FileNotFoundError:
+                digest.update(b'missing')
+        return digest.hexdigest()
+
+    @classmethod
+    def _go_env(cls, directory: str) -> (str, str, str):
+        # Returns the version of GO, the GOFLAGS and the go.work file used in the
+        # directory, any of which is empty if it is not set or cannot be found. They
+        # are found as the GO toolchain does, but without running it, so that a
+        # cached scan does not need to start it at all.
+        go_flags = os.environ.get('GOFLAGS', '')
+        go_work = os.environ.get('GOWORK', '')
+        if go_work == 'off':
+            go_work = ''
+        elif not go_work:
+            current = os.path.abspath(directory)
+            while True:
+                if os.path.isfile(os.path.join(current, "go.work")):
+                    go_work = os.path.join(current, "go.work")
+                    break
+                parent = os.path.dirname(current)
+                if parent == current:
+                    break
+                current = parent
+        return (cls._go_version(), go_flags, go_work)
+
+    @classmethod
+    def _go_version(cls) -> str:
+        # The version is read from the VERSION file of the GO installation. If there
+        # is none, the location, size and time of the go command stand in for it.
+        go_command = shutil.which('go')
+        if go_command is None:
+            return ''
+        go_command = os.path.realpath(go_command)
+        try:
+            with open(os.path.join(os.path.dirname(os.path.dirname(go_command)),
+                                   "VERSION")) as infile:
+                return infile.readline().strip()
+        except OSError:
+            pass
+        try:
+            stat = os.stat(go_command)
+        except OSError:
+            return ''
+        return "%s:%d:%d" % (go_command, stat.st_size, stat.st_mtime_ns)
 
     @classmethod
-    def _line_as_tuple(cls, line: str) -> (str, bool, bool):
+    def _line_as_tuple(cls, line: str) -> (str, bool, bool, str):
+        # The version column is empty for the main module.
         entry = line.split()
+        if len(entry) == cls._NUMBER_OF_COLUMNS_IN_DEPENDANCY_LIST_REPORT - 1:
+            entry.append(None)
         if len(entry) != cls._NUMBER_OF_COLUMNS_IN_DEPENDANCY_LIST_REPORT:
             return None
         return (entry[cls._DEPENDANCY_COLUMN],
                 entry[cls._IS_MAIN_PACKAGE_COLUMN] == "true",
-                entry[cls._IS_INDIRECT_COLUMN] == "true")
+                entry[cls._IS_INDIRECT_COLUMN] == "true",
+                entry[cls._VERSION_COLUMN])
+
+
+class _DependancyListCache:
+    # JSON file of the dependancies found for each module, keyed by the hash of its
+    # go.mod and go.sum files. The modules are kept in the order they were last used,
+    # and only the most recently used ones are kept when the file is saved, but never
+    # any of those used since it was loaded. The whole file is ignored if it is not in
+    # the current format.
+
+    _FORMAT_VERSION = 2
+    _MAX_MODULES = 1000
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._modules = None
+        self._used = set()
+        self._is_dirty = False
+
+    def read(self, key: str) -> List[Dict]:
+        """Returns the fields of the dependancies saved for the key, or None if there
+           are none.
+        """
+        with self._lock:
+            modules = self._load()
+            dependancies = modules.pop(key, None)
+            if dependancies is None:
+                return None
+            modules[key] = dependancies
+            self._used.add(key)
+            return dependancies
+
+    def write(self, key: str, dependancies: List[Dict]):
+        """Save the fields of the dependancies for the key. They are only written to the
+           file by save.
+        """
+        with self._lock:
+            modules = self._load()
+            modules.pop(key, None)
+            modules[key] = dependancies
+            self._used.add(key)
+            self._is_dirty = True
+
+    def save(self) -> bool:
+        """Write the cache to its file, if it has changed. Returns True if the file was
+           written.
+        """
+        with self._lock:
+            if not self._is_dirty:
+                return False
+            modules = self._load()
+            unused = [key for key in modules if key not in self._used]
+            for key in unused[:max(len(modules) - self._MAX_MODULES, 0)]:
+                del modules[key]
+            data = {'version': self._FORMAT_VERSION, 'modules': modules}
+            tmp_filename = self.filename + ".tmp"
+            try:
+                with open(tmp_filename, 'w') as outfile:
+                    json.dump(data, outfile, indent=4)
+                os.replace(tmp_filename, self.filename)
+            except OSError as ex:
+                logging.warning("  could not save the dependancies to %s: %s", self.filename, ex)
+                return False
+            self._is_dirty = False
+            return True
+
+    def _load(self) -> Dict:
+        if self._modules is None:
+            self._modules = {}
+            try:
+                with open(self.filename) as infile:
+                    data = json.load(infile)
+                if data.get('version') == self._FORMAT_VERSION:
+                    self._modules = dict(data['modules'])
+                else:
+                    logging.info("  ignoring %s, it is from a different version", self.filename)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, LookupError, TypeError, AttributeError):
+                logging.warning("  ignoring the unreadable dependancy cache %s", self.filename)
+        return self._modules
+
+
+class GoModFile:
+    """The contents of a go.mod file that matter for finding the dependancies: the
+       module path and its require, replace and exclude directives. The requires map
+       each module path to a (version, is_indirect) tuple, the replaces map each
+       (module path, version) to a (path, version) tuple, where the version of the
+       original is None if it applies to all versions and the version of the
+       replacement is None if it is a local directory, and the excludes are a set of
+       (module path, version) tuples.
+    """
+
+    def __init__(self):
+        self.module = None
+        self.requires = {}
+        self.replaces = {}
+        self.excludes = set()
+
+    @classmethod
+    def parse(cls, text: str):
+        """Parse the text of a go.mod file. Directives that are not needed, such as
+           go and retract, are ignored.
+        """
+        go_mod = cls()
+        block = None
+        for line in text.splitlines():
+            (tokens, comment) = _split_go_mod_line(line)
+            if not tokens:
+                continue
+            if block is not None:
+                if tokens == [')']:
+                    block = None
+                else:
+                    go_mod._add_directive(block, tokens, comment)
+            elif len(tokens) == 2 and tokens[1] == '(':
+                block = tokens[0]
+            else:
+                go_mod._add_directive(tokens[0], tokens[1:], comment)
+        return go_mod
+
+    def replacement(self, path: str, version: str) -> (str, str):
+        """Returns the (path, version) tuple that replaces the given module version, or
+           None if it is not replaced.
+        """
+        return self.replaces.get((path, version), self.replaces.get((path, None), None))
+
+    def _add_directive(self, verb: str, args: List[str], comment: str):
+        if verb == 'module' and len(args) == 1:
+            self.module = args[0]
+        elif verb == 'require' and len(args) == 2:
+            is_indirect = comment == 'indirect' or comment.startswith('indirect;')
+            self.requires[args[0]] = (args[1], is_indirect)
+        elif verb == 'exclude' and len(args) == 2:
+            self.excludes.add((args[0], args[1]))
+        elif verb == 'replace' and '=>' in args:
+            arrow = args.index('=>')
+            (old, new) = (args[:arrow], args[arrow + 1:])
+            if len(old) in (1, 2) and len(new) in (1, 2):
+                self.replaces[(old[0], old[1] if len(old) == 2 else None)] = (
+                    new[0], new[1] if len(new) == 2 else None)
+
+
+class GoModFileDependancyScanner(DependancyScanner):
+    """Scanner implementation for GO module based projects that reads the go.mod and
+       go.sum files directly, so it does not need the GO toolchain and never downloads
+       any modules. It reports the modules required by go.mod at the versions it
+       requires, together with the other modules whose contents (rather than only
+       their go.mod files) go.sum has checksums for, at the highest version that is
+       not excluded. This approximates, but is not the same as, the modules reported
+       by 'go list -m all', since go.sum may still hold the checksums of modules that
+       are no longer used. The modules that are only in go.sum are reported as
+       indirect dependancies. Replaced modules are reported under their original path
+       and version, as 'go list' does, so the replacements themselves are not
+       reported again. Vendored modules are left for the VendorDependancyScanner.
+    """
+
+    _MODULE_LIST_FILENAME = "go.mod"
+    _CHECKSUM_LIST_FILENAME = "go.sum"
+
+    def can_handle(self, directory: str) -> bool:
+        filename = directory + "/" + self._MODULE_LIST_FILENAME
+        return pathlib.Path(filename).exists() and not is_vendored(directory)
+
+    def scan(self, directory: str) -> List[LicenseReportEntry]:
+        with open(directory + "/" + self._MODULE_LIST_FILENAME) as infile:
+            go_mod = GoModFile.parse(infile.read())
+        modules = {path: version for (path, (version, _)) in go_mod.requires.items()}
+        replacements = {go_mod.replacement(path, version) for (path, version) in modules.items()}
+        for (path, version) in self._read_checksum_versions(directory):
+            if path == go_mod.module or (path, version) in go_mod.excludes:
+                continue
+            if (path, version) in replacements or path in go_mod.requires:
+                continue
+            current = modules.get(path, None)
+            if current is None or _version_key(version) > _version_key(current):
+                modules[path] = version
+
+        ret = []
+        for path in sorted(modules):
+            logging.debug("  found dependancy %s", path)
+            (_, is_indirect) = go_mod.requires.get(path, (None, True))
+            ret.append(LicenseReportEntry(package=path,
+                                          dependancy_scanner_name=type(self).__name__,
+                                          dependancy_is_indirect=is_indirect,
+                                          dependancy_version=modules[path]))
+        return ret
+
+    def _read_checksum_versions(self, directory: str) -> Iterator[Tuple[str, str]]:
+        filename = directory + "/" + self._CHECKSUM_LIST_FILENAME
+        try:
+            with open(filename) as infile:
+                for line in infile:
+                    columns = line.split()
+                    if len(columns) != 3:
+                        if columns:
+                            logging.warning("  ignoring unrecognized line %s", line.strip())
+                        continue
+                    if columns[1].endswith('/go.mod'):
+                        # Only the go.mod file of this version was needed to resolve
+                        # the module graph, so its contents are not part of the build.
+                        continue
+                    yield (columns[0], columns[1])
+        except FileNotFoundError:
+            logging.debug("  no %s found, using only %s", filename, self._MODULE_LIST_FILENAME)
+
+
+class VendorDependancyScanner(DependancyScanner):
+    """Scanner implementation for GO module based projects that vendor their
+       dependancies. It reads the vendor/modules.txt file written by 'go mod vendor',
+       which lists the modules that the build uses, so it needs neither the GO
+       toolchain nor the network. A module is reported as an indirect dependancy if
+       the go.mod file requires it with an indirect comment, or if the go.mod file
+       does not require it at all.
+    """
+
+    _MODULE_LIST_FILENAME = "go.mod"
+
+    def can_handle(self, directory: str) -> bool:
+        return is_vendored(directory)
+
+    def scan(self, directory: str) -> List[LicenseReportEntry]:
+        try:
+            with open(directory + "/" + self._MODULE_LIST_FILENAME) as infile:
+                go_mod = GoModFile.parse(infile.read())
+        except FileNotFoundError:
+            go_mod = GoModFile()
+        with open(os.path.join(directory, _VENDOR_DIRECTORY, _VENDOR_MODULE_LIST)) as infile:
+            modules = parse_vendor_modules(infile.read())
+
+        ret = []
+        for (path, version, is_explicit) in modules:
+            logging.debug("  found dependancy %s", path)
+            (_, is_indirect) = go_mod.requires.get(path, (None, not is_explicit))
+            ret.append(LicenseReportEntry(package=path,
+                                          dependancy_scanner_name=type(self).__name__,
+                                          dependancy_is_indirect=is_indirect,
+                                          dependancy_version=version))
+        return ret
+
+
+@dataclass
+class _VendorModule:
+    # A module listed in vendor/modules.txt, as it is read.
+    path: str
+    version: str
+    is_explicit: bool = False
+    is_used: bool = False
+
+
+def is_vendored(directory: str) -> bool:
+    """Returns True if the module in directory vendors its dependancies."""
+    return os.path.isfile(os.path.join(directory, _VENDOR_DIRECTORY, _VENDOR_MODULE_LIST))
+
+
+def parse_vendor_modules(text: str) -> List[Tuple[str, str, bool]]:
+    """Parse the text of a vendor/modules.txt file, returning a (path, version,
+       is_explicit) tuple for each module used by the build, where is_explicit is True
+       for the modules required by go.mod. The version is that of the original
+       module rather than its replacement, and is None if it is not given. Only the
+       modules that have packages vendored are used by the build, so the others, such
+       as the replacements that are only recorded at the end of the file or required
+       modules whose packages are not imported, are skipped.
+    """
+    modules = []
+    module = None
+    for line in text.splitlines():
+        if line.startswith('## '):
+            if module is not None and 'explicit' in [a.strip() for a in line[3:].split(';')]:
+                module.is_explicit = True
+        elif line.startswith('# '):
+            module = _vendor_module_from_line(line[2:].split())
+            if module is not None:
+                modules.append(module)
+        elif line.strip() and module is not None:
+            module.is_used = True
+    return [(module.path, module.version, module.is_explicit)
+            for module in modules if module.is_used]
 
 
 def scan_all(directory: str, scanners: List[DependancyScanner]) -> List[LicenseReportEntry]:
     """Scan a directory using all applicable scanners in the list and return a list
        of the merged results.
     """
+    return sorted(iter_scan_all(directory, scanners), key=attrgetter('package'))
+
+
+def iter_scan_all(directory: str,
+                  scanners: List[DependancyScanner]) -> Iterator[LicenseReportEntry]:
+    """Scan a directory using all applicable scanners in the list and return an
+       iterator over the merged results, in the order the scanners find them. Each
+       package is only produced once, by the first scanner to find it.
+    """
     found_a_scanner = False
-    combined_entries = {}
+    seen_packages = set()
     logging.info("Scanning for dependancies in %s", directory)
     for scanner in scanners:
         logging.debug("Trying scanner: %s", type(scanner).__name__)
         if scanner.can_handle(directory):
             logging.info("Using scanner: %s", type(scanner).__name__)
             found_a_scanner = True
-            _add_new_entries(combined_entries, scanner.scan(directory))
+            for item in scanner.iter_scan(directory):
+                if item.package not in seen_packages:
+                    seen_packages.add(item.package)
+                    yield item
     if not found_a_scanner:
         raise RuntimeError("Could not find a scanner that will handle this directory")
-    return sorted(combined_entries.values(), key=attrgetter('package'))
 
 
-def _add_new_entries(entries: Dict, new_entries: List[LicenseReportEntry]):
-    for item in new_entries:
-        if item.package in entries:
-            continue
-        entries[item.package] = item
+def find_module_directories(root: str) -> List[str]:
+    """Returns the sorted list of all the directories under root, including root
+       itself, that contain a go.mod file. As with the GO tools, vendor and testdata
+       directories and those whose names start with '.' or '_' are skipped.
+    """
+    directories = []
+    for (dirpath, dirnames, filenames) in os.walk(root):
+        dirnames[:] = [d for d in dirnames
+                       if d not in ('vendor', 'testdata') and not d.startswith(('.', '_'))]
+        if "go.mod" in filenames:
+            directories.append(dirpath)
+    return sorted(directories)
+
+
+def scan_all_modules(directories: List[str],
+                     scanners: List[DependancyScanner],
+                     executor: Executor = None) -> Dict[str, List[LicenseReportEntry]]:
+    """Scan each of the directories using all applicable scanners, as scan_all does.
+       The directories are handed to the executor (a SerialExecutor if none is given),
+       which may scan several of them at once. Returns a dictionary mapping each
+       directory to its sorted list of dependancies.
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    work = functools.partial(scan_all, scanners=scanners)
+    return dict(zip(directories, executor.map(work, directories)))
+
+
+def merge_module_entries(
+        modules: Dict[str, List[LicenseReportEntry]]) -> List[LicenseReportEntry]:
+    """Merge the dependancies of a number of modules, as returned by scan_all_modules,
+       into a single sorted list with one entry for each package. The merged entries
+       are copies, and a package is only marked as indirect if it is an indirect
+       dependancy of every module that uses it.
+    """
+    merged = {}
+    for entries in modules.values():
+        for entry in entries:
+            current = merged.get(entry.package, None)
+            if current is None:
+                merged[entry.package] = copy.copy(entry)
+            elif current.dependancy_is_indirect and entry.dependancy_is_indirect is False:
+                current.dependancy_is_indirect = False
+    return sorted(merged.values(), key=attrgetter('package'))
+
+
+def _scanned_fields(entry: LicenseReportEntry) -> Dict:
+    # The fields filled by a dependancy scanner, other than its name.
+    return {k: v for (k, v) in entry.__dict__.items()
+            if (k == 'package' or k.startswith('dependancy_')) and
+            k != 'dependancy_scanner_name' and v is not None}
+
+def _split_go_mod_line(line: str) -> (List[str], str):
+    # Returns the tokens of a go.mod line and the text of its comment, if any.
+    tokens = []
+    pos = 0
+    while pos < len(line):
+        char = line[pos]
+        if char.isspace():
+            pos += 1
+        elif line.startswith('//', pos):
+            return (tokens, line[pos + 2:].strip())
+        elif char in '"`':
+            end = line.find(char, pos + 1)
+            end = len(line) if end < 0 else end
+            tokens.append(line[pos + 1:end])
+            pos = end + 1
+        elif char in '()':
+            tokens.append(char)
+            pos += 1
+        else:
+            end = pos
+            while end < len(line) and not line[end].isspace() and line[end] not in '()"`':
+                if line.startswith('//', end):
+                    break
+                end += 1
+            tokens.append(line[pos:end])
+            pos = end
+    return (tokens, '')
+
+_VENDOR_DIRECTORY = "vendor"
+_VENDOR_MODULE_LIST = "modules.txt"
+
+def _vendor_module_from_line(tokens: List[str]) -> _VendorModule:
+    # Returns the module of a module line, which is either "path version" or
+    # "path [version] => replacement [version]".
+    old = tokens[:tokens.index('=>')] if '=>' in tokens else tokens
+    if len(old) not in (1, 2):
+        logging.warning("  ignoring unrecognized module line # %s", " ".join(tokens))
+        return None
+    return _VendorModule(path=old[0], version=old[1] if len(old) == 2 else None)
+
+def _version_key(version: str) -> tuple:
+    # Key for sorting module versions in semantic version order.
+    version = version.split('+')[0].lstrip('v')
+    (release, _, prerelease) = version.partition('-')
+    numbers = tuple(int(n) if n.isdigit() else 0 for n in release.split('.'))
+    if not prerelease:
+        return (numbers, 1, ())
+    parts = tuple((0, int(p), '') if p.isdigit() else (1, 0, p) for p in prerelease.split('.'))
+    return (numbers, 0, parts)
@@ -0,0 +1,147 @@
+
+"""Task execution
+
+This module defines the API used to run a function over a list of items and provides
+serial, thread pool, process pool and asyncio based implementations. Regardless of how the work is
+scheduled, the results are always returned in the order of the items.
+"""
+
+import abc
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import multiprocessing
+
+from typing import Callable, ContextManager, Iterable, Iterator
+
+
+class Executor(abc.ABC):
+    """API for implementing the execution of a function over a number of items."""
+
+    @abc.abstractmethod
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        """Subclasses must override this to call func on each of the items and return
+           an iterator over the results. The results must be in the same order as the
+           items, no matter the order in which the calls actually completed. If any
+           of the calls raises an exception, it should be re-raised when its result
+           is reached.
+        """
+
+    def pooled(self) -> ContextManager['Executor']:
+        """Returns a context manager giving an executor that runs the calls as this one
+           does, but keeps its workers between the calls to map until the context is
+           left. The default implementation gives this executor itself.
+        """
+        return contextlib.nullcontext(self)
+
+
+class SerialExecutor(Executor):
+    """Executor that calls the function on each item in turn, in the calling thread."""
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        for item in items:
+            yield func(item)
+
+
+class ThreadPoolExecutor(Executor):
+    """Executor that runs the calls on a pool of at most max_workers threads. This is
+       intended for functions that spend most of their time waiting on the network.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            yield from pool.map(func, items)
+
+    @contextlib.contextmanager
+    def pooled(self) -> Iterator[Executor]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            yield _PoolExecutor(pool)
+
+
+class ProcessPoolExecutor(Executor):
+    """Executor that runs the calls on a pool of at most max_workers processes (as many
+       as there are CPUs if it is not given). This is intended for functions that
+       spend most of their time computing. The function, the items and the results
+       must all be picklable, so the function must be defined at the module level.
+       The processes are spawned rather than forked, as the pool may be started from
+       any thread.
+    """
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        with self._create_pool() as pool:
+            yield from pool.map(func, items)
+
+    @contextlib.contextmanager
+    def pooled(self) -> Iterator[Executor]:
+        with self._create_pool() as pool:
+            yield _PoolExecutor(pool)
+
+    def _create_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers,
+                                                      mp_context=SPAWN_CONTEXT)
+
+
+class AsyncioExecutor(Executor):
+    """Executor that runs the calls on an asyncio event loop, with at most
+       max_concurrency of them in progress at any one time. If func is a coroutine
+       function it is awaited directly, otherwise it is run in the loop's default
+       thread pool. Note that the results are only available once all the calls
+       have completed.
+    """
+
+    def __init__(self, max_concurrency: int = 8):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        return iter(asyncio.run(self._run_all(func, list(items))))
+
+    async def _run_all(self, func: Callable, items: list) -> list:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*[self._run_one(semaphore, func, item) for item in items])
+
+    @classmethod
+    async def _run_one(cls, semaphore: asyncio.Semaphore, func: Callable, item):
+        async with semaphore:
+            if asyncio.iscoroutinefunction(func):
+                return await func(item)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(func, item))
+
+
+SPAWN_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class _PoolExecutor(Executor):
+    """Executor running the calls on an already open concurrent.futures pool."""
+
+    def __init__(self, pool: concurrent.futures.Executor):
+        self._pool = pool
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        return self._pool.map(func, items)
+
+
+def create_executor(name: str, jobs: int) -> Executor:
+    """Create an executor given its name ('serial', 'thread' or 'asyncio') and the
+       maximum number of calls it may have in progress at once.
+    """
+    if name == 'serial' or jobs <= 1:
+        return SerialExecutor()
+    if name == 'thread':
+        return ThreadPoolExecutor(jobs)
+    if name == 'asyncio':
+        return AsyncioExecutor(jobs)
+    raise ValueError("Unknown executor '%s'" % name)
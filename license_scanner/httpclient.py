@@ -0,0 +1,106 @@
+
+"""HTTP access
+
+This module provides the HTTP client shared by the components that need to read from
+the network. It keeps a pool of connections to each host, applies a timeout to every
+request and retries the idempotent requests that fail with a connection error or a
+server error.
+"""
+
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """HTTP client built on a single pooled requests session. Connections are reused
+       across requests, and at most max_connections_per_host connections are opened
+       to any one host. Requests that would need more wait for a pooled connection to
+       become free.
+
+       The timeout is either a number of seconds or a (connect, read) tuple. Failed
+       GET and HEAD requests are retried up to retries times, waiting backoff_factor *
+       2^n seconds between attempts, or as long as the Retry-After header of the
+       response asks, but never more than max_backoff seconds. POST requests are not
+       retried, as they may not be safe to repeat.
+    """
+
+    _RETRY_STATUSES = (429, 500, 502, 503, 504)
+    _POOLED_HOSTS = 4
+
+    def __init__(self,
+                 timeout=(10, 30),
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 max_connections_per_host: int = 10,
+                 max_backoff: float = 60):
+        self.timeout = timeout
+        retry = _CappedRetry(max_backoff=max_backoff,
+                             total=retries,
+                             backoff_factor=backoff_factor,
+                             status_forcelist=self._RETRY_STATUSES,
+                             allowed_methods=frozenset(['GET', 'HEAD']),
+                             respect_retry_after_header=True,
+                             raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self._POOLED_HOSTS,
+                              pool_maxsize=max_connections_per_host,
+                              pool_block=True,
+                              max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def get(self, url: str, headers: dict = None) -> requests.Response:
+        """Perform a GET request. Raises a requests.exceptions.RequestException if no
+           response could be obtained.
+        """
+        return self._session.get(url, headers=headers, timeout=self.timeout)
+
+    def post(self, url: str, json=None, headers: dict = None) -> requests.Response:
+        """Perform a POST request with an optional JSON body. Raises a
+           requests.exceptions.RequestException if no response could be obtained.
+        """
+        return self._session.post(url, json=json, headers=headers, timeout=self.timeout)
+
+    def close(self):
+        """Close all the pooled connections."""
+        self._session.close()
+
+
+class _CappedRetry(Retry):
+    """Retry policy that never waits more than max_backoff seconds between attempts,
+       whatever the backoff or the Retry-After header of the response would be.
+    """
+
+    def __init__(self, max_backoff: float = 60, **kwargs):
+        Retry.__init__(self, **kwargs)
+        self.max_backoff = max_backoff
+
+    def new(self, **kwargs):
+        kwargs.setdefault('max_backoff', self.max_backoff)
+        return Retry.new(self, **kwargs)
+
+    def get_backoff_time(self) -> float:
+        return min(Retry.get_backoff_time(self), self.max_backoff)
+
+    def get_retry_after(self, response) -> float:
+        retry_after = Retry.get_retry_after(self, response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_backoff)
+
+
+_DEFAULT_CLIENT = None
+_DEFAULT_CLIENT_LOCK = threading.Lock()
+
+
+def default_client() -> HttpClient:
+    """Returns the HttpClient used by any component that was not given one."""
+    global _DEFAULT_CLIENT
+    with _DEFAULT_CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None:
+            _DEFAULT_CLIENT = HttpClient()
+        return _DEFAULT_CLIENT
@@ -0,0 +1,52 @@
+
+"""Prefix matching
+
+This module provides a trie used to find, in a single pass over a string, all the
+values that were added for prefixes of that string.
+"""
+
+from typing import Iterator
+
+
+class PrefixTrie:
+    """Trie mapping string prefixes to values. Any number of values may be added for
+       the same prefix, and the empty prefix matches every string.
+    """
+
+    # Key under which a node keeps its values. It can never clash with a character,
+    # and keeps the nodes serializable as JSON.
+    _VALUES = ''
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, prefix: str, value):
+        """Add a value to be returned for any string starting with prefix."""
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(self._VALUES, []).append(value)
+        self._size += 1
+
+    def matches(self, string: str) -> Iterator:
+        """Returns an iterator over the values of all the prefixes of string, the
+           values of shorter prefixes coming first. Values added for the same prefix
+           are returned in the order they were added.
+        """
+        node = self._root
+        yield from node.get(self._VALUES, [])
+        for char in string:
+            node = node.get(char, None)
+            if node is None:
+                return
+            yield from node.get(self._VALUES, [])
+
+    def has_match(self, string: str) -> bool:
+        """Returns True if any prefix of string has been added."""
+        for _ in self.matches(string):
+            return True
+        return False
@@ -1,21 +1,45 @@
 
 """License recognition
 
-This module defines the API required for license scanning and provides two license
-recognizers, one that will check the predefined list and one that will check GitHub.
+This module defines the API required for license scanning and provides license
+recognizers that check a predefined list of prefixes, read the license files in the GO
+module cache or a vendor directory, or check GitHub either directly or via a mapping.
 """
 
 import abc
+import base64
 import copy
+import datetime
+import functools
 import json
 import logging
+import os
+import threading
 import time
+import zipfile
 
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 
 import requests
 
 from .cache import LicenseCache, LicenseReportEntry
+from .classifier import LicenseClassifier, default_classifier
+from .executors import Executor, SerialExecutor
+from .httpclient import HttpClient, default_client
+from .prefixes import PrefixTrie
+from .rules import RuleSet
+
+
+FAILURE_NOT_FOUND = "not-found"
+FAILURE_ERROR = "error"
+
+NEGATIVE_CACHE_TTLS = {
+    FAILURE_NOT_FOUND: 7 * 24 * 60 * 60,
+    FAILURE_ERROR: 60 * 60
+}
+
+LICENSE_FILENAMES = ["LICENSE", "LICENSE.md", "LICENSE.txt", "LICENCE", "LICENCE.md",
+                     "LICENCE.txt", "COPYING", "COPYING.md", "COPYING.txt"]
 
 
 class Recognizer(abc.ABC):
@@ -35,6 +59,17 @@ class Recognizer(abc.ABC):
             license_recognizer_name
             license_url (optional)
             license_encoded (optional)
+            license_etag (optional)
+            license_last_modified (optional)
+
+           If the license could not be determined, this may instead return True with
+           license_name left as None and license_failure set to one of the FAILURE_*
+           reasons. The failure is then cached, and the package is skipped until its
+           time in NEGATIVE_CACHE_TTLS has passed.
+
+           When refreshing, entry will instead hold the cached results, including the
+           license_etag and license_last_modified validators. If the license has not
+           changed, the entry may be left as it is.
 
            If this recognizer is not capable of recognizing entry.package, then
            it should return False.
@@ -43,38 +78,107 @@ class Recognizer(abc.ABC):
            via the recognize method.
         """
 
-    def recognize(self, entry: LicenseReportEntry) -> bool:
+    def prefixes(self) -> List[str]:
+        """Subclasses may override this to return the prefixes of the packages they
+           are able to recognize, so that they are only asked about packages starting
+           with one of them. The default of None means that any package may be
+           recognized.
+        """
+        return None
+
+    def prepare(self, entries: List[LicenseReportEntry]) -> List[LicenseReportEntry]:
+        """Subclasses may override this to do any work that can be shared by a number
+           of entries, such as looking them all up in a single request, before any of
+           them are recognized. They may return the entries that they are certain to
+           recognize, which are then not passed to the prepare method of the following
+           recognizers. Entries that are already cached, including those with a failure
+           that has not yet expired, are not passed to it. The default implementation
+           does nothing.
+        """
+        return None
+
+    def recognize(self,
+                  entry: LicenseReportEntry,
+                  refresh: bool = False,
+                  negative_ttls: Dict[str, float] = None) -> bool:
         """Recognize an entry by first checking the cache and, if not available,
-           by calling the do_recognize method.
+           by calling the do_recognize method. If refresh is True, cached entries that
+           have validators are passed to do_recognize so they can be revalidated.
+           Cached failures are used for the number of seconds given for their reason
+           in negative_ttls, or in NEGATIVE_CACHE_TTLS if it is not given there.
         """
-        if self._set_from_cache(entry):
-            logging.debug("  recognized %s as %s using %s (cached)",
+        cached_entry = self.cache.read(entry.package) if self.cache is not None else None
+        (recognized, needs_saving) = self.recognize_from_cached(entry,
+                                                                cached_entry,
+                                                                refresh,
+                                                                negative_ttls)
+        if needs_saving:
+            self.save_to_cache(entry)
+        return recognized
+
+    def recognize_from_cached(self,
+                              entry: LicenseReportEntry,
+                              cached_entry: LicenseReportEntry,
+                              refresh: bool = False,
+                              negative_ttls: Dict[str, float] = None) -> (bool, bool):
+        """Recognize an entry as the recognize method does, but given the entry already
+           read from the cache (or None), and without writing to the cache. Returns
+           whether the entry was recognized and whether it needs to be saved.
+        """
+        if self.is_cache_hit(entry, cached_entry, refresh, negative_ttls):
+            return (True, False)
+        if self.do_recognize(entry):
+            logging.debug("  recognized %s as %s using %s",
                           entry.package,
                           entry.license_name,
                           entry.license_recognizer_name)
-            return True
-        if self.do_recognize(entry):
-            logging.debug("  recognized %s as %s using %s",
+            return (True, entry != cached_entry)
+        return (False, False)
+
+    def is_cache_hit(self,
+                     entry: LicenseReportEntry,
+                     cached_entry: LicenseReportEntry,
+                     refresh: bool = False,
+                     negative_ttls: Dict[str, float] = None) -> bool:
+        """Returns True if the cached entry may be used as it is, in which case it has
+           been copied into entry. Otherwise entry may have been given the cached
+           results to revalidate.
+        """
+        cached_entry = self._set_from_cache(entry, cached_entry, negative_ttls)
+        if cached_entry is None or (refresh and _has_validators(cached_entry)):
+            return False
+        if entry.license_name is None:
+            logging.debug("  skipping %s, %s at %s (cached)",
+                          entry.package,
+                          entry.license_failure,
+                          entry.license_recognized_at)
+        else:
+            logging.debug("  recognized %s as %s using %s (cached)",
                           entry.package,
                           entry.license_name,
                           entry.license_recognizer_name)
-            self._save_to_cache(entry)
-            return True
-        return False
-
-    def _set_from_cache(self, entry: LicenseReportEntry) -> bool:
-        if self.cache is not None:
-            cached_entry = self.cache.read(entry.package)
-            if cached_entry is not None:
-                if cached_entry.license_name is not None:
-                    entry.__dict__ = cached_entry.__dict__.copy()
-                    return True
-        return False
+        return True
 
-    def _save_to_cache(self, entry: LicenseReportEntry):
+    def save_to_cache(self, entry: LicenseReportEntry):
+        """Write the entry to the cache of this recognizer, if it has one."""
         if self.cache is not None:
             self.cache.write(entry)
 
+    @classmethod
+    def _set_from_cache(cls,
+                        entry: LicenseReportEntry,
+                        cached_entry: LicenseReportEntry,
+                        negative_ttls: Dict[str, float]) -> LicenseReportEntry:
+        if cached_entry is not None:
+            if (cached_entry.license_name is not None or
+                    _is_unexpired_failure(cached_entry, negative_ttls)):
+                scanned = {k: v for (k, v) in entry.__dict__.items()
+                           if k.startswith('dependancy_') and v is not None}
+                entry.__dict__ = cached_entry.__dict__.copy()
+                entry.__dict__.update(scanned)
+                return cached_entry
+        return None
+
 
 class CommonPrefixRecognizer(Recognizer):
     """License recognizer that assigns a single license to all dependancies with
@@ -103,16 +207,270 @@ class CommonPrefixRecognizer(Recognizer):
             return True
         return False
 
+    def prefixes(self) -> List[str]:
+        return [self.prefix]
+
+
+class LicenseFileRecognizer(Recognizer):
+    """Base class for the recognizers that read the license file of a module from the
+       local disk, so they need neither the network nor the GitHub API. Subclasses
+       must override read_license_file to find the file.
+
+       The license is named by the classifier, and only if the file unambiguously
+       holds one of the licenses it knows. The license files of a whole chunk of
+       entries are classified together by prepare. If the license file cannot be
+       found, or the license could not be named, the package is left for the other
+       recognizers.
+    """
+
+    def __init__(self, cache: LicenseCache, classifier: LicenseClassifier = None):
+        Recognizer.__init__(self, cache)
+        self._classifier = classifier
+        self._prepared = {}
+
+    @property
+    def classifier(self) -> LicenseClassifier:
+        """The classifier used to name the licenses, which is only loaded when needed."""
+        if self._classifier is None:
+            self._classifier = default_classifier()
+        return self._classifier
+
+    @abc.abstractmethod
+    def read_license_file(self, entry: LicenseReportEntry) -> (str, bytes):
+        """Subclasses must override this to return the name and contents of the
+           license file of the entry, or None if it cannot be found.
+        """
+
+    def prepare(self, entries: List[LicenseReportEntry]) -> List[LicenseReportEntry]:
+        # Only the current chunk is kept, so the license files of the entries that were
+        # recognized in another way are not held on to. The entries whose license was
+        # named are returned, as they are certain to be recognized here.
+        found = []
+        prepared = {}
+        for entry in entries:
+            license_file = self.read_license_file(entry)
+            if license_file is not None:
+                found.append((entry, license_file))
+            else:
+                prepared[(entry.package, entry.dependancy_version)] = None
+        texts = [data.decode('utf-8', errors='replace') for (_, (_, data)) in found]
+        named = []
+        for ((entry, license_file), match) in zip(found, self.classifier.classify_all(texts)):
+            key = (entry.package, entry.dependancy_version)
+            prepared[key] = (license_file, match.name if match is not None else None)
+            if match is not None:
+                named.append(entry)
+        self._prepared = prepared
+        return named
+
+    def do_recognize(self, entry: LicenseReportEntry) -> bool:
+        key = (entry.package, entry.dependancy_version)
+        if key in self._prepared:
+            prepared = self._prepared.pop(key)
+            if prepared is None:
+                return False
+            ((filename, data), license_name) = prepared
+        else:
+            found = self.read_license_file(entry)
+            if found is None:
+                return False
+            (filename, data) = found
+            match = self.classifier.classify(data.decode('utf-8', errors='replace'))
+            license_name = match.name if match is not None else None
+        if license_name is None:
+            logging.debug("  could not name the license in %s for %s", filename, entry.package)
+            return False
+        entry.license_name = license_name
+        entry.license_url = None
+        entry.license_encoded = base64.b64encode(data).decode('ascii')
+        entry.license_etag = None
+        entry.license_last_modified = None
+        entry.license_failure = None
+        entry.license_recognized_at = _secs_to_time_string(time.time())
+        entry.license_recognizer_name = type(self).__name__
+        return True
+
+    @classmethod
+    def _read_license_in_directory(cls, directory: str) -> (str, bytes):
+        # Returns the name and contents of the license file in the directory, or None
+        # if it does not have one. The file names are not case sensitive.
+        if os.path.isdir(directory):
+            names = {name.upper(): name for name in os.listdir(directory)}
+            for filename in LICENSE_FILENAMES:
+                name = names.get(filename.upper(), None)
+                if name is not None and os.path.isfile(os.path.join(directory, name)):
+                    with open(os.path.join(directory, name), 'rb') as infile:
+                        return (os.path.join(directory, name), infile.read())
+        return None
+
+
+class GoModuleCacheRecognizer(LicenseFileRecognizer):
+    """License recognizer that reads the license file of a module from the local GO
+       module cache. The module is looked for in its extracted directory and then in
+       the downloaded zip file, which requires the entry to have its
+       dependancy_version set. The module cache is found in the same way as the GO
+       toolchain does, from the GOMODCACHE or GOPATH environment variables, unless
+       module_cache_dir is given.
+    """
+
+    def __init__(self,
+                 cache: LicenseCache,
+                 module_cache_dir: str = None,
+                 classifier: LicenseClassifier = None):
+        LicenseFileRecognizer.__init__(self, cache, classifier)
+        self.module_cache_dir = (module_cache_dir if module_cache_dir is not None
+                                 else _default_module_cache_dir())
+
+    def read_license_file(self, entry: LicenseReportEntry) -> (str, bytes):
+        (package, version) = (entry.package, entry.dependancy_version)
+        if version is None:
+            return None
+        module = "%s@%s" % (_escape_module_path(package), _escape_module_path(version))
+        found = self._read_license_in_directory(os.path.join(self.module_cache_dir, module))
+        if found is not None:
+            return found
+        zip_filename = os.path.join(self.module_cache_dir, "cache", "download",
+                                    _escape_module_path(package), "@v",
+                                    _escape_module_path(version) + ".zip")
+        try:
+            with zipfile.ZipFile(zip_filename) as module_zip:
+                prefix = "%s@%s/" % (package, version)
+                names = {name[len(prefix):].upper(): name for name in module_zip.namelist()
+                         if name.startswith(prefix) and '/' not in name[len(prefix):]}
+                for filename in LICENSE_FILENAMES:
+                    name = names.get(filename.upper(), None)
+                    if name is not None:
+                        return (zip_filename + ":" + name, module_zip.read(name))
+        except FileNotFoundError:
+            pass
+        except (OSError, zipfile.BadZipFile) as ex:
+            logging.warning("  could not read %s: %s", zip_filename, ex)
+        return None
+
+
+class VendorRecognizer(LicenseFileRecognizer):
+    """License recognizer that reads the license file of a module from the vendor
+       directories of the projects being scanned, where 'go mod vendor' copies it to
+       vendor/<module path>/. The vendor directories are checked in the order given.
+    """
+
+    def __init__(self,
+                 vendor_dirs: List[str],
+                 cache: LicenseCache,
+                 classifier: LicenseClassifier = None):
+        LicenseFileRecognizer.__init__(self, cache, classifier)
+        self.vendor_dirs = vendor_dirs
+
+    def read_license_file(self, entry: LicenseReportEntry) -> (str, bytes):
+        for vendor_dir in self.vendor_dirs:
+            found = self._read_license_in_directory(
+                os.path.join(vendor_dir, *entry.package.split('/')))
+            if found is not None:
+                return found
+        return None
+
+
+class GitHubRateLimit:
+    """Tracker for the GitHub API call budget that may be shared by any number of
+       recognizers, including ones running in different threads. The budget is seeded
+       by a single call to the rate_limit API the first time it is needed, and is then
+       kept current from the X-RateLimit headers of the license responses.
+    """
+
+    _RATE_LIMIT_URL = "https://api.github.com/rate_limit"
+
+    def __init__(self, http: HttpClient = None):
+        self.http = http if http is not None else default_client()
+        self._lock = threading.Lock()
+        self._is_seeded = False
+        self._remaining = None
+        self._reset = None
+        self._has_reported_exhaustion = False
+
+    def acquire(self) -> bool:
+        """Reserve one API call from the budget. Returns True if the call may be made
+           and False if the budget has been used up.
+        """
+        self._seed()
+        with self._lock:
+            if self._reset is not None and time.time() >= self._reset:
+                self._remaining = None
+                self._reset = None
+                self._has_reported_exhaustion = False
+            if self._remaining is None:
+                return True
+            if self._remaining <= 0:
+                if not self._has_reported_exhaustion:
+                    logging.critical("  Do not have any remaining github API calls, retry after %s",
+                                     _secs_to_time_string(self._reset))
+                    self._has_reported_exhaustion = True
+                return False
+            self._remaining -= 1
+            return True
+
+    def update(self, resp):
+        """Update the budget from the X-RateLimit headers of a GitHub API response."""
+        remaining = resp.headers.get('X-RateLimit-Remaining', None)
+        reset = resp.headers.get('X-RateLimit-Reset', None)
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self._is_seeded = True
+            self._set_budget(int(remaining), int(reset))
+
+    def refund(self):
+        """Return a call reserved by acquire to the budget. This is used for calls
+           that GitHub did not count, such as those answered by 304 Not Modified.
+        """
+        with self._lock:
+            if self._remaining is not None:
+                self._remaining += 1
+
+    def _seed(self):
+        # Only the first caller reads the rate_limit API, and it does so without
+        # holding the lock, so the other threads are not held up by the request. Until
+        # the budget is known, their calls are allowed.
+        with self._lock:
+            if self._is_seeded:
+                return
+            self._is_seeded = True
+        try:
+            resp = self.http.get(self._RATE_LIMIT_URL)
+            if _is_ok_response(resp):
+                core = json.loads(resp.text)['resources']['core']
+                with self._lock:
+                    self._set_budget(core['remaining'], core['reset'])
+        except requests.exceptions.RequestException as err:
+            logging.error("  could not read from %s, error=%s", self._RATE_LIMIT_URL, err)
+
+    def _set_budget(self, remaining: int, reset: int):
+        # Calls that are still in progress have already been taken off our count, but
+        # not yet off GitHub's, so within the same window we keep the smaller value.
+        if self._remaining is not None and self._reset == reset:
+            remaining = min(remaining, self._remaining)
+        self._remaining = remaining
+        self._reset = reset
+
 
 class GitHubRecognizer(Recognizer):
     """License recognizer that uses the github api. This recognizer will accept any
        package that has the syntax: github.com/<organization>/<package>
+
+       All the GitHub based recognizers share a single GitHubRateLimit and use the
+       default HttpClient unless they are given explicitly.
     """
 
     _NUMBER_OF_URL_PATH_SEGMENTS_FOR_GITHUB_API = 3
 
-    def __init__(self, cache: LicenseCache):
+    def __init__(self,
+                 cache: LicenseCache,
+                 rate_limit: GitHubRateLimit = None,
+                 http: HttpClient = None,
+                 api_url: str = "https://api.github.com"):
         Recognizer.__init__(self, cache)
+        self.rate_limit = rate_limit if rate_limit is not None else _default_rate_limit()
+        self.http = http if http is not None else default_client()
+        self.api_url = api_url
 
     def do_recognize(self, entry: LicenseReportEntry) -> bool:
         path = entry.package.split("/")
@@ -120,50 +478,211 @@ class GitHubRecognizer(Recognizer):
             return False
         owner = path[1]
         project = path[2]
-        if not self._can_call_github():
+        if not self.rate_limit.acquire():
+            # Nothing was looked up, so nothing is cached and the following
+            # recognizers may still try the package.
             return False
-        self._fill_license_for_github(owner, project, entry)
-        return True
-
-    @classmethod
-    def _fill_license_for_github(cls, owner: str, project: str, entry: LicenseReportEntry):
-        cls._init_entry(entry)
-        url = "https://api.github.com/repos/%s/%s/license" % (owner, project)
+        return self._fill_license_for_github(owner, project, entry)
+
+    def prefixes(self) -> List[str]:
+        return ['github.com/']
+
+    def _fill_license_for_github(self,
+                                 owner: str,
+                                 project: str,
+                                 entry: LicenseReportEntry) -> bool:
+        # If the entry holds validators from the cache, the request is made conditional
+        # and the cached results are kept unless GitHub returns a new license. Returns
+        # False, leaving the entry as it was, if GitHub refused the request because of
+        # its rate limit.
+        headers = self._validator_headers(entry)
+        url = "%s/repos/%s/%s/license" % (self.api_url, owner, project)
         try:
-            resp = requests.get(url)
-            if not cls._is_ok_response(resp):
+            resp = self.http.get(url, headers=headers)
+            self.rate_limit.update(resp)
+            if resp.status_code == 304:
+                self.rate_limit.refund()
+                logging.debug("  license for %s/%s has not changed", owner, project)
+                return True
+            if not _is_ok_response(resp):
                 logging.error("  bad response from %s, response=%d", url, resp.status_code)
-                return
+                if self._is_rate_limited(resp):
+                    return False
+                if not headers:
+                    # GitHub answers 404 both for a missing repository and for one
+                    # without a license.
+                    self._init_entry(entry)
+                    entry.license_failure = (FAILURE_NOT_FOUND if resp.status_code == 404
+                                             else FAILURE_ERROR)
+                return True
             j = json.loads(resp.text)
+            self._init_entry(entry)
             entry.license_name = j['license']['name']
             entry.license_url = j['download_url']
             entry.license_encoded = j['content']
-        except requests.exceptions.ConnectionError as err:
+            entry.license_etag = resp.headers.get('ETag', None)
+            entry.license_last_modified = resp.headers.get('Last-Modified', None)
+        except requests.exceptions.RequestException as err:
             logging.error("  could not read from %s, error=%s", url, err)
+            if not headers:
+                self._init_entry(entry)
+                entry.license_failure = FAILURE_ERROR
+        return True
 
     @classmethod
-    def _can_call_github(cls) -> bool:
-        url = "https://api.github.com/rate_limit"
-        resp = requests.get(url)
-        if cls._is_ok_response(resp):
-            j = json.loads(resp.text)
-            if j['resources']['core']['remaining'] == 0:
-                logging.critical("  Do not have any remaining github API calls, retry after %s",
-                                 _secs_to_time_string(j['resources']['core']['reset']))
-                return False
-        return True
+    def _is_rate_limited(cls, resp) -> bool:
+        return resp.status_code == 429 or resp.headers.get('X-RateLimit-Remaining', None) == '0'
+
+    @classmethod
+    def _validator_headers(cls, entry: LicenseReportEntry) -> Dict[str, str]:
+        headers = {}
+        if entry.license_etag is not None:
+            headers['If-None-Match'] = entry.license_etag
+        if entry.license_last_modified is not None:
+            headers['If-Modified-Since'] = entry.license_last_modified
+        return headers
 
     @classmethod
     def _init_entry(cls, entry: LicenseReportEntry):
         entry.license_name = None
         entry.license_url = None
         entry.license_encoded = None
+        entry.license_etag = None
+        entry.license_last_modified = None
+        entry.license_failure = None
         entry.license_recognized_at = _secs_to_time_string(time.time())
         entry.license_recognizer_name = cls.__name__
 
+
+class GitHubGraphQLRecognizer(Recognizer):
+    """License recognizer that uses the GitHub GraphQL api to look up the licenses of
+       many github.com/<organization>/<package> packages in a single request. Note that
+       the GraphQL api requires an access token.
+
+       The lookups are made when prepare is called, batch_size repositories at a time.
+       Packages that were not part of a prepared batch are looked up individually. If
+       a batch cannot be read, or a repository is not found, has no license or has
+       none of the LICENSE_FILENAMES, its packages are left unrecognized so that the
+       following recognizers may try them instead.
+    """
+
+    _NUMBER_OF_URL_PATH_SEGMENTS_FOR_GITHUB_API = 3
+
+    def __init__(self,
+                 token: str,
+                 cache: LicenseCache,
+                 batch_size: int = 50,
+                 url: str = "https://api.github.com/graphql",
+                 http: HttpClient = None):
+        Recognizer.__init__(self, cache)
+        self.token = token
+        self.batch_size = batch_size
+        self.url = url
+        self.http = http if http is not None else default_client()
+        self._resolved = {}
+
+    def prepare(self, entries: List[LicenseReportEntry]):
+        packages = []
+        for entry in entries:
+            if self._repository_path(entry.package) is None:
+                continue
+            if entry.package in self._resolved:
+                continue
+            packages.append(entry.package)
+        for start in range(0, len(packages), self.batch_size):
+            self._resolve_batch(packages[start:start + self.batch_size])
+
+    def do_recognize(self, entry: LicenseReportEntry) -> bool:
+        if self._repository_path(entry.package) is None:
+            return False
+        if _has_validators(entry):
+            # This is a cached entry being refreshed. GraphQL cannot revalidate it, so
+            # it is left for the GitHubRecognizer.
+            return False
+        if entry.package not in self._resolved:
+            self._resolve_batch([entry.package])
+        if self._resolved.get(entry.package, None) is None:
+            return False
+        entry.license_name = None
+        entry.license_url = None
+        entry.license_encoded = None
+        entry.license_failure = None
+        entry.__dict__.update(self._resolved[entry.package])
+        entry.license_recognized_at = _secs_to_time_string(time.time())
+        entry.license_recognizer_name = type(self).__name__
+        return True
+
+    def _resolve_batch(self, packages: List[str]):
+        # If the batch cannot be read, its packages are marked as unresolved, so that
+        # they are passed to the following recognizers without being looked up again.
+        logging.debug("  looking up %d repositories using %s", len(packages), self.url)
+        headers = {'Authorization': 'bearer %s' % self.token}
+        data = None
+        try:
+            resp = self.http.post(self.url,
+                                  json={'query': self._build_query(packages)},
+                                  headers=headers)
+            if _is_ok_response(resp):
+                data = json.loads(resp.text).get('data', None)
+                if data is None:
+                    logging.error("  no data in the response from %s", self.url)
+            else:
+                logging.error("  bad response from %s, response=%d", self.url, resp.status_code)
+        except requests.exceptions.RequestException as err:
+            logging.error("  could not read from %s, error=%s", self.url, err)
+        if data is None:
+            for package in packages:
+                self._resolved[package] = None
+            return
+        for (i, package) in enumerate(packages):
+            self._resolved[package] = self._fields_from_repository(package,
+                                                                   data.get("r%d" % i, None))
+
+    @classmethod
+    def _build_query(cls, packages: List[str]) -> str:
+        files = "".join([' f%d: object(expression: %s) { ... on Blob { text } }'
+                         % (i, json.dumps("HEAD:" + name))
+                         for (i, name) in enumerate(LICENSE_FILENAMES)])
+        repositories = []
+        for (i, package) in enumerate(packages):
+            (owner, project) = cls._repository_path(package)
+            repositories.append('r%d: repository(owner: %s, name: %s) {'
+                                ' licenseInfo { name } defaultBranchRef { name }%s }'
+                                % (i, json.dumps(owner), json.dumps(project), files))
+        return "query {\n  %s\n}" % "\n  ".join(repositories)
+
+    @classmethod
+    def _fields_from_repository(cls, package: str, repository: Dict) -> Dict:
+        if repository is None:
+            logging.debug("  could not find the repository for %s", package)
+            return None
+        if repository.get('licenseInfo', None) is None:
+            logging.debug("  no license found for %s", package)
+            return None
+        fields = {'license_name': repository['licenseInfo']['name']}
+        branch = (repository.get('defaultBranchRef', None) or {}).get('name', None)
+        for (i, name) in enumerate(LICENSE_FILENAMES):
+            blob = repository.get("f%d" % i, None)
+            if blob is not None and blob.get('text', None) is not None:
+                (owner, project) = cls._repository_path(package)
+                if branch is not None:
+                    fields['license_url'] = ("https://raw.githubusercontent.com/%s/%s/%s/%s"
+                                             % (owner, project, branch, name))
+                fields['license_encoded'] = base64.b64encode(
+                    blob['text'].encode('utf-8')).decode('ascii')
+                return fields
+        logging.debug("  no license file found for %s", package)
+        return None
+
+    def prefixes(self) -> List[str]:
+        return ['github.com/']
+
     @classmethod
-    def _is_ok_response(cls, resp):
-        return resp.status_code >= 200 and resp.status_code < 300
+    def _repository_path(cls, package: str) -> (str, str):
+        path = package.split("/")
+        if len(path) != cls._NUMBER_OF_URL_PATH_SEGMENTS_FOR_GITHUB_API or path[0] != 'github.com':
+            return None
+        return (path[1], path[2])
 
 
 class MappedToGitHubRecognizer(Recognizer):
@@ -172,10 +691,14 @@ class MappedToGitHubRecognizer(Recognizer):
        keys which are the original package names, mapped to a github package.
     """
 
-    def __init__(self, mapping: Dict[str, str], cache: LicenseCache):
+    def __init__(self,
+                 mapping: Dict[str, str],
+                 cache: LicenseCache,
+                 rate_limit: GitHubRateLimit = None,
+                 http: HttpClient = None):
         Recognizer.__init__(self, cache)
         self.mapping = mapping
-        self._github = GitHubRecognizer(cache)
+        self._github = GitHubRecognizer(cache, rate_limit, http)
 
     def do_recognize(self, entry: LicenseReportEntry) -> bool:
         git_package = self.mapping.get(entry.package, None)
@@ -187,27 +710,239 @@ class MappedToGitHubRecognizer(Recognizer):
                 entry.license_name = git_entry.license_name
                 entry.license_url = git_entry.license_url
                 entry.license_encoded = git_entry.license_encoded
+                entry.license_etag = git_entry.license_etag
+                entry.license_last_modified = git_entry.license_last_modified
+                entry.license_failure = git_entry.license_failure
                 entry.license_recognized_at = git_entry.license_recognized_at
                 entry.license_recognizer_name = type(self).__name__
             return result
         return False
 
+    def prefixes(self) -> List[str]:
+        return list(self.mapping.keys())
+
+
+class RuleSetRecognizer(Recognizer):
+    """License recognizer for all the prefix and mapping rules of a RuleSet, such as
+       one loaded from a rules file. Mapped packages are looked up on GitHub, as with
+       the MappedToGitHubRecognizer, and packages matching a prefix rule are given its
+       license, as with the CommonPrefixRecognizer. Unlike a list of those, finding
+       the rule for a package does not depend on the number of rules.
+    """
+
+    def __init__(self,
+                 rule_set: RuleSet,
+                 cache: LicenseCache,
+                 rate_limit: GitHubRateLimit = None,
+                 http: HttpClient = None):
+        Recognizer.__init__(self, cache)
+        self.rule_set = rule_set
+        self._mapped = MappedToGitHubRecognizer(rule_set.mappings, cache, rate_limit, http)
 
-def recognize_all(entries: List[LicenseReportEntry], recognizers: List[Recognizer]):
+    def do_recognize(self, entry: LicenseReportEntry) -> bool:
+        if self._mapped.do_recognize(entry):
+            entry.license_recognizer_name = type(self).__name__
+            return True
+        rule = self.rule_set.prefix_rule(entry.package)
+        if rule is not None:
+            entry.license_name = rule['license']
+            entry.license_url = rule['url']
+            entry.license_encoded = None
+            entry.license_etag = None
+            entry.license_last_modified = None
+            entry.license_failure = None
+            entry.license_recognized_at = _secs_to_time_string(time.time())
+            entry.license_recognizer_name = "%s(%s)" % (type(self).__name__, rule['prefix'])
+            return True
+        return False
+
+    def prefixes(self) -> List[str]:
+        return self.rule_set.prefixes()
+
+
+def recognize_all(entries: List[LicenseReportEntry],
+                  recognizers: List[Recognizer],
+                  executor: Executor = None,
+                  refresh: bool = False,
+                  negative_ttls: Dict[str, float] = None):
     """Use the list of recognizers to attempt to recognize the license for the
-       list of entries.
+       list of entries. The entries are handed to the executor (a SerialExecutor if
+       none is given), which may recognize several of them at once. Newly recognized
+       entries are written to the cache in the order of the entries list, no matter
+       the order in which the recognitions completed. If refresh is True, cached
+       entries that have validators are revalidated. Cached failures are skipped for
+       the times given in negative_ttls, as described in Recognizer.recognize.
     """
     logging.info("Attempting to recognize %d entries", len(entries))
-    for entry in entries:
-        _recognize_entry(entry, recognizers)
+    for _ in iter_recognize_all(entries,
+                                recognizers,
+                                executor,
+                                refresh,
+                                negative_ttls,
+                                chunk_size=max(len(entries), 1)):
+        pass
+
+
+def iter_recognize_all(entries: Iterable[LicenseReportEntry],
+                       recognizers: List[Recognizer],
+                       executor: Executor = None,
+                       refresh: bool = False,
+                       negative_ttls: Dict[str, float] = None,
+                       chunk_size: int = 50) -> Iterator[LicenseReportEntry]:
+    """Recognize the licenses of the entries as they are produced, returning an
+       iterator over the entries in the same order once they have been recognized.
+       The entries are taken in chunks of chunk_size and looked up in the caches,
+       which are read only once per entry. The entries that were not found are then
+       passed to the prepare method of the recognizers, less the entries that an
+       earlier one is certain to recognize, before the chunk is handed to the
+       executor, which keeps the same workers for all the chunks. Otherwise this
+       works as recognize_all.
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    dispatcher = _RecognizerDispatcher(recognizers)
+    work = functools.partial(dispatcher.recognize, refresh=refresh, negative_ttls=negative_ttls)
+    with executor.pooled() as pooled_executor:
+        for chunk in _chunks(entries, chunk_size):
+            lookups = [(entry, dispatcher.read_caches(entry.package)) for entry in chunk]
+            remaining = [entry for (entry, cached_entries) in lookups
+                         if not dispatcher.is_cached(cached_entries, negative_ttls)]
+            for recognizer in recognizers:
+                claimed = recognizer.prepare(remaining)
+                if claimed:
+                    claimed_ids = {id(entry) for entry in claimed}
+                    remaining = [entry for entry in remaining if id(entry) not in claimed_ids]
+            for (entry, recognizer) in zip(chunk, pooled_executor.map(work, lookups)):
+                if recognizer is not None:
+                    recognizer.save_to_cache(entry)
+                yield entry
+
+
+class _RecognizerDispatcher:
+    # Routes each package to the recognizers that could recognize it, using a trie of
+    # their prefixes, given the entries read from each of their caches. Cached entries
+    # are used whether or not any of the recognizers could recognize the package,
+    # since they may have been added to the cache by hand.
+
+    def __init__(self, recognizers: List[Recognizer]):
+        self._recognizers = recognizers
+        self._trie = PrefixTrie()
+        self._cache_owners = {}
+        for (index, recognizer) in enumerate(recognizers):
+            prefixes = recognizer.prefixes()
+            for prefix in (prefixes if prefixes is not None else ['']):
+                self._trie.add(prefix, index)
+            if recognizer.cache is not None:
+                self._cache_owners.setdefault(id(recognizer.cache), recognizer)
+
+    def candidates(self, package: str) -> List[Recognizer]:
+        """Returns the recognizers that may match the package, in their original order."""
+        return [self._recognizers[i] for i in sorted(set(self._trie.matches(package)))]
+
+    def read_caches(self, package: str) -> Dict[int, LicenseReportEntry]:
+        """Read the package from each of the caches, returning the entries found (or
+           None) by the id of their cache.
+        """
+        if package is None:
+            return {}
+        return {cache_id: recognizer.cache.read(package)
+                for (cache_id, recognizer) in self._cache_owners.items()}
 
-def _recognize_entry(entry: LicenseReportEntry, recognizers: List[Recognizer]):
-    for recognizer in recognizers:
-        if entry.package is not None:
-            if recognizer.recognize(entry):
-                return
-    logging.warning("  could not recognize a license for %s", entry.package)
+    @classmethod
+    def is_cached(cls,
+                  cached_entries: Dict[int, LicenseReportEntry],
+                  negative_ttls: Dict[str, float]) -> bool:
+        """Returns True if one of the cached entries holds a license, or a failure that
+           has not yet expired.
+        """
+        return any(cached_entry is not None and
+                   (cached_entry.license_name is not None or
+                    _is_unexpired_failure(cached_entry, negative_ttls))
+                   for cached_entry in cached_entries.values())
+
+    def recognize(self,
+                  lookup: (LicenseReportEntry, Dict[int, LicenseReportEntry]),
+                  refresh: bool,
+                  negative_ttls: Dict[str, float]) -> Recognizer:
+        """Recognize the entry given with the cached entries read for it by
+           read_caches. Returns the recognizer whose cache needs to be updated, or None
+           if no update is required.
+        """
+        (entry, cached_entries) = lookup
+        if entry.package is None:
+            return None
+        for (cache_id, recognizer) in self._cache_owners.items():
+            if recognizer.is_cache_hit(entry, cached_entries[cache_id], refresh, negative_ttls):
+                return None
+        for recognizer in self.candidates(entry.package):
+            cached_entry = cached_entries.get(id(recognizer.cache), None)
+            (recognized, needs_saving) = recognizer.recognize_from_cached(entry,
+                                                                          cached_entry,
+                                                                          refresh,
+                                                                          negative_ttls)
+            if recognized:
+                if entry.license_name is None:
+                    logging.warning("  could not recognize a license for %s (%s)",
+                                    entry.package,
+                                    entry.license_failure)
+                return recognizer if needs_saving else None
+        if entry.license_name is not None:
+            logging.debug("  could not revalidate %s, keeping the cached license", entry.package)
+        else:
+            logging.warning("  could not recognize a license for %s", entry.package)
+        return None
+
+
+def _chunks(items: Iterable, chunk_size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _is_unexpired_failure(entry: LicenseReportEntry, negative_ttls: Dict[str, float]) -> bool:
+    if entry.license_failure is None or entry.license_recognized_at is None:
+        return False
+    ttls = dict(NEGATIVE_CACHE_TTLS)
+    ttls.update(negative_ttls or {})
+    ttl = ttls.get(entry.license_failure, 0)
+    return _time_string_to_secs(entry.license_recognized_at) + ttl > time.time()
+
+def _default_module_cache_dir() -> str:
+    # Finds the module cache as the GO toolchain does, without having to run it.
+    if os.environ.get('GOMODCACHE'):
+        return os.environ['GOMODCACHE']
+    gopath = os.environ.get('GOPATH', '').split(os.pathsep)[0]
+    if not gopath:
+        gopath = os.path.join(os.path.expanduser('~'), 'go')
+    return os.path.join(gopath, 'pkg', 'mod')
+
+def _escape_module_path(path: str) -> str:
+    # The module cache replaces each upper case letter with '!' and the lower case one.
+    return ''.join('!' + c.lower() if c.isupper() else c for c in path)
+
+def _has_validators(entry: LicenseReportEntry) -> bool:
+    return entry.license_etag is not None or entry.license_last_modified is not None
+
+_DEFAULT_RATE_LIMIT = None
+_DEFAULT_RATE_LIMIT_LOCK = threading.Lock()
+
+def _default_rate_limit() -> GitHubRateLimit:
+    global _DEFAULT_RATE_LIMIT
+    with _DEFAULT_RATE_LIMIT_LOCK:
+        if _DEFAULT_RATE_LIMIT is None:
+            _DEFAULT_RATE_LIMIT = GitHubRateLimit()
+        return _DEFAULT_RATE_LIMIT
+
+def _is_ok_response(resp):
+    return resp.status_code >= 200 and resp.status_code < 300
 
 def _secs_to_time_string(secs):
     local_time = time.localtime(secs)
     return time.strftime("%Y-%m-%dT%H:%M:%S%z", local_time)
+
+def _time_string_to_secs(time_string: str) -> float:
+    return datetime.datetime.strptime(time_string, "%Y-%m-%dT%H:%M:%S%z").timestamp()
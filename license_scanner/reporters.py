@@ -3,16 +3,31 @@
 
 import abc
 import base64
+import concurrent.futures
+import contextlib
+import itertools
 import json
 import logging
+import os
+import pathlib
 import sys
+import tempfile
+import time
 
-from typing import Dict, List, Set
+from typing import Dict, Iterator, List, Set, Tuple
 
 from fpdf import FPDF
 import requests
 
 from .cache import LicenseCache, LicenseReportEntry
+from .executors import SPAWN_CONTEXT, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from .httpclient import HttpClient, default_client
+from .urlcache import UrlTextCache
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
 
 
 _NEXT_LINE = 1
@@ -24,6 +39,11 @@ _LINE_SIZE_MM = 5
 _INDENT_MM = 10
 _LICENSE_COLUMN_WIDTH_MM = 100
 
+WORKLOAD_IO = "io"
+WORKLOAD_CPU = "cpu"
+
+_MIN_ENTRIES_PER_PROCESS = 500
+
 
 class Reporter(abc.ABC):
     """API for generating a report file."""
@@ -32,6 +52,21 @@ class Reporter(abc.ABC):
     def generate_report(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
         """Subclasses must override this to actually generate the report."""
 
+    def workload(self) -> str:
+        """Subclasses may override this to return WORKLOAD_CPU if generating their
+           report is bound by computation rather than by input and output. report_all
+           then generates it in a process of its own, which requires the reporter to
+           be picklable. The default is WORKLOAD_IO, which generates it in a thread.
+        """
+        return WORKLOAD_IO
+
+    def prepare(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
+        """Subclasses may override this to do any input or output needed by the report,
+           such as reading from the network, before it is generated. report_all calls
+           this in the calling process, even if the report is then generated in
+           another one. The default implementation does nothing.
+        """
+
     def generate_summary(self,
                          entries: List[LicenseReportEntry],
                          unaccepted_packages: Set[str]) -> Dict:
@@ -89,25 +124,185 @@ class JsonReporter(Reporter):
 
 
 class PdfReporter(Reporter):
-    """Reporter that will create a PDF file."""
+    """Reporter that will create a PDF file. Any license text that is not already
+       available is read using the given HttpClient, or the default one if none is given.
+       The texts are all read before the pages are laid out, each distinct URL once,
+       using the given executor (a ThreadPoolExecutor if none is given) so that a
+       number of them may be read at the same time.
+
+       The texts are read through the given url_cache, which keeps a single copy of
+       each one and may be shared by other reporters, or through one of its own that
+       is only kept in memory if none is given. They are not copied into the entries
+       of the packages using them.
+
+       The layout is one of LAYOUTS. The 'pages' layout gives each package a page
+       with its license text. The 'appendix' layout instead lists the packages with
+       a link to their license text, and shows each distinct text only once, in an
+       appendix that also lists the packages using it.
+
+       If a chunk_size is given, the pages layout is rendered in chunks of that many
+       packages, each one by a separate call of the render_executor (a
+       ProcessPoolExecutor if none is given). The chunks are handed to it a few at a
+       time, so that only those being rendered are laid out in memory. If volumes is
+       True they are written as numbered volumes, named by adding -1, -2 and so on to
+       the filename. Otherwise they are merged into a single file, which requires the
+       pypdf package and holds the pages of the whole report, as rendered, in memory
+       while it is written. The appendix layout is always rendered as a whole, since
+       its links cannot span files.
+
+       The license texts are read by prepare, so that the rest of the report can be
+       generated in another process. Unless it is rendered in chunks, which uses
+       processes of its own, the reporter's workload is WORKLOAD_CPU.
+
+       The cache is no longer used and is ignored. It is only kept so that existing
+       callers giving it continue to work, and the other options must be given by
+       keyword.
+    """
 
-    def __init__(self, filename: str, cache: LicenseCache):
+    LAYOUTS = ('pages', 'appendix')
+
+    def __init__(self,
+                 filename: str,
+                 cache: LicenseCache = None,
+                 *,
+                 http: HttpClient = None,
+                 executor: Executor = None,
+                 url_cache: UrlTextCache = None,
+                 layout: str = 'pages',
+                 chunk_size: int = None,
+                 volumes: bool = False,
+                 render_executor: Executor = None):
+        self.check_options(layout, chunk_size, volumes)
         self.filename = filename
-        self.cache = cache
+        self.layout = layout
+        self.chunk_size = chunk_size
+        self.volumes = volumes
+        self.render_executor = (render_executor if render_executor is not None
+                                else ProcessPoolExecutor())
+        self.http = http if http is not None else default_client()
+        self.executor = executor if executor is not None else ThreadPoolExecutor()
+        self.url_cache = url_cache if url_cache is not None else UrlTextCache(http=self.http)
+        self._decoded_texts = {}
+        self._fetched_texts = {}
+
+    def __getstate__(self) -> Dict:
+        # The components used to read the license texts cannot be pickled, and are
+        # not needed once prepare has read them.
+        state = self.__dict__.copy()
+        for name in ('http', 'executor', 'url_cache'):
+            state[name] = None
+        return state
+
+    def workload(self) -> str:
+        return WORKLOAD_IO if self.chunk_size is not None else WORKLOAD_CPU
+
+    def prepare(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
+        self.prefetch(entries)
+
+    @classmethod
+    def check_options(cls, layout: str, chunk_size: int, volumes: bool):
+        """Raises a ValueError if the given layout options cannot be used."""
+        if layout not in cls.LAYOUTS:
+            raise ValueError("Unknown PDF layout '%s'" % layout)
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if volumes and chunk_size is None:
+            raise ValueError("volumes requires a chunk_size")
+        if chunk_size is not None and not volumes and pypdf is None:
+            raise ValueError("merging the PDF chunks requires the pypdf package")
 
     def generate_report(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
         """Generate a PDF report in the given filename."""
         logging.info("producing PDF report as '%s'", self.filename)
+        self.prefetch(entries)
+        if self.chunk_size is not None and self.layout == 'pages':
+            self._generate_in_chunks(entries, unaccepted_packages)
+            return
         pdf = FPDF()
         self._create_summary_page(pdf, entries, unaccepted_packages)
-        for entry in entries:
-            self._create_license_page(pdf, entry, unaccepted_packages)
+        if self.layout == 'appendix':
+            self._create_appendix_report(pdf, entries, unaccepted_packages)
+        else:
+            for entry in entries:
+                self._create_license_page(pdf, entry, unaccepted_packages)
         pdf.output(self.filename)
 
+    def volume_filenames(self, count: int) -> List[str]:
+        """Returns the names of the files used for the given number of volumes."""
+        path = pathlib.Path(self.filename)
+        return [str(path.with_name("%s-%d%s" % (path.stem, number, path.suffix)))
+                for number in range(1, count + 1)]
+
+    def _generate_in_chunks(self,
+                            entries: List[LicenseReportEntry],
+                            unaccepted_packages: Set[str]):
+        chunk_count = max((len(entries) + self.chunk_size - 1) // self.chunk_size, 1)
+        logging.debug("  rendering %d pages in %d chunks", len(entries), chunk_count)
+        if self.volumes:
+            filenames = self.volume_filenames(chunk_count)
+            parts = self._parts(entries, unaccepted_packages, filenames)
+            for filename in self._render_parts(parts):
+                logging.info("  wrote volume '%s'", filename)
+            return
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        with tempfile.TemporaryDirectory(prefix=".license-report-", dir=directory) as tmp_dir:
+            filenames = [os.path.join(tmp_dir, "part-%d.pdf" % number)
+                         for number in range(chunk_count)]
+            writer = pypdf.PdfWriter()
+            for filename in self._render_parts(self._parts(entries, unaccepted_packages,
+                                                           filenames)):
+                writer.append(filename)
+                os.remove(filename)
+            with open(self.filename, 'wb') as outfile:
+                writer.write(outfile)
+
+    def _parts(self,
+               entries: List[LicenseReportEntry],
+               unaccepted_packages: Set[str],
+               filenames: List[str]) -> Iterator[Tuple[str, Dict, List]]:
+        # The chunks to render, each one only made when it is about to be rendered.
+        summary = self.generate_summary(entries, unaccepted_packages)
+        for (number, filename) in enumerate(filenames):
+            chunk = entries[number * self.chunk_size:(number + 1) * self.chunk_size]
+            yield (filename,
+                   summary if number == 0 else None,
+                   [(entry, self._license_text(entry), entry.package in unaccepted_packages)
+                    for entry in chunk])
+
+    def _render_parts(self, parts: Iterator[Tuple[str, Dict, List]]) -> Iterator[str]:
+        # Renders the parts with the render_executor, handing it a few of them at a
+        # time rather than all of them at once, and returns their filenames in order.
+        in_flight = os.cpu_count() or 1
+        with self.render_executor.pooled() as executor:
+            while True:
+                batch = list(itertools.islice(parts, in_flight))
+                if not batch:
+                    return
+                yield from executor.map(self._render_part, batch)
+
+    @classmethod
+    def _render_part(cls,
+                     part: Tuple[str, Dict, List[Tuple[LicenseReportEntry, str, bool]]]) -> str:
+        # Renders a chunk of the report, with the summary page if it is given, into a
+        # file of its own. This is run by the render_executor, possibly in another
+        # process. Returns the filename.
+        (filename, summary, pages) = part
+        pdf = FPDF()
+        if summary is not None:
+            cls._write_summary_page(pdf, summary)
+        for (entry, text, is_unaccepted) in pages:
+            cls._write_license_page(pdf, entry, text, is_unaccepted)
+        pdf.output(filename)
+        return filename
+
     def _create_summary_page(self,
                              pdf: FPDF,
                              entries: List[LicenseReportEntry],
                              unaccepted_packages: Set[str]):
+        self._write_summary_page(pdf, self.generate_summary(entries, unaccepted_packages))
+
+    @classmethod
+    def _write_summary_page(cls, pdf: FPDF, summary: Dict):
         logging.debug("  generating summary page")
         pdf.add_page()
         pdf.set_font(_FONT)
@@ -119,7 +314,6 @@ class PdfReporter(Reporter):
         pdf.cell(0, _LINE_SIZE_MM, txt="Summary", ln=_NEXT_LINE)
         pdf.ln()
 
-        summary = self.generate_summary(entries, unaccepted_packages)
         for key in sorted(summary):
             pdf.cell(_INDENT_MM, _LINE_SIZE_MM)
             pdf.cell(_LICENSE_COLUMN_WIDTH_MM, _LINE_SIZE_MM, txt=key)
@@ -130,6 +324,17 @@ class PdfReporter(Reporter):
                              pdf: FPDF,
                              entry: LicenseReportEntry,
                              unaccepted_packages: Set[str]):
+        self._write_license_page(pdf,
+                                 entry,
+                                 self._license_text(entry),
+                                 entry.package in unaccepted_packages)
+
+    @classmethod
+    def _write_license_page(cls,
+                            pdf: FPDF,
+                            entry: LicenseReportEntry,
+                            text: str,
+                            is_unaccepted: bool):
         logging.debug("  generating page for %s", entry.package)
         pdf.add_page()
         pdf.set_font(_FONT)
@@ -137,7 +342,7 @@ class PdfReporter(Reporter):
         pdf.cell(0, _LINE_SIZE_MM, txt="Package: %s" % entry.package, ln=_NEXT_LINE)
 
         license_type_line = "License Type: %s" % entry.license_name
-        if entry.package in unaccepted_packages:
+        if is_unaccepted:
             license_type_line += " (** Unacceptable **)"
         pdf.cell(0, _LINE_SIZE_MM, txt=license_type_line, ln=_NEXT_LINE)
 
@@ -148,59 +353,185 @@ class PdfReporter(Reporter):
         pdf.ln()
 
         pdf.set_font_size(_LICENSE_SIZE)
+        cls._write_license_text(pdf, text)
+
+    def _create_appendix_report(self,
+                                pdf: FPDF,
+                                entries: List[LicenseReportEntry],
+                                unaccepted_packages: Set[str]):
+        # Each text is keyed by the string itself, which is the same object for all
+        # the entries sharing it, so it is only hashed once.
+        texts = {}
+        for entry in entries:
+            texts.setdefault(self._license_text(entry), []).append(entry)
+        links = {text: pdf.add_link() for text in texts}
+        numbers = {text: number for (number, text) in enumerate(texts, start=1)}
+
+        logging.debug("  generating package list")
+        pdf.add_page()
+        pdf.set_font(_FONT)
+        pdf.set_font_size(_NORMAL_SIZE)
+        pdf.cell(0, _LINE_SIZE_MM, txt="Packages", ln=_NEXT_LINE)
+        pdf.ln()
+        pdf.set_font_size(_LICENSE_SIZE)
+        for entry in entries:
+            text = self._license_text(entry)
+            license_type_line = "License Type: %s" % entry.license_name
+            if entry.package in unaccepted_packages:
+                license_type_line += " (** Unacceptable **)"
+            pdf.cell(0, _LINE_SIZE_MM, txt=entry.package, ln=_NEXT_LINE)
+            pdf.cell(_INDENT_MM, _LINE_SIZE_MM)
+            pdf.cell(0, _LINE_SIZE_MM,
+                     txt="%s, see License %d" % (license_type_line, numbers[text]),
+                     ln=_NEXT_LINE,
+                     link=links[text])
+
+        for (text, text_entries) in texts.items():
+            logging.debug("  generating appendix page for license %d", numbers[text])
+            pdf.add_page()
+            pdf.set_link(links[text])
+            pdf.set_font_size(_NORMAL_SIZE)
+            names = sorted({str(entry.license_name) for entry in text_entries})
+            pdf.cell(0, _LINE_SIZE_MM,
+                     txt="License %d: %s" % (numbers[text], ", ".join(names)),
+                     ln=_NEXT_LINE)
+            urls = sorted({entry.license_url for entry in text_entries
+                           if entry.license_url is not None})
+            if len(urls) == 1:
+                pdf.cell(0, _LINE_SIZE_MM, txt="License URL: %s" % urls[0], ln=_NEXT_LINE)
+            pdf.ln()
+
+            pdf.cell(0, _LINE_SIZE_MM, txt="Used By", ln=_NEXT_LINE)
+            pdf.set_font_size(_LICENSE_SIZE)
+            for entry in text_entries:
+                pdf.cell(_INDENT_MM, _LINE_SIZE_MM)
+                pdf.cell(0, _LINE_SIZE_MM, txt=entry.package, ln=_NEXT_LINE)
+            pdf.ln()
+
+            pdf.set_font_size(_NORMAL_SIZE)
+            pdf.cell(0, _LINE_SIZE_MM, txt="License Text", ln=_NEXT_LINE)
+            pdf.ln()
+            pdf.set_font_size(_LICENSE_SIZE)
+            self._write_license_text(pdf, text)
+
+    def _license_text(self, entry: LicenseReportEntry) -> str:
         if entry.license_encoded is not None:
-            text = self._b64decode(entry.license_encoded)
-        elif entry.license_url is not None:
-            text = self._read_text_from_url(entry.license_url, entry)
-        else:
-            text = "ERROR: Could not read license text"
+            return self._decode_license(entry)
+        if entry.license_url is not None:
+            return self._read_text_from_url(entry.license_url)
+        return "ERROR: Could not read license text"
 
+    @classmethod
+    def _write_license_text(cls, pdf: FPDF, text: str):
         try:
             pdf.multi_cell(0, _LINE_SIZE_MM, txt=text)
         except UnicodeEncodeError:
             logging.error("    could not encode license as PDF")
             pdf.cell(0, _LINE_SIZE_MM, txt="Could not read text of license", ln=_NEXT_LINE)
 
-    def _read_text_from_url(self, url: str, entry: LicenseReportEntry) -> str:
+    def prefetch(self, entries: List[LicenseReportEntry]):
+        """Read the license texts of all the entries that do not have them, reading
+           each distinct URL once.
+        """
+        urls = list(dict.fromkeys(entry.license_url for entry in entries
+                                  if entry.license_encoded is None
+                                  and entry.license_url is not None
+                                  and entry.license_url not in self._fetched_texts))
+        if urls:
+            logging.debug("  reading %d license texts", len(urls))
+            for (url, fetched) in zip(urls, self.executor.map(self._fetch_text, urls)):
+                self._fetched_texts[url] = fetched
+
+    def _read_text_from_url(self, url: str) -> str:
+        text = self._fetched_texts.get(url, None)
+        if text is None:
+            text = self._fetch_text(url)
+            self._fetched_texts[url] = text
+        return text
+
+    def _fetch_text(self, url: str) -> str:
+        # Returns the text to show for the license, which is an error message if it
+        # could not be read.
         try:
-            resp = requests.get(url)
-            if not self._is_ok_response(resp):
-                logging.error("    bad response from %s, response=%d", url, resp.status_code)
-                return "Could not read license from %s\n" % url
-        except requests.ConnectionError as ex:
+            return self.url_cache.read(url)
+        except requests.exceptions.RequestException as ex:
             logging.error("    could not read license from %s", url)
             return "Could not read license from %s.\nException=%s\n" % (url, ex)
-
-        if not resp.headers['Content-Type'].startswith('text/plain'):
-            logging.error("    could not get plain text license from %s", url)
-            return "Could not read license from %s as plain text.\n" % url
-
-        if self.cache:
-            entry.license_encoded = self._b64encode(resp.text)
-            self.cache.write(entry)
-
-        return resp.text
+        except ValueError as ex:
+            logging.error("    could not read license: %s", ex)
+            return "Could not read license from %s.\n%s\n" % (url, ex)
+
+    def _decode_license(self, entry: LicenseReportEntry) -> str:
+        # Many entries share the same license text, so each one is decoded only once.
+        text = self._decoded_texts.get(entry.license_encoded, None)
+        if text is None:
+            text = self._b64decode(entry.license_encoded)
+            self._decoded_texts[entry.license_encoded] = text
+        return text
 
     @classmethod
     def _b64decode(cls, txt: str) -> str:
         return base64.b64decode(txt.encode('latin-1', 'replace')).decode('latin-1', 'replace')
 
-    @classmethod
-    def _b64encode(cls, txt: str) -> str:
-        return base64.b64encode(txt.encode('latin-1', 'replace')).decode('latin-1', 'replace')
-
-    @classmethod
-    def _is_ok_response(cls, resp):
-        return resp.status_code >= 200 and resp.status_code < 300
-
 
 def report_all(entries: List[LicenseReportEntry],
                unaccepted_entries: List[LicenseReportEntry],
-               reporters: List[Reporter]):
-    """Generate the reports for the given list of reporters."""
+               reporters: List[Reporter]) -> List[float]:
+    """Generate the reports for the given list of reporters. If there is more than
+       one, they are generated at the same time, each one prepared and generated in a
+       thread of its own, except that those whose workload is WORKLOAD_CPU are
+       generated in a pool of processes when there are enough entries to be worth
+       copying to them. A reporter that fails does not stop the others, but once they
+       have all finished the exception of the first one that failed is raised.
+       Returns the number of seconds each reporter took.
+    """
     logging.info("Generating %d reports on %d entries", len(reporters), len(entries))
     unaccepted_packages = set()
     for entry in unaccepted_entries:
         unaccepted_packages.add(entry.package)
-    for reporter in reporters:
-        reporter.generate_report(entries, unaccepted_packages)
+    if len(reporters) <= 1:
+        return [_run_reporter(reporter, entries, unaccepted_packages, None)
+                for reporter in reporters]
+
+    processes_needed = 0
+    if len(entries) >= _MIN_ENTRIES_PER_PROCESS:
+        processes_needed = len([reporter for reporter in reporters
+                                if reporter.workload() == WORKLOAD_CPU])
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(reporters)) as threads, \
+            _process_pool(processes_needed) as processes:
+        futures = [threads.submit(_run_reporter, reporter, entries, unaccepted_packages, processes)
+                   for reporter in reporters]
+        concurrent.futures.wait(futures)
+    failures = [(reporter, future.exception()) for (reporter, future) in zip(reporters, futures)
+                if future.exception() is not None]
+    for (reporter, ex) in failures:
+        logging.error("  %s failed: %s", type(reporter).__name__, ex)
+    if failures:
+        raise failures[0][1]
+    return [future.result() for future in futures]
+
+
+def _run_reporter(reporter: Reporter,
+                  entries: List[LicenseReportEntry],
+                  unaccepted_packages: Set[str],
+                  processes: concurrent.futures.Executor) -> float:
+    start = time.monotonic()
+    try:
+        reporter.prepare(entries, unaccepted_packages)
+        if processes is not None and reporter.workload() == WORKLOAD_CPU:
+            processes.submit(reporter.generate_report, entries, unaccepted_packages).result()
+        else:
+            reporter.generate_report(entries, unaccepted_packages)
+    finally:
+        elapsed = time.monotonic() - start
+        logging.info("  %s took %.2f seconds", type(reporter).__name__, elapsed)
+    return elapsed
+
+def _process_pool(max_workers: int):
+    # A pool with a process for each of the reporters whose workload is WORKLOAD_CPU,
+    # or a context that gives None if there are none. Its processes are started by the
+    # reporters' threads, so they are spawned rather than forked.
+    if max_workers > 0:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                      mp_context=SPAWN_CONTEXT)
+    return contextlib.nullcontext()
@@ -0,0 +1,107 @@
+
+"""Recognizer rules
+
+This module reads the rules used to recognize packages that cannot be found on GitHub
+directly. A rules file, in JSON or TOML, has two parts:
+
+    prefixes: a list of {prefix, license, url} rules that assign a license to every
+              package starting with the prefix
+    mappings: a table of package names mapped to the GitHub packages holding their
+              licenses
+
+For example:
+
+    {
+        "prefixes": [
+            {"prefix": "gopkg.in", "license": "GoPkg License", "url": "https://..."}
+        ],
+        "mappings": {
+            "google.golang.org/grpc": "github.com/grpc/grpc-go"
+        }
+    }
+
+The rules are compiled into a RuleSet that finds the rule for a package without
+checking each of them in turn.
+"""
+
+import json
+import logging
+import pathlib
+
+from typing import Dict, List
+
+from .prefixes import PrefixTrie
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+class RuleSet:
+    """Compiled set of prefix and mapping rules. Each prefix rule is a dictionary
+       with the prefix, license and url items. When more than one prefix matches a
+       package, the rule that came first in the rules wins.
+    """
+
+    def __init__(self, prefix_rules: List[Dict], mappings: Dict[str, str], trie: PrefixTrie):
+        self.prefix_rules = prefix_rules
+        self.mappings = mappings
+        self._trie = trie
+
+    @classmethod
+    def from_json(cls, json_data: Dict):
+        """Compile the rules from a JSON object in the rules file format. Raises a
+           ValueError if the rules are not valid.
+        """
+        if not isinstance(json_data, dict):
+            raise ValueError("the rules must be an object")
+        prefix_rules = []
+        trie = PrefixTrie()
+        for rule in json_data.get('prefixes', []):
+            if not isinstance(rule, dict) or not rule.get('prefix') or not rule.get('license'):
+                raise ValueError("prefix rules need a prefix and a license: %s" % rule)
+            trie.add(rule['prefix'], len(prefix_rules))
+            prefix_rules.append({
+                'prefix': rule['prefix'],
+                'license': rule['license'],
+                'url': rule.get('url', None)
+            })
+        mappings = json_data.get('mappings', {})
+        if not isinstance(mappings, dict) or not all(isinstance(v, str) for v in mappings.values()):
+            raise ValueError("the mappings must be a table of package names")
+        return cls(prefix_rules, dict(mappings), trie)
+
+    def prefix_rule(self, package: str) -> Dict:
+        """Returns the prefix rule for the package, or None if there isn't one."""
+        index = min(self._trie.matches(package), default=None)
+        return self.prefix_rules[index] if index is not None else None
+
+    def prefixes(self) -> List[str]:
+        """Returns the prefixes of all the packages matched by the rules."""
+        return [rule['prefix'] for rule in self.prefix_rules] + list(self.mappings.keys())
+
+
+def load_rule_set(filename: str) -> RuleSet:
+    """Load the rules in filename, which is read as TOML if its name ends in .toml and
+       as JSON otherwise. Raises a ValueError if the rules are not valid.
+    """
+    with open(filename, 'rb') as rules_file:
+        data = rules_file.read()
+    logging.debug("  compiling the rules in %s", filename)
+    return RuleSet.from_json(_parse_rules(filename, data))
+
+
+def _parse_rules(filename: str, data: bytes) -> Dict:
+    is_toml = pathlib.Path(filename).suffix == '.toml'
+    if is_toml and tomllib is None:
+        raise ValueError("TOML rules files require Python 3.11 or later, or the tomli package")
+    try:
+        if is_toml:
+            return tomllib.loads(data.decode('utf-8'))
+        return json.loads(data)
+    except ValueError as ex:
+        raise ValueError("could not read the rules in %s: %s" % (filename, ex)) from ex
@@ -3,43 +3,148 @@
 """
 
 import argparse
+import copy
+import functools
 import json
 import logging
 import os
+import pathlib
+import shutil
 import sys
 
-from typing import List
+from operator import attrgetter
+from typing import Callable, Dict, List, Tuple
 
-from .acceptors import JsonFileLicenseAcceptor, LicenseAcceptor, accept_all
-from .cache import LicenseCache, LicenseReportEntry, JsonFileLicenseCache
-from .dependancies import DependancyScanner, GoModuleDependancyScanner, scan_all
-from .recognizers import CommonPrefixRecognizer, GitHubRecognizer, MappedToGitHubRecognizer
-from .recognizers import Recognizer, recognize_all
+from .acceptors import JsonFileLicenseAcceptor, LicenseAcceptor, accept_all, is_accepted
+from .cache import LicenseCache, LicenseReportEntry, JsonFileLicenseCache, SqliteLicenseCache
+from .dependancies import DependancyScanner, GoModFileDependancyScanner
+from .dependancies import GoModuleDependancyScanner, VendorDependancyScanner
+from .dependancies import find_module_directories, is_vendored, iter_scan_all
+from .dependancies import merge_module_entries, scan_all_modules
+from .executors import Executor, create_executor
+from .httpclient import HttpClient
+from .recognizers import GitHubGraphQLRecognizer, GitHubRateLimit, GitHubRecognizer
+from .recognizers import GoModuleCacheRecognizer, VendorRecognizer
+from .recognizers import NEGATIVE_CACHE_TTLS, Recognizer, RuleSetRecognizer
+from .recognizers import iter_recognize_all, recognize_all
 from .reporters import Reporter, JsonReporter, PdfReporter, report_all
+from .rules import RuleSet, load_rule_set
+from .urlcache import UrlTextCache
 
-_DEPENDANCY_SCANNERS = [GoModuleDependancyScanner()]
+_SQLITE_CACHE_SUFFIXES = ['.db', '.sqlite', '.sqlite3']
+_DEFAULT_RULES = {
+    'prefixes': [
+        {
+            'prefix': 'cloud.google.com',
+            'license': 'Apache License 2.0',
+            'url': 'http://www.apache.org/licenses/LICENSE-2.0.txt'
+        },
+        {
+            'prefix': 'golang.org',
+            'license': 'Go Standard Library License',
+            'url': 'https://raw.githubusercontent.com/golang/go/master/LICENSE'
+        },
+        {
+            'prefix': 'gopkg.in',
+            'license': 'GoPkg License',
+            'url': 'https://raw.githubusercontent.com/niemeyer/gopkg/master/LICENSE'
+        }
+    ],
+    'mappings': {
+        'google.golang.org/appengine': 'github.com/golang/appengine',
+        'google.golang.org/genproto': 'github.com/google/go-genproto',
+        'google.golang.org/grpc': 'github.com/grpc/grpc-go',
+        'gotest.tools': 'github.com/gotestyourself/gotest.tools',
+        'honnef.co/go/tools': 'github.com/dominikh/go-tools'
+    }
+}
 
 
 def scan(directory: str,
          dependancy_scanners: List[DependancyScanner],
          license_recognizers: List[Recognizer],
          license_acceptors: List[LicenseAcceptor] = None,
-         license_reporters: List[Reporter] = None) -> (List[LicenseReportEntry],
-                                                       List[LicenseReportEntry]):
+         license_reporters: List[Reporter] = None,
+         executor: Executor = None,
+         refresh: bool = False,
+         negative_ttls: Dict[str, float] = None) -> (List[LicenseReportEntry],
+                                                     List[LicenseReportEntry]):
     """Run a license scan on the given directory, using the given components.
        Returns a tuple with the list of all report entries and a list of report entries
-       whose licenses have not been accepted.
+       whose licenses have not been accepted, both sorted by package. The dependancies
+       are recognized and accepted as they are found, while the scan is still running.
+       If an executor is given, it is used to recognize the licenses, otherwise they
+       are recognized one at a time. If refresh is True, cached licenses are
+       revalidated where possible. Cached failures are retried after the number of
+       seconds given for their reason in negative_ttls. Once the dependancies have all
+       been found, the dependancy scanners are saved.
     """
 
     logging.info("Checking licenses in %s", directory)
-    entries = scan_all(directory, dependancy_scanners)
-    recognize_all(entries, license_recognizers)
-    unaccepted_entries = accept_all(entries, license_acceptors)
+    entries = []
+    unaccepted_entries = []
+    for entry in iter_recognize_all(iter_scan_all(directory, dependancy_scanners),
+                                    license_recognizers,
+                                    executor,
+                                    refresh,
+                                    negative_ttls):
+        entries.append(entry)
+        if not is_accepted(entry, license_acceptors):
+            unaccepted_entries.append(entry)
+    _save_dependancy_scanners(dependancy_scanners)
+    entries.sort(key=attrgetter('package'))
+    unaccepted_entries.sort(key=attrgetter('package'))
     if license_reporters is not None:
         report_all(entries, unaccepted_entries, license_reporters)
     return (entries, unaccepted_entries)
 
 
+def scan_modules(root: str,
+                 dependancy_scanners: List[DependancyScanner],
+                 license_recognizers: List[Recognizer],
+                 license_acceptors: List[LicenseAcceptor] = None,
+                 license_reporters: List[Reporter] = None,
+                 module_reporters: Callable[[str], List[Reporter]] = None,
+                 executor: Executor = None,
+                 refresh: bool = False,
+                 negative_ttls: Dict[str, float] = None) -> (List[LicenseReportEntry],
+                                                             List[LicenseReportEntry],
+                                                             Dict[str, Tuple[List, List]]):
+    """Run a license scan on every GO module found under root, such as in a monorepo.
+       The modules are scanned at the same time, using the executor if one is given,
+       and their dependancies are merged so that each package is only recognized
+       once. The license_reporters are given the combined results and, if given,
+       module_reporters is called with each module directory to get the reporters
+       for that module. Returns a tuple with the combined list of report entries, the
+       combined list of unaccepted entries and a dictionary mapping each module
+       directory to a tuple of its own two lists. Otherwise this works as scan.
+    """
+
+    logging.info("Checking licenses in all the modules under %s", root)
+    directories = find_module_directories(root)
+    if not directories:
+        raise RuntimeError("Could not find any modules under %s" % root)
+    logging.info("Found %d modules", len(directories))
+    modules = scan_all_modules(directories, dependancy_scanners, executor)
+    _save_dependancy_scanners(dependancy_scanners)
+    entries = merge_module_entries(modules)
+    recognize_all(entries, license_recognizers, executor, refresh, negative_ttls)
+    unaccepted_entries = accept_all(entries, license_acceptors)
+    if license_reporters is not None:
+        report_all(entries, unaccepted_entries, license_reporters)
+
+    recognized = {entry.package: entry for entry in entries}
+    unaccepted_packages = {entry.package for entry in unaccepted_entries}
+    results = {}
+    for (directory, module_entries) in modules.items():
+        module_entries = [_module_entry(recognized[e.package], e) for e in module_entries]
+        module_unaccepted = [e for e in module_entries if e.package in unaccepted_packages]
+        if module_reporters is not None:
+            report_all(module_entries, module_unaccepted, module_reporters(directory))
+        results[directory] = (module_entries, module_unaccepted)
+    return (entries, unaccepted_entries, results)
+
+
 def main():
     """'Default' main function that parses the command line, sets up the components,
        and scans the scan method. This main function assumes that all available
@@ -48,90 +153,310 @@ def main():
        recognizers, you will need to set them up and call scan yourself.
        """
 
+    parser = _argument_parser()
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    http = HttpClient(timeout=args.http_timeout,
+                      retries=args.http_retries,
+                      max_connections_per_host=max(args.jobs, args.fetch_jobs, 10))
+    url_cache = UrlTextCache(_url_cache_filename(args.url_cache, args.cache), http)
+    if args.refresh:
+        url_cache.max_age = 0
+
+    cache = _setup_cache(parser, args)
+    acceptors = _setup_acceptors(parser, args.auto_accept)
+    pdf_reporter = _setup_pdf_reporter(parser, args, http, url_cache)
+    reporters = []
+    if args.json:
+        reporters.append(JsonReporter(args.json))
+    if args.pdf:
+        reporters.append(pdf_reporter(args.pdf))
+    rule_set = _setup_rule_set(parser, args.rules)
+
+    directories = find_module_directories(os.getcwd()) if args.all_modules else [os.getcwd()]
+    vendor_dirs = [os.path.join(d, 'vendor') for d in directories if is_vendored(d)]
+    recognizers = _setup_recognizers(cache, http, args.github_token, rule_set, vendor_dirs)
+    (entries, unaccepted_entries) = _scan_working_directory(args, recognizers, acceptors,
+                                                            reporters, pdf_reporter)
+
+    _save_caches(cache, args.cache, args.compact_cache, url_cache)
+    _log_results(entries, unaccepted_entries, args.unaccepted_results)
+
+    if args.error_on_invalid:
+        sys.exit(len(unaccepted_entries))
+
+
+def _scan_working_directory(args: argparse.Namespace,
+                            recognizers: List[Recognizer],
+                            acceptors: List[LicenseAcceptor],
+                            reporters: List[Reporter],
+                            pdf_reporter: Callable[[str], PdfReporter]) -> (
+                                List[LicenseReportEntry], List[LicenseReportEntry]):
+    # Runs scan, or scan_modules with --all-modules, on the current directory.
+    negative_ttls = None
+    if args.negative_cache_ttl is not None:
+        negative_ttls = {reason: args.negative_cache_ttl * 60 * 60
+                         for reason in NEGATIVE_CACHE_TTLS}
+    scanners = _dependancy_scanners(args.no_go_toolchain, args.dependancy_cache)
+    executor = create_executor(args.executor, args.jobs)
+    if args.all_modules:
+        module_reporters = functools.partial(_module_reporters,
+                                             json_filename=args.module_json,
+                                             pdf_filename=args.module_pdf,
+                                             pdf_reporter=pdf_reporter)
+        (entries, unaccepted_entries, _) = scan_modules(root=os.getcwd(),
+                                                        dependancy_scanners=scanners,
+                                                        license_recognizers=recognizers,
+                                                        license_acceptors=acceptors,
+                                                        license_reporters=reporters,
+                                                        module_reporters=module_reporters,
+                                                        executor=executor,
+                                                        refresh=args.refresh,
+                                                        negative_ttls=negative_ttls)
+        return (entries, unaccepted_entries)
+    return scan(directory=os.getcwd(),
+                dependancy_scanners=scanners,
+                license_recognizers=recognizers,
+                license_acceptors=acceptors,
+                license_reporters=reporters,
+                executor=executor,
+                refresh=args.refresh,
+                negative_ttls=negative_ttls)
+
+def _argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument('--json', help='Generate a JSON license report in the given file')
     parser.add_argument('--pdf', help='Generate a PDF license report in the given file')
-    parser.add_argument('--cache', help='Name of JSON license cache file (auto-created)')
+    parser.add_argument('--pdf-layout',
+                        choices=PdfReporter.LAYOUTS,
+                        default='pages',
+                        help='Give each package a page with its license text (pages), or show '
+                        'each distinct license text once in an appendix (appendix).')
+    parser.add_argument('--pdf-chunk-size',
+                        type=int,
+                        help='Render the pages of the PDF reports in chunks of this many packages, '
+                        'using a process for each CPU, and merge them (requires pypdf).')
+    parser.add_argument('--pdf-volumes',
+                        action='store_true',
+                        help='With --pdf-chunk-size, write each chunk as a numbered volume '
+                        'instead of merging them.')
+    parser.add_argument('--cache',
+                        help='Name of JSON license cache file (auto-created). Names ending in '
+                        '%s are SQLite databases instead.' % ', '.join(_SQLITE_CACHE_SUFFIXES))
+    parser.add_argument('--cache-journal',
+                        action='store_true',
+                        help='Append cache changes to a journal next to the JSON cache file '
+                        'instead of rewriting it.')
+    parser.add_argument('--lazy-cache',
+                        action='store_true',
+                        help='Only decode the entries of the JSON cache file that are needed, '
+                        'using an index file next to it.')
+    parser.add_argument('--compact-cache',
+                        action='store_true',
+                        help='Compact the cache journal into the JSON cache file.')
+    parser.add_argument('--import-cache',
+                        help='Name of a JSON license cache file to import into the SQLite '
+                        'cache before scanning.')
+    parser.add_argument('--no-go-toolchain',
+                        action='store_true',
+                        help='Read the dependancies from go.mod and go.sum instead of running '
+                        '"go list" (the default if go is not installed).')
+    parser.add_argument('--dependancy-cache',
+                        help='Name of a JSON file used to save the "go list" results, which are '
+                        'reused until go.mod or go.sum change (auto-created).')
+    parser.add_argument('--rules',
+                        help='Name of a JSON or TOML file of additional prefix and GitHub '
+                        'mapping rules.')
+    parser.add_argument('--all-modules',
+                        action='store_true',
+                        help='Scan every GO module under the current directory, looking up each '
+                        'dependancy once. --json and --pdf produce the combined reports.')
+    parser.add_argument('--module-json',
+                        help='With --all-modules, generate a JSON license report for each module '
+                        'in the given file, relative to the module directory.')
+    parser.add_argument('--module-pdf',
+                        help='With --all-modules, generate a PDF license report for each module '
+                        'in the given file, relative to the module directory.')
+    parser.add_argument('--url-cache',
+                        help='Name of a JSON file used to save the license texts read from URLs '
+                        'for the PDF reports, which are shared by all the packages using them '
+                        '(auto-created, defaults to the --cache name ending in -urls.json).')
     parser.add_argument('--auto-accept', help='Name of JSON auto accept file')
     parser.add_argument('--unaccepted-results',
                         help='Name of JSON file created to hold unaccepted licenses.')
     parser.add_argument('--error-on-invalid',
                         action='store_true',
                         help='Exit with the number of unrecognized or unaccepted licenses.')
+    parser.add_argument('--refresh',
+                        action='store_true',
+                        help='Revalidate cached GitHub licenses and URL texts using conditional '
+                        'requests.')
+    parser.add_argument('--negative-cache-ttl',
+                        type=float,
+                        help='Hours before packages whose license could not be found are '
+                        'looked up again (0 to always look them up).')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Maximum number of licenses to look up at the same time.')
+    parser.add_argument('--executor',
+                        choices=['serial', 'thread', 'asyncio'],
+                        default='thread',
+                        help='How the license lookups are run when --jobs is more than 1.')
+    parser.add_argument('--fetch-jobs',
+                        type=int,
+                        default=8,
+                        help='Maximum number of license texts read at the same time for the PDF '
+                        'reports.')
+    parser.add_argument('--github-token',
+                        default=os.environ.get('GITHUB_TOKEN', None),
+                        help='GitHub access token used to look up the licenses in batches '
+                        '(defaults to the GITHUB_TOKEN environment variable).')
+    parser.add_argument('--http-timeout',
+                        type=float,
+                        default=30,
+                        help='Seconds to wait for a response before a request fails.')
+    parser.add_argument('--http-retries',
+                        type=int,
+                        default=3,
+                        help='Number of times a failed request is retried.')
     parser.add_argument('--verbose', action='store_true', help='Show debugging information')
-    args = parser.parse_args()
-
-    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    return parser
 
+def _setup_cache(parser: argparse.ArgumentParser, args: argparse.Namespace) -> LicenseCache:
     cache = None
     if args.cache:
-        cache = JsonFileLicenseCache(args.cache)
+        cache = _open_cache(args.cache, args.cache_journal, args.lazy_cache)
+    if args.import_cache:
+        if not isinstance(cache, SqliteLicenseCache):
+            parser.error("--import-cache requires an SQLite --cache")
+        cache.import_json_file(args.import_cache)
+    return cache
 
+def _setup_acceptors(parser: argparse.ArgumentParser, auto_accept: str) -> List[LicenseAcceptor]:
     acceptors = None
-    if args.auto_accept:
+    if auto_accept:
         try:
-            with open(args.auto_accept) as json_file:
+            with open(auto_accept) as json_file:
                 json_data = json.load(json_file)
             acceptors = [JsonFileLicenseAcceptor(json_data)]
         except FileNotFoundError:
-            logging.warning('Could not find %s, auto-accept ignored', args.auto_accept)
-            acceptors = None
+            logging.warning('Could not find %s, auto-accept ignored', auto_accept)
+        except ValueError as ex:
+            parser.error("--auto-accept: %s" % ex)
+    return acceptors
 
-    reporters = []
-    if args.json:
-        reporters.append(JsonReporter(args.json))
-    if args.pdf:
-        reporters.append(PdfReporter(args.pdf, cache))
+def _setup_pdf_reporter(parser: argparse.ArgumentParser,
+                        args: argparse.Namespace,
+                        http: HttpClient,
+                        url_cache: UrlTextCache) -> Callable[[str], PdfReporter]:
+    # The PdfReporter for a file name, so that all the reports share the same options.
+    try:
+        PdfReporter.check_options(args.pdf_layout, args.pdf_chunk_size, args.pdf_volumes)
+    except ValueError as ex:
+        parser.error("PDF options: %s" % ex)
+    return functools.partial(PdfReporter,
+                             http=http,
+                             executor=create_executor('thread', args.fetch_jobs),
+                             url_cache=url_cache,
+                             layout=args.pdf_layout,
+                             chunk_size=args.pdf_chunk_size,
+                             volumes=args.pdf_volumes)
 
-    (entries, unaccepted_entries) = scan(directory=os.getcwd(),
-                                         dependancy_scanners=_DEPENDANCY_SCANNERS,
-                                         license_recognizers=_setup_recognizers(cache),
-                                         license_acceptors=acceptors,
-                                         license_reporters=reporters)
+def _setup_rule_set(parser: argparse.ArgumentParser, filename: str) -> RuleSet:
+    rule_set = None
+    if filename:
+        try:
+            rule_set = load_rule_set(filename)
+        except (OSError, ValueError) as ex:
+            parser.error("--rules: %s" % ex)
+    return rule_set
 
+def _save_caches(cache: LicenseCache, filename: str, compact: bool, url_cache: UrlTextCache):
     if cache is not None:
+        if compact and isinstance(cache, JsonFileLicenseCache):
+            cache.compact()
         if cache.update_cache_file():
-            logging.info("The cache file %s has been changed.", args.cache)
+            logging.info("The cache file %s has been changed.", filename)
+    if url_cache.save():
+        logging.info("The URL cache file %s has been changed.", url_cache.filename)
 
+def _log_results(entries: List[LicenseReportEntry],
+                 unaccepted_entries: List[LicenseReportEntry],
+                 unaccepted_filename: str):
     logging.info("Total dependancies examined: %d", len(entries))
-    unaccepted_count = len(unaccepted_entries)
-    if unaccepted_count > 0:
-        logging.info("Number of unaccepted licenses: %d", unaccepted_count)
-        _write_unaccepted_licenses(args.unaccepted_results, unaccepted_entries)
+    if unaccepted_entries:
+        logging.info("Number of unaccepted licenses: %d", len(unaccepted_entries))
+        _write_unaccepted_licenses(unaccepted_filename, unaccepted_entries)
         for entry in unaccepted_entries:
             if entry.license_name is None:
                 logging.info("  %s (** Unidentified **)", entry.package)
             else:
                 logging.info("  %s (%s)", entry.package, entry.license_name)
 
-    if args.error_on_invalid:
-        sys.exit(unaccepted_count)
+def _module_reporters(directory: str,
+                      json_filename: str,
+                      pdf_filename: str,
+                      pdf_reporter: Callable[[str], PdfReporter]) -> List[Reporter]:
+    reporters = []
+    if json_filename:
+        reporters.append(JsonReporter(os.path.join(directory, json_filename)))
+    if pdf_filename:
+        reporters.append(pdf_reporter(os.path.join(directory, pdf_filename)))
+    return reporters
 
+def _module_entry(recognized: LicenseReportEntry,
+                  scanned: LicenseReportEntry) -> LicenseReportEntry:
+    # The recognized entry with the dependancy information of a single module.
+    entry = copy.copy(recognized)
+    for (key, value) in scanned.__dict__.items():
+        if key.startswith('dependancy_'):
+            setattr(entry, key, value)
+    return entry
 
-def _setup_recognizers(cache: LicenseCache) -> List[Recognizer]:
-    misc_to_github_mapping = {
-        'google.golang.org/appengine': 'github.com/golang/appengine',
-        'google.golang.org/genproto': 'github.com/google/go-genproto',
-        'google.golang.org/grpc': 'github.com/grpc/grpc-go',
-        'gotest.tools': 'github.com/gotestyourself/gotest.tools',
-        'honnef.co/go/tools': 'github.com/dominikh/go-tools'
-    }
-    go_lang_license_url = "https://raw.githubusercontent.com/golang/go/master/LICENSE"
-    go_pkg_license_url = "https://raw.githubusercontent.com/niemeyer/gopkg/master/LICENSE"
-
-    return [
-        GitHubRecognizer(cache),
-        MappedToGitHubRecognizer(misc_to_github_mapping, cache),
-        CommonPrefixRecognizer("cloud.google.com",
-                               "Apache License 2.0",
-                               "http://www.apache.org/licenses/LICENSE-2.0.txt",
-                               cache),
-        CommonPrefixRecognizer("golang.org",
-                               "Go Standard Library License",
-                               go_lang_license_url,
-                               cache),
-        CommonPrefixRecognizer("gopkg.in", "GoPkg License", go_pkg_license_url, cache)
-    ]
+def _save_dependancy_scanners(dependancy_scanners: List[DependancyScanner]):
+    for scanner in dependancy_scanners:
+        if scanner.save():
+            logging.debug("  saved %s", type(scanner).__name__)
+
+def _dependancy_scanners(no_go_toolchain: bool,
+                         dependancy_cache: str = None) -> List[DependancyScanner]:
+    if no_go_toolchain or shutil.which('go') is None:
+        return [VendorDependancyScanner(), GoModFileDependancyScanner()]
+    return [VendorDependancyScanner(), GoModuleDependancyScanner(dependancy_cache)]
+
+def _url_cache_filename(url_cache: str, cache: str) -> str:
+    # Without a file of its own, the URL cache is kept next to the license cache.
+    if url_cache or not cache:
+        return url_cache or None
+    return os.path.splitext(cache)[0] + "-urls.json"
+
+def _open_cache(filename: str, journal: bool, lazy: bool) -> LicenseCache:
+    if pathlib.Path(filename).suffix in _SQLITE_CACHE_SUFFIXES:
+        return SqliteLicenseCache(filename)
+    return JsonFileLicenseCache(filename, journal=journal, lazy=lazy)
+
+def _setup_recognizers(cache: LicenseCache,
+                       http: HttpClient,
+                       github_token: str = None,
+                       rule_set: RuleSet = None,
+                       vendor_dirs: List[str] = None) -> List[Recognizer]:
+    rate_limit = GitHubRateLimit(http)
+
+    recognizers = []
+    if vendor_dirs:
+        recognizers.append(VendorRecognizer(vendor_dirs, cache))
+    recognizers.append(GoModuleCacheRecognizer(cache))
+    if github_token:
+        recognizers.append(GitHubGraphQLRecognizer(github_token, cache, http=http))
+    recognizers.append(GitHubRecognizer(cache, rate_limit, http))
+    if rule_set is not None:
+        recognizers.append(RuleSetRecognizer(rule_set, cache, rate_limit, http))
+    default_rule_set = RuleSet.from_json(_DEFAULT_RULES)
+    recognizers.append(RuleSetRecognizer(default_rule_set, cache, rate_limit, http))
+    return recognizers
 
 def _write_unaccepted_licenses(filename: str, unaccepted_entries: List[LicenseReportEntry]):
     if filename:
@@ -0,0 +1,148 @@
+
+"""URL text caching
+
+This module provides a cache of the plain text documents, such as license texts, read
+from URLs. Many packages share the same license URL, so each document is read once and
+then shared by everything that needs it. The cache may be saved in a JSON file, so that
+the documents are also reused by later runs.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from typing import Dict
+
+import requests
+
+from .httpclient import HttpClient, default_client
+
+
+class UrlTextCache:
+    """Cache of the plain text documents read from URLs, using the given HttpClient or
+       the default one if none is given. Responses that are not successful, or whose
+       Content-Type is not text/plain, are not cached.
+
+       If a filename is given, the cache is read from that file and save writes it
+       back. A cached document is used for max_age seconds after it was read, after
+       which it is revalidated with a conditional request using the ETag and
+       Last-Modified headers of its response, so that it is only read again if it
+       has changed. If it cannot be revalidated, because no response could be
+       obtained or the server failed, the cached document is used until a later
+       revalidation succeeds.
+
+       The cache may be shared by any number of threads. Each URL is read by only one
+       of them at a time, so those wanting the same document wait for it to be read
+       rather than reading it again.
+    """
+
+    _FORMAT_VERSION = 1
+
+    def __init__(self,
+                 filename: str = None,
+                 http: HttpClient = None,
+                 max_age: float = 30 * 24 * 60 * 60):
+        self.filename = filename
+        self.http = http if http is not None else default_client()
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._documents = None
+        self._is_dirty = False
+        self._url_locks = {}
+
+    def read(self, url: str) -> str:
+        """Returns the text of the document at url. Raises a ValueError if the
+           response is not a successful plain text one, and a
+           requests.exceptions.RequestException if no response could be obtained and
+           the document is not cached.
+        """
+        with self._url_lock(url):
+            return self._read(url)
+
+    def _read(self, url: str) -> str:
+        with self._lock:
+            cached = self._load().get(url, None)
+        if cached is not None and cached['read_at'] + self.max_age > time.time():
+            return cached['text']
+
+        headers = {}
+        if cached is not None and cached['etag'] is not None:
+            headers['If-None-Match'] = cached['etag']
+        if cached is not None and cached['last_modified'] is not None:
+            headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            resp = self.http.get(url, headers=headers or None)
+        except requests.exceptions.RequestException as ex:
+            if cached is None:
+                raise
+            logging.warning("  could not revalidate %s, using the cached text: %s", url, ex)
+            return cached['text']
+        if resp.status_code >= 500 and cached is not None:
+            logging.warning("  could not revalidate %s, using the cached text: response=%d",
+                            url, resp.status_code)
+            return cached['text']
+        if resp.status_code == 304 and cached is not None:
+            logging.debug("  %s has not changed", url)
+            self._store(url, dict(cached, read_at=time.time()))
+            return cached['text']
+        if resp.status_code < 200 or resp.status_code >= 300:
+            raise ValueError("bad response from %s, response=%d" % (url, resp.status_code))
+        content_type = resp.headers.get('Content-Type', '')
+        if not content_type.startswith('text/plain'):
+            raise ValueError("%s is not plain text (%s)" % (url, content_type))
+        self._store(url, {
+            'text': resp.text,
+            'content_type': content_type,
+            'etag': resp.headers.get('ETag', None),
+            'last_modified': resp.headers.get('Last-Modified', None),
+            'read_at': time.time()
+        })
+        return resp.text
+
+    def save(self) -> bool:
+        """Write the cache to its file, if it has one and it has changed. Returns True
+           if the file was written.
+        """
+        with self._lock:
+            if self.filename is None or not self._is_dirty:
+                return False
+            data = {'version': self._FORMAT_VERSION, 'documents': self._documents}
+            tmp_filename = self.filename + ".tmp"
+            try:
+                with open(tmp_filename, 'w') as outfile:
+                    json.dump(data, outfile, indent=4, sort_keys=True)
+                os.replace(tmp_filename, self.filename)
+            except OSError as ex:
+                logging.warning("  could not save the URL cache to %s: %s", self.filename, ex)
+                return False
+            self._is_dirty = False
+            return True
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _store(self, url: str, document: Dict):
+        with self._lock:
+            self._load()[url] = document
+            self._is_dirty = True
+
+    def _load(self) -> Dict:
+        if self._documents is None:
+            self._documents = {}
+            if self.filename is None:
+                return self._documents
+            try:
+                with open(self.filename) as infile:
+                    data = json.load(infile)
+                if data.get('version') == self._FORMAT_VERSION:
+                    self._documents = dict(data['documents'])
+                else:
+                    logging.info("  ignoring %s, it is from a different version", self.filename)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, LookupError, TypeError, AttributeError):
+                logging.warning("  ignoring the unreadable URL cache %s", self.filename)
+        return self._documents
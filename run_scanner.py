@@ -2,4 +2,5 @@
 
 from license_scanner.scanner import main
 
-main()
+if __name__ == '__main__':
+    main()
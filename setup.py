@@ -13,9 +13,15 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://scm01.frauscher.intern/fts/rnd/docker/license-check.git",
     packages=setuptools.find_packages(),
+    package_data={
+        'license_scanner': ['licenses/*.txt']
+    },
     install_requires=[
         'fpdf', 'requests'
     ],
+    extras_require={
+        'pdf-merge': ['pypdf>=3']
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: Other/Proprietary License",
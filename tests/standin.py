@@ -0,0 +1,55 @@
+import http.server
+import json
+import threading
+
+
+class StandInServer:
+    """Local HTTP server standing in for a remote one. Each request is recorded and
+       passed to the handler, which returns a (status, body) or (status, body, headers)
+       tuple. A bytes body is sent as plain text, anything else as JSON.
+    """
+
+    def __init__(self, handler):
+        self.requests = []
+        self._handler = handler
+        outer = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._handle(None)
+
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                self._handle(json.loads(self.rfile.read(length)))
+
+            def _handle(self, body):
+                request = {'method': self.command,
+                           'path': self.path,
+                           'headers': dict(self.headers),
+                           'body': body}
+                outer.requests.append(request)
+                reply = outer._handler(request)
+                if isinstance(reply[1], bytes):
+                    (content_type, data) = ('text/plain', reply[1])
+                else:
+                    (content_type, data) = ('application/json',
+                                            json.dumps(reply[1]).encode('utf-8'))
+                self.send_response(reply[0])
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for (key, value) in (reply[2] if len(reply) > 2 else {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -42,6 +42,51 @@ class TestJsonFileLicenseAcceptor(unittest.TestCase):
                                                            [_DummyAcceptor(), self.acceptor]))
         self.assertEqual(unaccepted, ["four", "ninexaaa"])
 
+    def test_patterns(self):
+        json_data = {
+            "allowedLicenses": [
+                { "moduleLicense": "MIT", "moduleName": "github.com/org/*" },
+                { "moduleLicense": "MIT", "moduleName": "github.com/*/tools" },
+                { "moduleLicense": "MIT", "moduleName": "gopkg.in/yaml.v2" },
+                { "moduleLicense": "BSD", "moduleName": "golang.org/x/*" }
+            ]
+        }
+        acceptor = acceptors.JsonFileLicenseAcceptor(json_data)
+        self.assertTrue(acceptor.accept_or_reject(_entry("github.com/org/repo", "MIT")))
+        self.assertTrue(acceptor.accept_or_reject(_entry("github.com/other/tools", "MIT")))
+        self.assertTrue(acceptor.accept_or_reject(_entry("gopkg.in/yaml.v2", "MIT")))
+        self.assertTrue(acceptor.accept_or_reject(_entry("golang.org/x/net", "BSD")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("github.com/other/repo", "MIT")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("gopkg.in/yamlxv2", "MIT")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("golang.org/x/net", "MIT")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("github.com/org/repo", "GPL")))
+        self.assertIsNone(acceptor.accept_or_reject(_entry("github.com/org/repo", None)))
+
+    def test_patterns_that_cannot_be_combined(self):
+        json_data = {
+            "allowedLicenses": [
+                { "moduleLicense": "MIT", "moduleName": "github.com/*/tools" },
+                { "moduleLicense": "MIT", "moduleName": "(?i)github.com/ORG/*" },
+                { "moduleLicense": "MIT", "moduleName": "github.com/([a-z]+)/\\1-go" }
+            ]
+        }
+        acceptor = acceptors.JsonFileLicenseAcceptor(json_data)
+        self.assertTrue(acceptor.accept_or_reject(_entry("github.com/other/tools", "MIT")))
+        self.assertTrue(acceptor.accept_or_reject(_entry("github.com/org/repo", "MIT")))
+        self.assertTrue(acceptor.accept_or_reject(_entry("github.com/yaml/yaml-go", "MIT")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("github.com/yaml/toml-go", "MIT")))
+        self.assertFalse(acceptor.accept_or_reject(_entry("github.com/other/repo", "MIT")))
+
+    def test_invalid_pattern(self):
+        json_data = {
+            "allowedLicenses": [
+                { "moduleLicense": "MIT", "moduleName": "github.com/org/*" },
+                { "moduleLicense": "MIT", "moduleName": "github.com/(org/*" }
+            ]
+        }
+        with self.assertRaisesRegex(ValueError, r"github\.com/\(org/\*"):
+            acceptors.JsonFileLicenseAcceptor(json_data)
+
 
 class _DummyAcceptor(acceptors.LicenseAcceptor):
     def accept_or_reject(self, entry: LicenseReportEntry) -> bool:
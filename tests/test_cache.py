@@ -1,8 +1,11 @@
 
+import base64
+import json
+import os
 import tempfile
 import unittest
 
-from license_scanner.cache import LicenseReportEntry, JsonFileLicenseCache
+from license_scanner.cache import LicenseReportEntry, JsonFileLicenseCache, SqliteLicenseCache
 
 
 class TestJsonFileLicenseCache(unittest.TestCase):
@@ -32,6 +35,226 @@ class TestJsonFileLicenseCache(unittest.TestCase):
         self.assertEqual(ch.read("one"), LicenseReportEntry(package="one"))
         self.assertEqual(ch.read("two"), LicenseReportEntry(package="two"))
 
+    def test_journaled_writes(self):
+        filename = _temp_filename()
+        _setup_file(filename)
+        ch = JsonFileLicenseCache(filename, journal=True)
+        ch.write(LicenseReportEntry(package="three", license_name="MIT"))
+        ch.write(LicenseReportEntry(package="one", license_name="BSD"))
+        self.assertFalse(ch.update_cache_file())
+        with open(filename + ".journal") as journal_file:
+            self.assertEqual(2, len(journal_file.readlines()))
+
+        with open(filename + ".journal", 'a') as journal_file:
+            journal_file.write('{"package": "incomplete", "lic')
+        ch = JsonFileLicenseCache(filename, journal=True)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_name="BSD"))
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two"))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_name="MIT"))
+        self.assertIsNone(ch.read("incomplete"))
+        self.assertFalse(ch.update_cache_file())
+
+        ch.compact()
+        self.assertEqual(0, os.path.getsize(filename + ".journal"))
+        ch = JsonFileLicenseCache(filename)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_name="BSD"))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_name="MIT"))
+
+    def test_corrupt_journal_entries_are_skipped(self):
+        filename = _temp_filename()
+        ch = JsonFileLicenseCache(filename, journal=True)
+        ch.write(LicenseReportEntry(package="one", license_name="MIT"))
+        with open(filename + ".journal", 'a') as journal_file:
+            journal_file.write('{"package": "corrupt", \n')
+        ch.write(LicenseReportEntry(package="two", license_name="BSD"))
+        size = os.path.getsize(filename + ".journal")
+
+        ch = JsonFileLicenseCache(filename, journal=True)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_name="MIT"))
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two", license_name="BSD"))
+        self.assertIsNone(ch.read("corrupt"))
+        self.assertEqual(size, os.path.getsize(filename + ".journal"))
+
+    def test_journal_is_replayed_without_journaling(self):
+        filename = _temp_filename()
+        _setup_file(filename)
+        ch = JsonFileLicenseCache(filename, journal=True)
+        ch.write(LicenseReportEntry(package="three", license_name="MIT"))
+
+        ch = JsonFileLicenseCache(filename)
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_name="MIT"))
+        self.assertTrue(ch.update_cache_file())
+        self.assertEqual(0, os.path.getsize(filename + ".journal"))
+        self.assertEqual(JsonFileLicenseCache(filename).read("three"),
+                         LicenseReportEntry(package="three", license_name="MIT"))
+
+    def test_journal_is_compacted_past_threshold(self):
+        filename = _temp_filename()
+        ch = JsonFileLicenseCache(filename, journal=True, compact_threshold=10)
+        ch.write(LicenseReportEntry(package="one", license_name="MIT"))
+        self.assertTrue(ch.update_cache_file())
+        self.assertEqual(0, os.path.getsize(filename + ".journal"))
+        self.assertEqual(JsonFileLicenseCache(filename).read("one"),
+                         LicenseReportEntry(package="one", license_name="MIT"))
+
+    def test_license_texts_are_stored_once(self):
+        filename = _temp_filename()
+        ch = JsonFileLicenseCache(filename)
+        ch.write(LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="two", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="three", license_encoded=_MIT_WRAPPED))
+        ch.write(LicenseReportEntry(package="four", license_encoded=_BSD))
+        ch.update_cache_file()
+
+        with open(filename) as json_file:
+            data = json.load(json_file)
+        self.assertEqual(3, len(data['license-texts']))
+        for lic in data['resolved-licenses']:
+            self.assertNotIn('license_encoded', lic)
+
+        ch = JsonFileLicenseCache(filename)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_encoded=_MIT))
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two", license_encoded=_MIT))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_encoded=_MIT_WRAPPED))
+        self.assertEqual(ch.read("four"), LicenseReportEntry(package="four",
+                                                             license_encoded=_BSD))
+
+    def test_old_format_is_read(self):
+        filename = _temp_filename()
+        with open(filename, 'w') as json_file:
+            json.dump({'resolved-licenses': [{'package': 'one', 'license_encoded': _MIT}]},
+                      json_file)
+        ch = JsonFileLicenseCache(filename, journal=True)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="two", license_encoded=_BSD))
+        ch = JsonFileLicenseCache(filename, journal=True)
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two", license_encoded=_BSD))
+
+    def test_lazy_loading(self):
+        filename = _temp_filename()
+        ch = JsonFileLicenseCache(filename)
+        ch.write(LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="two", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="three", license_name="BSD"))
+        ch.update_cache_file()
+
+        ch = JsonFileLicenseCache(filename, lazy=True)
+        self.assertEqual(0, len(ch._resolved))
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two", license_encoded=_MIT))
+        self.assertIsNone(ch.read("not there"))
+        self.assertEqual(1, len(ch._resolved))
+        self.assertTrue(os.path.exists(filename + ".index"))
+
+        ch.write(LicenseReportEntry(package="four", license_encoded=_BSD))
+        self.assertTrue(ch.update_cache_file())
+        self.assertEqual(ch.read("four"), LicenseReportEntry(package="four",
+                                                             license_encoded=_BSD))
+
+        ch = JsonFileLicenseCache(filename, lazy=True)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_encoded=_MIT))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_name="BSD"))
+        self.assertEqual(ch.read("four"), LicenseReportEntry(package="four",
+                                                             license_encoded=_BSD))
+
+    def test_lazy_loading_without_a_writable_index(self):
+        filename = _temp_filename()
+        ch = JsonFileLicenseCache(filename)
+        ch.write(LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.update_cache_file()
+        os.mkdir(filename + ".index")
+
+        ch = JsonFileLicenseCache(filename, lazy=True)
+        self.assertIsNone(ch._lazy_file)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_encoded=_MIT))
+
+    def test_lazy_loading_of_old_format(self):
+        filename = _temp_filename()
+        with open(filename, 'w') as json_file:
+            json.dump({'resolved-licenses': [{'package': 'one', 'license_encoded': _MIT}]},
+                      json_file,
+                      indent=4)
+        ch = JsonFileLicenseCache(filename, lazy=True)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one", license_encoded=_MIT))
+
+
+class TestSqliteLicenseCache(unittest.TestCase):
+
+    def test_cache_read_and_write(self):
+        ch = SqliteLicenseCache(_temp_filename())
+        self.assertIsNone(ch.read("my package name"))
+
+        ch.write(LicenseReportEntry(package="my package name", license_name="license"))
+        self.assertEqual(ch.read("my package name"),
+                         LicenseReportEntry(package="my package name",
+                                            license_name="license"))
+        self.assertTrue(ch.update_cache_file())
+        self.assertEqual(ch.read("my package name"),
+                         LicenseReportEntry(package="my package name",
+                                            license_name="license"))
+        ch.close()
+
+    def test_file_write_and_restore(self):
+        filename = _temp_filename()
+        ch = SqliteLicenseCache(filename, batch_size=2)
+        for name in ["one", "two", "three"]:
+            ch.write(LicenseReportEntry(package=name, license_name="MIT"))
+        ch.close()
+
+        ch = SqliteLicenseCache(filename)
+        self.assertIsNone(ch.read("not there"))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_name="MIT"))
+        self.assertFalse(ch.update_cache_file())
+        ch.close()
+
+    def test_import_json_file(self):
+        json_filename = _temp_filename()
+        _setup_file(json_filename)
+        ch = SqliteLicenseCache(_temp_filename())
+        self.assertEqual(ch.import_json_file(json_filename), 2)
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one"))
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two"))
+        ch.close()
+
+    def test_license_texts_are_stored_once(self):
+        filename = _temp_filename()
+        ch = SqliteLicenseCache(filename)
+        ch.write(LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="two", license_encoded=_MIT))
+        ch.write(LicenseReportEntry(package="three", license_encoded=_MIT_WRAPPED))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_encoded=_MIT_WRAPPED))
+        ch.close()
+
+        ch = SqliteLicenseCache(filename)
+        self.assertEqual(ch.read("two"), LicenseReportEntry(package="two",
+                                                            license_encoded=_MIT))
+        self.assertEqual(ch.read("three"), LicenseReportEntry(package="three",
+                                                              license_encoded=_MIT_WRAPPED))
+        count = ch._connection.execute("SELECT COUNT(*) FROM license_texts").fetchone()[0]
+        self.assertEqual(2, count)
+        ch.close()
+
+    def test_missing_license_text(self):
+        filename = _temp_filename()
+        ch = SqliteLicenseCache(filename)
+        ch.write(LicenseReportEntry(package="one", license_encoded=_MIT))
+        ch.update_cache_file()
+        with ch._connection:
+            ch._connection.execute("DELETE FROM license_texts")
+        self.assertEqual(ch.read("one"), LicenseReportEntry(package="one"))
+        ch.close()
+
+
+_MIT = base64.b64encode(b"The MIT License\n\nPermission is hereby granted...").decode('ascii')
+_MIT_WRAPPED = _MIT[:20] + "\n" + _MIT[20:]
+_BSD = base64.b64encode(b"BSD 3-Clause License\n\nRedistribution and use...").decode('ascii')
+
 
 def _setup_file(filename: str):
     ch = JsonFileLicenseCache(filename)
@@ -0,0 +1,91 @@
+import os
+import unittest
+
+from license_scanner.classifier import LicenseClassifier, normalize
+
+
+class TestLicenseClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = LicenseClassifier()
+
+    def _template(self, spdx_id: str) -> str:
+        with open(os.path.join(self.classifier.corpus_dir, spdx_id + ".txt")) as infile:
+            return infile.read()
+
+    def test_normalize(self):
+        self.assertEqual(normalize("Copyright (c) 2020 Someone\nThe  MIT Licence,\n<year>"),
+                         ['the', 'mit', 'license'])
+        self.assertEqual(normalize("  2. Neither the name of Google Inc. nor the names of"),
+                         ['neither', 'the', 'name', 'of', 'the', 'copyright', 'holder',
+                          'nor', 'the', 'names', 'of'])
+
+    def test_bundled_texts(self):
+        for spdx_id in ['Apache-2.0', 'BSD-2-Clause', 'BSD-3-Clause', 'GPL-3.0', 'ISC', 'MIT']:
+            match = self.classifier.classify(self._template(spdx_id))
+            self.assertEqual(match.spdx_id, spdx_id)
+            self.assertAlmostEqual(match.score, 1.0)
+
+    def test_reformatted_text(self):
+        text = "Copyright 2019 The Project Authors\n\n" + " ".join(self._template('MIT').split())
+        match = self.classifier.classify(text.upper())
+        self.assertEqual(match.spdx_id, 'MIT')
+        self.assertEqual(match.name, 'MIT License')
+
+    def test_bsd_variants(self):
+        text = self._template('BSD-3-Clause').replace("the copyright holder", "Google Inc.")
+        self.assertEqual(self.classifier.classify(text).spdx_id, 'BSD-3-Clause')
+
+    def test_go_bsd_license(self):
+        match = self.classifier.classify(_GO_LICENSE)
+        self.assertEqual(match.spdx_id, 'BSD-3-Clause')
+        self.assertGreater(match.score, 0.95)
+
+    def test_dual_licenses(self):
+        text = self._template('MIT') + "\n\n" + self._template('Apache-2.0')
+        self.assertIsNone(self.classifier.classify(text))
+        text = self._template('BSD-3-Clause') + "\nThe tests are in the public domain.\n"
+        self.assertEqual(self.classifier.classify(text).spdx_id, 'BSD-3-Clause')
+
+    def test_unknown_text(self):
+        self.assertIsNone(self.classifier.classify("All rights reserved. Do not copy."))
+        self.assertIsNone(self.classifier.classify(""))
+
+    def test_classify_all(self):
+        texts = [self._template('MIT'), "nothing", self._template('Apache-2.0')] * 2
+        matches = self.classifier.classify_all(texts)
+        self.assertEqual(len(matches), len(texts))
+        self.assertEqual(matches[0].spdx_id, 'MIT')
+        self.assertIsNone(matches[1])
+        self.assertEqual(matches[-1].spdx_id, 'Apache-2.0')
+        self.assertEqual(matches, [self.classifier.classify(text) for text in texts])
+
+
+_GO_LICENSE = """Copyright (c) 2009 The Go Authors. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+   * Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+   * Redistributions in binary form must reproduce the above
+copyright notice, this list of conditions and the following disclaimer
+in the documentation and/or other materials provided with the
+distribution.
+   * Neither the name of Google Inc. nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
@@ -0,0 +1,355 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Iterator, List
+
+import license_scanner.dependancies as dependancies
+from license_scanner.cache import LicenseReportEntry
+
+
+class TestScanAll(unittest.TestCase):
+    def setUp(self):
+        self.scanners = [
+            _ListScanner("first", ["b", "a", "c"]),
+            _ListScanner("unused", ["z"], can_handle=False),
+            _StreamingScanner("second", ["d", "a"])
+        ]
+
+    def test_scan_all(self):
+        entries = dependancies.scan_all("/tmp", self.scanners)
+        self.assertEqual([e.package for e in entries], ["a", "b", "c", "d"])
+        self.assertEqual(entries[0].dependancy_scanner_name, "first")
+
+    def test_iter_scan_all(self):
+        entries = dependancies.iter_scan_all("/tmp", self.scanners)
+        first = next(entries)
+        self.assertEqual(first.package, "b")
+        self.assertEqual(self.scanners[2].produced, 0)
+        self.assertEqual([e.package for e in entries], ["a", "c", "d"])
+        self.assertEqual(self.scanners[2].produced, 2)
+
+    def test_no_scanner(self):
+        with self.assertRaises(RuntimeError):
+            list(dependancies.iter_scan_all("/tmp", [_ListScanner("unused", [], False)]))
+
+
+class TestGoModFileDependancyScanner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="/tmp/license-scanner-gomod-test")
+        with open(self.directory + "/go.mod", "w") as outfile:
+            outfile.write(_GO_MOD)
+        with open(self.directory + "/go.sum", "w") as outfile:
+            outfile.write(_GO_SUM)
+        self.scanner = dependancies.GoModFileDependancyScanner()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse(self):
+        go_mod = dependancies.GoModFile.parse(_GO_MOD)
+        self.assertEqual(go_mod.module, "example.com/main")
+        self.assertEqual(go_mod.requires["github.com/pkg/errors"], ("v0.9.1", False))
+        self.assertEqual(go_mod.requires["golang.org/x/sys"], ("v0.1.0", True))
+        self.assertEqual(go_mod.requires["gopkg.in/yaml.v2"], ("v2.4.0", False))
+        self.assertEqual(go_mod.replacement("github.com/old/repo", "v1.0.0"),
+                         ("github.com/new/repo", "v1.1.0"))
+        self.assertEqual(go_mod.replacement("example.com/local", "v0.0.0"), ("../local", None))
+        self.assertIsNone(go_mod.replacement("github.com/pkg/errors", "v0.9.1"))
+        self.assertEqual(go_mod.excludes, {("github.com/davecgh/go-spew", "v1.1.1")})
+
+    def test_scan(self):
+        self.assertTrue(self.scanner.can_handle(self.directory))
+        entries = self.scanner.scan(self.directory)
+        self.assertEqual([(e.package, e.dependancy_is_indirect) for e in entries], [
+            ("example.com/local", False),
+            ("github.com/davecgh/go-spew", True),
+            ("github.com/old/repo", False),
+            ("github.com/pkg/errors", False),
+            ("golang.org/x/sys", True),
+            ("gopkg.in/yaml.v2", False)
+        ])
+        self.assertEqual(entries[0].dependancy_scanner_name, "GoModFileDependancyScanner")
+
+    def test_go_mod_versions_are_kept(self):
+        with open(self.directory + "/go.sum", "a") as outfile:
+            outfile.write("github.com/pkg/errors v0.9.2 h1:abc=\n")
+        entries = self.scanner.scan(self.directory)
+        versions = {e.package: e.dependancy_version for e in entries}
+        self.assertEqual(versions["github.com/pkg/errors"], "v0.9.1")
+        self.assertEqual(versions["github.com/davecgh/go-spew"], "v1.1.0")
+
+    def test_scan_without_go_sum(self):
+        os.remove(self.directory + "/go.sum")
+        entries = self.scanner.scan(self.directory)
+        self.assertEqual(len(entries), 5)
+
+    def test_version_order(self):
+        versions = ["v1.10.0", "v1.2.0", "v1.2.0-rc.1", "v1.2.0-beta.2", "v1.2.0-beta.10",
+                    "v2.0.0+incompatible"]
+        self.assertEqual(sorted(versions, key=dependancies._version_key),
+                         ["v1.2.0-beta.2", "v1.2.0-beta.10", "v1.2.0-rc.1", "v1.2.0",
+                          "v1.10.0", "v2.0.0+incompatible"])
+
+
+class TestVendorDependancyScanner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="/tmp/license-scanner-vendor-test")
+        with open(self.directory + "/go.mod", "w") as outfile:
+            outfile.write(_GO_MOD)
+        self.scanner = dependancies.VendorDependancyScanner()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_modules_txt(self):
+        os.makedirs(self.directory + "/vendor")
+        with open(self.directory + "/vendor/modules.txt", "w") as outfile:
+            outfile.write(_MODULES_TXT)
+
+    def test_parse(self):
+        self.assertEqual(dependancies.parse_vendor_modules(_MODULES_TXT), [
+            ("github.com/pkg/errors", "v0.9.1", True),
+            ("github.com/old/repo", "v1.0.0", True),
+            ("github.com/davecgh/go-spew", "v1.1.0", False),
+            ("example.com/local", "v0.0.0", True)
+        ])
+
+    def test_scan(self):
+        self.assertFalse(self.scanner.can_handle(self.directory))
+        self._write_modules_txt()
+        self.assertTrue(self.scanner.can_handle(self.directory))
+        self.assertFalse(dependancies.GoModFileDependancyScanner().can_handle(self.directory))
+        self.assertFalse(dependancies.GoModuleDependancyScanner().can_handle(self.directory))
+        entries = self.scanner.scan(self.directory)
+        self.assertEqual([(e.package, e.dependancy_version, e.dependancy_is_indirect)
+                          for e in entries], [
+            ("github.com/pkg/errors", "v0.9.1", False),
+            ("github.com/old/repo", "v1.0.0", False),
+            ("github.com/davecgh/go-spew", "v1.1.0", True),
+            ("example.com/local", "v0.0.0", False)
+        ])
+        self.assertEqual(entries[0].dependancy_scanner_name, "VendorDependancyScanner")
+
+
+class TestGoModuleDependancyCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="/tmp/license-scanner-gomod-test")
+        with open(self.directory + "/go.mod", "w") as outfile:
+            outfile.write(_GO_MOD)
+        self.cache_filename = self.directory + "/dependancies.json"
+        self.scanner = _FakeGoListScanner(self.cache_filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unchanged_modules_are_cached(self):
+        entries = self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 1)
+        cached_entries = self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 1)
+        self.assertEqual(cached_entries, entries)
+        self.assertFalse(os.path.exists(self.cache_filename))
+        self.assertTrue(self.scanner.save())
+        self.assertFalse(self.scanner.save())
+
+        scanner = _FakeGoListScanner(self.cache_filename)
+        self.assertEqual(scanner.scan(self.directory), entries)
+        self.assertEqual(scanner.runs, 0)
+
+        with open(self.directory + "/go.sum", "w") as outfile:
+            outfile.write(_GO_SUM)
+        scanner.scan(self.directory)
+        self.assertEqual(scanner.runs, 1)
+
+    def test_go_environment_is_part_of_the_key(self):
+        self.scanner.scan(self.directory)
+        self.scanner.go_env = ('go1.21.0', '-mod=mod', '')
+        self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 2)
+
+        go_work = self.directory + "/go.work"
+        self.scanner.go_env = ('go1.21.0', '-mod=mod', go_work)
+        self.scanner.scan(self.directory)
+        self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 3)
+        with open(go_work, "w") as outfile:
+            outfile.write("go 1.21\n\nuse .\n")
+        self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 4)
+
+    def test_go_environment_is_read_without_go(self):
+        module_directory = self.directory + "/module"
+        os.mkdir(module_directory)
+        go_work = self.directory + "/go.work"
+        with open(go_work, "w") as outfile:
+            outfile.write("go 1.21\n\nuse ./module\n")
+        original_env = {name: os.environ.get(name) for name in ('GOFLAGS', 'GOWORK')}
+        os.environ['GOFLAGS'] = '-mod=mod'
+        os.environ.pop('GOWORK', None)
+        try:
+            (_, go_flags, found_go_work) = dependancies.GoModuleDependancyScanner._go_env(
+                module_directory)
+            os.environ['GOWORK'] = 'off'
+            (_, _, no_go_work) = dependancies.GoModuleDependancyScanner._go_env(module_directory)
+        finally:
+            for (name, value) in original_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        self.assertEqual(go_flags, '-mod=mod')
+        self.assertEqual(found_go_work, go_work)
+        self.assertEqual(no_go_work, '')
+
+    def test_failures_are_not_cached(self):
+        self.scanner.succeeds = False
+        self.scanner.scan(self.directory)
+        self.scanner.scan(self.directory)
+        self.assertEqual(self.scanner.runs, 2)
+
+    def test_modules_used_in_a_run_are_kept(self):
+        directories = []
+        for i in range(5):
+            directory = "%s/module%d" % (self.directory, i)
+            os.mkdir(directory)
+            with open(directory + "/go.mod", "w") as outfile:
+                outfile.write("module example.com/module%d\n" % i)
+            directories.append(directory)
+        original_max_modules = dependancies._DependancyListCache._MAX_MODULES
+        dependancies._DependancyListCache._MAX_MODULES = 3
+        try:
+            for _ in range(3):
+                scanner = _FakeGoListScanner(self.cache_filename)
+                for directory in directories:
+                    scanner.scan(directory)
+                scanner.save()
+            self.assertEqual(scanner.runs, 0)
+
+            scanner = _FakeGoListScanner(self.cache_filename)
+            scanner.scan(directories[0])
+            scanner.scan(self.directory)
+            scanner.save()
+        finally:
+            dependancies._DependancyListCache._MAX_MODULES = original_max_modules
+        scanner = _FakeGoListScanner(self.cache_filename)
+        for directory in [self.directory] + directories[:1] + directories[-1:]:
+            scanner.scan(directory)
+        self.assertEqual(scanner.runs, 0)
+        scanner.scan(directories[1])
+        self.assertEqual(scanner.runs, 1)
+
+    def test_other_versions_are_ignored(self):
+        self.scanner.scan(self.directory)
+        self.scanner.save()
+        with open(self.cache_filename) as infile:
+            data = json.load(infile)
+        data['version'] = 0
+        with open(self.cache_filename, "w") as outfile:
+            json.dump(data, outfile)
+        scanner = _FakeGoListScanner(self.cache_filename)
+        scanner.scan(self.directory)
+        self.assertEqual(scanner.runs, 1)
+
+
+class _ListScanner(dependancies.DependancyScanner):
+    def __init__(self, name: str, packages: List[str], can_handle: bool = True):
+        self.name = name
+        self.packages = packages
+        self._can_handle = can_handle
+
+    def can_handle(self, directory: str) -> bool:
+        return self._can_handle
+
+    def scan(self, directory: str) -> List[LicenseReportEntry]:
+        return [LicenseReportEntry(package=p, dependancy_scanner_name=self.name)
+                for p in self.packages]
+
+
+class _StreamingScanner(_ListScanner):
+    def __init__(self, name: str, packages: List[str]):
+        _ListScanner.__init__(self, name, packages)
+        self.produced = 0
+
+    def iter_scan(self, directory: str) -> Iterator[LicenseReportEntry]:
+        for entry in self.scan(directory):
+            self.produced += 1
+            yield entry
+
+
+class _FakeGoListScanner(dependancies.GoModuleDependancyScanner):
+    def __init__(self, cache_filename: str):
+        dependancies.GoModuleDependancyScanner.__init__(self, cache_filename)
+        self.runs = 0
+        self.succeeds = True
+        self.go_env = ('go1.21.0', '', '')
+
+    def _go_env(self, directory: str) -> (str, str, str):
+        return self.go_env
+
+    def _iter_go_list(self, directory: str, found: List[LicenseReportEntry] = None):
+        self.runs += 1
+        for (package, is_indirect) in [("github.com/pkg/errors", False), ("golang.org/x/sys", True)]:
+            entry = LicenseReportEntry(package=package,
+                                       dependancy_scanner_name=type(self).__name__,
+                                       dependancy_is_indirect=is_indirect)
+            found.append(entry)
+            yield entry
+        return self.succeeds
+
+
+_GO_MOD = """module example.com/main
+
+go 1.20
+
+require github.com/pkg/errors v0.9.1
+
+require (
+	github.com/old/repo v1.0.0
+	golang.org/x/sys v0.1.0 // indirect
+	"gopkg.in/yaml.v2" v2.4.0 // a comment
+	example.com/local v0.0.0
+)
+
+replace github.com/old/repo v1.0.0 => github.com/new/repo v1.1.0
+
+replace (
+	example.com/local => ../local
+)
+
+exclude github.com/davecgh/go-spew v1.1.1
+
+retract v0.1.0
+"""
+
+_GO_SUM = """github.com/davecgh/go-spew v1.1.0 h1:abc=
+github.com/davecgh/go-spew v1.1.0/go.mod h1:abc=
+github.com/davecgh/go-spew v1.1.1/go.mod h1:abc=
+github.com/new/repo v1.1.0 h1:abc=
+github.com/new/repo v1.1.0/go.mod h1:abc=
+github.com/pkg/errors v0.9.1 h1:abc=
+github.com/pkg/errors v0.8.0/go.mod h1:abc=
+golang.org/x/sys v0.0.0-20200930185726-fdedc70b468f/go.mod h1:abc=
+golang.org/x/sys v0.1.0 h1:abc=
+gopkg.in/yaml.v2 v2.4.0 h1:abc=
+github.com/stretchr/testify v1.7.0/go.mod h1:abc=
+"""
+
+_MODULES_TXT = """# github.com/pkg/errors v0.9.1
+## explicit
+github.com/pkg/errors
+# github.com/old/repo v1.0.0 => github.com/new/repo v1.1.0
+## explicit; go 1.13
+github.com/old/repo
+github.com/old/repo/sub
+# github.com/davecgh/go-spew v1.1.0
+github.com/davecgh/go-spew/spew
+# golang.org/x/sys v0.1.0
+## explicit; go 1.17
+# example.com/local v0.0.0 => ../local
+## explicit
+example.com/local
+# example.com/local => ../local
+# github.com/unused/repo v1.0.0 => github.com/other/repo v1.0.0
+"""
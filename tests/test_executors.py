@@ -0,0 +1,89 @@
+
+import asyncio
+import threading
+import time
+import unittest
+
+import license_scanner.executors as executors
+
+
+class TestExecutors(unittest.TestCase):
+
+    def test_serial_executor(self):
+        results = list(executors.SerialExecutor().map(_square, range(10)))
+        self.assertEqual(results, [x * x for x in range(10)])
+
+    def test_thread_pool_executor_keeps_order(self):
+        results = list(executors.ThreadPoolExecutor(4).map(_slow_square, range(10)))
+        self.assertEqual(results, [x * x for x in range(10)])
+
+    def test_thread_pool_executor_is_bounded(self):
+        counter = _ConcurrencyCounter()
+        list(executors.ThreadPoolExecutor(3).map(counter.run, range(12)))
+        self.assertLessEqual(counter.max_seen, 3)
+        self.assertGreater(counter.max_seen, 1)
+
+    def test_pooled_thread_pool_executor_keeps_its_threads(self):
+        with executors.ThreadPoolExecutor(1).pooled() as executor:
+            first = list(executor.map(_thread_id, range(2)))
+            second = list(executor.map(_thread_id, range(2)))
+        self.assertEqual(1, len(set(first + second)))
+        with executors.SerialExecutor().pooled() as executor:
+            self.assertEqual(list(executor.map(_square, range(3))), [0, 1, 4])
+
+    def test_process_pool_executor(self):
+        results = list(executors.ProcessPoolExecutor(2).map(_square, range(10)))
+        self.assertEqual(results, [x * x for x in range(10)])
+        with self.assertRaises(ValueError):
+            executors.ProcessPoolExecutor(0)
+
+    def test_asyncio_executor(self):
+        results = list(executors.AsyncioExecutor(4).map(_slow_square, range(10)))
+        self.assertEqual(results, [x * x for x in range(10)])
+        results = list(executors.AsyncioExecutor(4).map(_async_square, range(10)))
+        self.assertEqual(results, [x * x for x in range(10)])
+
+    def test_asyncio_executor_is_bounded(self):
+        counter = _ConcurrencyCounter()
+        list(executors.AsyncioExecutor(2).map(counter.run, range(8)))
+        self.assertLessEqual(counter.max_seen, 2)
+
+    def test_create_executor(self):
+        self.assertIsInstance(executors.create_executor('thread', 1), executors.SerialExecutor)
+        self.assertIsInstance(executors.create_executor('thread', 4),
+                              executors.ThreadPoolExecutor)
+        self.assertIsInstance(executors.create_executor('asyncio', 4),
+                              executors.AsyncioExecutor)
+        with self.assertRaises(ValueError):
+            executors.create_executor('nosuchthing', 4)
+
+
+class _ConcurrencyCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = 0
+        self.max_seen = 0
+
+    def run(self, item):
+        with self._lock:
+            self._current += 1
+            self.max_seen = max(self.max_seen, self._current)
+        time.sleep(0.02)
+        with self._lock:
+            self._current -= 1
+        return item
+
+
+def _square(x: int) -> int:
+    return x * x
+
+def _slow_square(x: int) -> int:
+    time.sleep(0.01 * (10 - x))
+    return x * x
+
+async def _async_square(x: int) -> int:
+    await asyncio.sleep(0.001 * (10 - x))
+    return x * x
+
+def _thread_id(_) -> int:
+    return threading.get_ident()
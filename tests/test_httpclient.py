@@ -0,0 +1,69 @@
+import time
+import unittest
+
+from typing import Dict
+
+import requests
+
+from license_scanner.httpclient import HttpClient
+from tests.standin import StandInServer
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.failures_remaining = 0
+        self.failure = (503, b'unavailable')
+        self.server = StandInServer(self._handler)
+        self.http = HttpClient(timeout=0.5, retries=2, backoff_factor=0.01)
+
+    def tearDown(self):
+        self.http.close()
+        self.server.close()
+
+    def test_get(self):
+        resp = self.http.get(self.server.url + '/ok')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, 'ok')
+
+    def test_server_errors_are_retried(self):
+        self.failures_remaining = 2
+        resp = self.http.get(self.server.url + '/ok')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retries_are_limited(self):
+        self.failures_remaining = 10
+        resp = self.http.get(self.server.url + '/ok')
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_posts_are_not_retried(self):
+        self.failures_remaining = 2
+        resp = self.http.post(self.server.url + '/ok', json={})
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retry_after_is_capped(self):
+        http = HttpClient(timeout=0.5, retries=1, max_backoff=0.05)
+        self.failures_remaining = 1
+        self.failure = (429, b'slow down', {'Retry-After': '3600'})
+        start = time.time()
+        resp = http.get(self.server.url + '/ok')
+        self.assertEqual(resp.status_code, 200)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(len(self.server.requests), 2)
+        http.close()
+
+    def test_stalled_host_times_out(self):
+        http = HttpClient(timeout=0.2, retries=0)
+        with self.assertRaises(requests.exceptions.RequestException):
+            http.get(self.server.url + '/slow')
+        http.close()
+
+    def _handler(self, request: Dict):
+        if request['path'] == '/slow':
+            time.sleep(1)
+        if self.failures_remaining > 0:
+            self.failures_remaining -= 1
+            return self.failure
+        return (200, b'ok')
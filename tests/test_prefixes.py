@@ -0,0 +1,28 @@
+
+import unittest
+
+from license_scanner.prefixes import PrefixTrie
+
+
+class TestPrefixTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = PrefixTrie()
+        self.trie.add("github.com/", "github")
+        self.trie.add("github.com/org/", "org")
+        self.trie.add("github.com/", "github2")
+        self.trie.add("golang.org/", "golang")
+
+    def test_matches(self):
+        self.assertEqual(4, len(self.trie))
+        self.assertEqual(list(self.trie.matches("github.com/org/repo")),
+                         ["github", "github2", "org"])
+        self.assertEqual(list(self.trie.matches("github.com/other/repo")), ["github", "github2"])
+        self.assertEqual(list(self.trie.matches("golang.org/x/net")), ["golang"])
+        self.assertEqual(list(self.trie.matches("github.co")), [])
+        self.assertTrue(self.trie.has_match("golang.org/"))
+        self.assertFalse(self.trie.has_match("gopkg.in/yaml.v2"))
+
+    def test_empty_prefix(self):
+        self.trie.add("", "any")
+        self.assertEqual(list(self.trie.matches("gopkg.in/yaml.v2")), ["any"])
+        self.assertEqual(list(self.trie.matches("golang.org/x")), ["any", "golang"])
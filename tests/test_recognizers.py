@@ -1,11 +1,25 @@
 
+import base64
 import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
 
 from typing import Dict, List
 
+import requests
+
 import license_scanner.recognizers as recognizers
-from license_scanner.cache import LicenseReportEntry
+from license_scanner.cache import LicenseCache, LicenseReportEntry
+from license_scanner.executors import ThreadPoolExecutor
+from license_scanner.httpclient import HttpClient
+from license_scanner.rules import RuleSet
+from tests.standin import StandInServer
 
 
 class TestRecognizer(unittest.TestCase):
@@ -167,6 +181,597 @@ class TestRecognizer(unittest.TestCase):
                                                     license_recognizer_name='MappedToGitHubRecognizer'
                                                     )))
 
+    def test_threaded_recognition_writes_cache_in_order(self):
+        cache = _RecordingCache()
+        mit = recognizers.CommonPrefixRecognizer('mymit/', 'MIT', 'my_mit_url', cache=cache)
+        bsd = recognizers.CommonPrefixRecognizer('mybsd/', 'BSD', 'my_bsd_url', cache=cache)
+        recognizers.recognize_all(self.entries, [mit, bsd], ThreadPoolExecutor(4))
+        self.assertEqual(cache.written, ['mybsd/package1',
+                                         'mymit/package1',
+                                         'mymit/package2',
+                                         'mymit/package3'])
+        self.assertEqual(self.entries[3].license_name, 'MIT')
+
+        cache.written = []
+        recognizers.recognize_all(_initial_entries(), [mit, bsd], ThreadPoolExecutor(4))
+        self.assertEqual(cache.written, [])
+
+
+class TestRecognizerDispatch(unittest.TestCase):
+    def setUp(self):
+        self.cache = _RecordingCache()
+        self.recognizers = [
+            recognizers.GitHubRecognizer(self.cache),
+            recognizers.MappedToGitHubRecognizer(_github_mapping(), self.cache),
+            recognizers.CommonPrefixRecognizer("mybsd", "BSD", "bsdurl", self.cache),
+            recognizers.CommonPrefixRecognizer("mymit", "MIT", "miturl", self.cache),
+            recognizers.CommonPrefixRecognizer("mymit/package2", "MIT2", "miturl", self.cache)
+        ]
+
+    def test_candidates(self):
+        dispatcher = recognizers._RecognizerDispatcher(self.recognizers)
+        self.assertEqual(dispatcher.candidates('github.com/org/repo'), [self.recognizers[0]])
+        self.assertEqual(dispatcher.candidates('myserver2.com/backoff'), [self.recognizers[1]])
+        self.assertEqual(dispatcher.candidates('mymit/package2'), self.recognizers[3:])
+        self.assertEqual(dispatcher.candidates('unknown/package'), [])
+
+    def test_cache_is_read_once(self):
+        entries = [
+            LicenseReportEntry(package='mybsd/package1'),
+            LicenseReportEntry(package='mymit/package2'),
+            LicenseReportEntry(package='unknown/package')
+        ]
+        recognizers.recognize_all(entries, self.recognizers)
+        self.assertEqual(self.cache.reads,
+                         ['mybsd/package1', 'mymit/package2', 'unknown/package'])
+        self.assertEqual(entries[1].license_name, 'MIT')
+        self.assertIsNone(entries[2].license_recognized_at)
+
+        self.cache.reads = []
+        entries = [LicenseReportEntry(package='mymit/package2')]
+        recognizers.recognize_all(entries, self.recognizers)
+        self.assertEqual(self.cache.reads, ['mymit/package2'])
+        self.assertEqual(self.cache.written, ['mybsd/package1', 'mymit/package2'])
+
+    def test_manual_cache_entries_are_used(self):
+        self.cache.entries['unknown/package'] = LicenseReportEntry(package='unknown/package',
+                                                                   license_name='Manual')
+        entries = [LicenseReportEntry(package='unknown/package')]
+        recognizers.recognize_all(entries, self.recognizers)
+        self.assertEqual(entries[0].license_name, 'Manual')
+
+    def test_iter_recognize_all(self):
+        prepared = []
+        self.recognizers[2].prepare = lambda entries: prepared.append(len(entries))
+        packages = iter(['mybsd/package1', 'mymit/package2', 'mymit/package3'])
+        entries = recognizers.iter_recognize_all((LicenseReportEntry(package=p) for p in packages),
+                                                 self.recognizers,
+                                                 chunk_size=2)
+        first = next(entries)
+        self.assertEqual(first.license_name, 'BSD')
+        self.assertEqual(next(packages), 'mymit/package3')
+        self.assertEqual([e.package for e in entries], ['mymit/package2'])
+        self.assertEqual(prepared, [2])
+
+    def test_rule_set_recognizer(self):
+        rule_set = RuleSet.from_json({
+            'prefixes': [
+                {'prefix': 'mymit/package2', 'license': 'MIT2', 'url': 'miturl'},
+                {'prefix': 'mymit', 'license': 'MIT', 'url': 'miturl'}
+            ],
+            'mappings': _github_mapping()
+        })
+        recognizer = recognizers.RuleSetRecognizer(rule_set, self.cache)
+        dispatcher = recognizers._RecognizerDispatcher([recognizer])
+        self.assertEqual(dispatcher.candidates('myserver1.com/continuity'), [recognizer])
+        self.assertEqual(dispatcher.candidates('mybsd/package1'), [])
+
+        entries = [
+            LicenseReportEntry(package='mymit/package1'),
+            LicenseReportEntry(package='mymit/package2')
+        ]
+        recognizers.recognize_all(entries, [recognizer])
+        self.assertEqual(entries[0].license_name, 'MIT')
+        self.assertEqual(entries[0].license_recognizer_name, 'RuleSetRecognizer(mymit)')
+        self.assertEqual(entries[1].license_name, 'MIT2')
+
+
+class TestGoModuleCacheRecognizer(unittest.TestCase):
+    def setUp(self):
+        self.module_cache = tempfile.mkdtemp(prefix="/tmp/license-scanner-modcache-test")
+        self.recognizer = recognizers.GoModuleCacheRecognizer(None, self.module_cache)
+        self._write_license("github.com/!azure/go-ansiterm@v0.1.0", "License.txt",
+                            "The MIT License (MIT)\n\n" + self._corpus_text("MIT"))
+        zip_directory = os.path.join(self.module_cache, "cache/download/gopkg.in/yaml.v2/@v")
+        os.makedirs(zip_directory)
+        with zipfile.ZipFile(os.path.join(zip_directory, "v2.4.0.zip"), "w") as module_zip:
+            module_zip.writestr("gopkg.in/yaml.v2@v2.4.0/LICENSE", self._corpus_text("Apache-2.0"))
+            module_zip.writestr("gopkg.in/yaml.v2@v2.4.0/sub/COPYING", "Unknown")
+
+    def tearDown(self):
+        shutil.rmtree(self.module_cache)
+
+    def test_module_directory(self):
+        entry = LicenseReportEntry(package='github.com/Azure/go-ansiterm',
+                                   dependancy_version='v0.1.0')
+        self.assertTrue(self.recognizer.recognize(entry))
+        self.assertEqual(entry.license_name, 'MIT License')
+        self.assertEqual(entry.license_recognizer_name, 'GoModuleCacheRecognizer')
+        self.assertTrue(base64.b64decode(entry.license_encoded).startswith(b'The MIT License'))
+        self.assertIsNone(entry.license_url)
+
+    def test_module_zip(self):
+        entry = LicenseReportEntry(package='gopkg.in/yaml.v2', dependancy_version='v2.4.0')
+        self.assertTrue(self.recognizer.recognize(entry))
+        self.assertEqual(entry.license_name, 'Apache License 2.0')
+
+    def test_missing_modules(self):
+        self.assertFalse(self.recognizer.recognize(
+            LicenseReportEntry(package='github.com/Azure/go-ansiterm')))
+        self.assertFalse(self.recognizer.recognize(
+            LicenseReportEntry(package='github.com/Azure/go-ansiterm',
+                               dependancy_version='v0.2.0')))
+
+    def test_prepare_classifies_chunk(self):
+        entries = [LicenseReportEntry(package='github.com/Azure/go-ansiterm',
+                                      dependancy_version='v0.1.0'),
+                   LicenseReportEntry(package='gopkg.in/yaml.v2', dependancy_version='v2.4.0')]
+        self.recognizer.prepare(entries)
+        self.assertEqual(len(self.recognizer._prepared), 2)
+        self.assertTrue(self.recognizer.recognize(entries[1]))
+        self.assertEqual(entries[1].license_name, 'Apache License 2.0')
+        self.assertEqual(len(self.recognizer._prepared), 1)
+        self.recognizer.prepare([])
+        self.assertEqual(len(self.recognizer._prepared), 0)
+
+    def test_classifier_names_full_text(self):
+        self._write_license("go.uber.org/atomic@v1.9.0", "LICENSE",
+                            "Copyright (c) 2016 Uber Technologies, Inc.\n\n"
+                            + self._corpus_text("ISC"))
+        entry = LicenseReportEntry(package='go.uber.org/atomic', dependancy_version='v1.9.0')
+        self.assertTrue(self.recognizer.recognize(entry))
+        self.assertEqual(entry.license_name, 'ISC License')
+
+    def test_mentions_of_other_licenses(self):
+        self._write_license("example.com/mit@v1.0.0", "LICENSE",
+                            self._corpus_text("MIT") + "\nThe parser was adapted from a project"
+                            " released under the Apache License, Version 2.0.\n")
+        entry = LicenseReportEntry(package='example.com/mit', dependancy_version='v1.0.0')
+        self.assertTrue(self.recognizer.recognize(entry))
+        self.assertEqual(entry.license_name, 'MIT License')
+
+    def test_unknown_licenses_are_not_named(self):
+        bsd_4_clause = self._corpus_text("BSD-3-Clause").replace(
+            "3. Neither",
+            "3. All advertising materials mentioning features or use of this software\n"
+            "   must display the following acknowledgement: This product includes\n"
+            "   software developed by the <organization>.\n\n4. Neither")
+        self._write_license("example.com/bsd4@v1.0.0", "LICENSE", bsd_4_clause)
+        self._write_license("example.com/boost@v1.0.0", "LICENSE", _BOOST_LICENSE)
+        for package in ['example.com/bsd4', 'example.com/boost']:
+            entry = LicenseReportEntry(package=package, dependancy_version='v1.0.0')
+            self.assertFalse(self.recognizer.recognize(entry))
+            self.assertIsNone(entry.license_name)
+
+    def _corpus_text(self, spdx_id: str) -> str:
+        with open(os.path.join(self.recognizer.classifier.corpus_dir, spdx_id + ".txt")) as infile:
+            return infile.read()
+
+    def _write_license(self, module: str, filename: str, text: str):
+        directory = os.path.join(self.module_cache, module)
+        os.makedirs(directory)
+        with open(os.path.join(directory, filename), "w") as outfile:
+            outfile.write(text)
+
+
+class TestVendorRecognizer(unittest.TestCase):
+    def setUp(self):
+        self.vendor_dir = tempfile.mkdtemp(prefix="/tmp/license-scanner-vendor-test")
+        directory = os.path.join(self.vendor_dir, "go.uber.org/zap")
+        os.makedirs(directory)
+        self.recognizer = recognizers.VendorRecognizer(["/nonexistent", self.vendor_dir], None)
+        with open(os.path.join(self.recognizer.classifier.corpus_dir, "MIT.txt")) as infile:
+            text = infile.read()
+        with open(os.path.join(directory, "LICENSE.txt"), "w") as outfile:
+            outfile.write("Copyright (c) 2016-2017 Uber Technologies, Inc.\n\n")
+            outfile.write(" ".join(text.split()))
+
+    def tearDown(self):
+        shutil.rmtree(self.vendor_dir)
+
+    def test_vendored_license(self):
+        entry = LicenseReportEntry(package='go.uber.org/zap', dependancy_version='v1.21.0')
+        self.recognizer.prepare([entry])
+        self.assertTrue(self.recognizer.recognize(entry))
+        self.assertEqual(entry.license_name, 'MIT License')
+        self.assertEqual(entry.license_recognizer_name, 'VendorRecognizer')
+        self.assertIsNone(entry.license_url)
+
+    def test_missing_license(self):
+        self.assertFalse(self.recognizer.recognize(LicenseReportEntry(package='go.uber.org')))
+        self.assertFalse(self.recognizer.recognize(LicenseReportEntry(package='k8s.io/api')))
+
+    def test_module_cache_skips_vendored_licenses(self):
+        module_cache = recognizers.GoModuleCacheRecognizer(None, self.vendor_dir)
+        read = []
+        module_cache.read_license_file = lambda entry: read.append(entry.package)
+        entries = [LicenseReportEntry(package='go.uber.org/zap', dependancy_version='v1.21.0'),
+                   LicenseReportEntry(package='k8s.io/api', dependancy_version='v0.20.0')]
+        recognizers.recognize_all(entries, [self.recognizer, module_cache])
+        self.assertEqual(entries[0].license_recognizer_name, 'VendorRecognizer')
+        self.assertEqual(read, ['k8s.io/api'])
+
+
+class TestGitHubRateLimit(unittest.TestCase):
+
+    def test_budget_is_taken_from_headers(self):
+        rate_limit = recognizers.GitHubRateLimit()
+        reset = int(time.time()) + 3600
+        rate_limit.update(_FakeResponse(remaining=2, reset=reset))
+        self.assertTrue(rate_limit.acquire())
+        self.assertTrue(rate_limit.acquire())
+        self.assertFalse(rate_limit.acquire())
+
+        rate_limit.update(_FakeResponse(remaining=10, reset=reset))
+        self.assertFalse(rate_limit.acquire())
+
+        rate_limit.update(_FakeResponse(remaining=10, reset=reset + 3600))
+        self.assertTrue(rate_limit.acquire())
+
+    def test_budget_is_renewed_after_reset(self):
+        rate_limit = recognizers.GitHubRateLimit()
+        rate_limit.update(_FakeResponse(remaining=0, reset=int(time.time()) - 1))
+        self.assertTrue(rate_limit.acquire())
+
+    def test_seeding_does_not_block_other_callers(self):
+        http = _BlockingHttp()
+        rate_limit = recognizers.GitHubRateLimit(http)
+        seeding = threading.Thread(target=rate_limit.acquire)
+        seeding.start()
+        self.assertTrue(http.started.wait(5))
+        self.assertTrue(rate_limit.acquire())
+        http.release.set()
+        seeding.join()
+        self.assertEqual(http.calls, 1)
+
+    def test_exhausted_budget_stops_recognizers(self):
+        rate_limit = recognizers.GitHubRateLimit()
+        rate_limit.update(_FakeResponse(remaining=0, reset=int(time.time()) + 3600))
+        github = recognizers.GitHubRecognizer(cache=None, rate_limit=rate_limit)
+        mapped = recognizers.MappedToGitHubRecognizer(_github_mapping(),
+                                                      cache=None,
+                                                      rate_limit=rate_limit)
+        entries = _initial_entries()
+        recognizers.recognize_all(entries, [github, mapped])
+        for entry in entries:
+            self.assertIsNone(entry.license_name)
+            self.assertIsNone(entry.license_recognized_at)
+
+
+class TestGitHubGraphQLRecognizer(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(_graphql_handler)
+        self.cache = _RecordingCache()
+        self.graphql = recognizers.GitHubGraphQLRecognizer('token',
+                                                           self.cache,
+                                                           batch_size=2,
+                                                           url=self.server.url + '/graphql')
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_batched_recognition(self):
+        entries = [
+            LicenseReportEntry(package='github.com/org/mit'),
+            LicenseReportEntry(package='github.com/org/apache'),
+            LicenseReportEntry(package='github.com/org/nolicense'),
+            LicenseReportEntry(package='github.com/org/missing'),
+            LicenseReportEntry(package='mymit/package1')
+        ]
+        recognizers.recognize_all(entries, [self.graphql])
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(self.server.requests[0]['headers']['Authorization'], 'bearer token')
+
+        self.assertEqual(entries[0].license_name, 'MIT License')
+        self.assertEqual(entries[0].license_url,
+                         'https://raw.githubusercontent.com/org/mit/main/LICENSE')
+        self.assertEqual(base64.b64decode(entries[0].license_encoded).decode('utf-8'),
+                         'MIT text for org/mit')
+        self.assertEqual(entries[0].license_recognizer_name, 'GitHubGraphQLRecognizer')
+        self.assertEqual(entries[1].license_name, 'Apache License 2.0')
+        self.assertIsNone(entries[2].license_recognized_at)
+        self.assertIsNone(entries[2].license_failure)
+        self.assertIsNone(entries[3].license_recognized_at)
+        self.assertIsNone(entries[3].license_failure)
+        self.assertIsNone(entries[4].license_recognized_at)
+        self.assertEqual(self.cache.written, ['github.com/org/mit', 'github.com/org/apache'])
+
+    def test_missing_repositories_are_left_to_the_following_recognizers(self):
+        entries = [LicenseReportEntry(package='github.com/org/missing')]
+        fallback = recognizers.CommonPrefixRecognizer('github.com/org/', 'MIT', 'miturl',
+                                                      self.cache)
+        recognizers.recognize_all(entries, [self.graphql, fallback])
+        self.assertEqual(entries[0].license_name, 'MIT')
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_repositories_without_a_known_license_file_fall_through(self):
+        entries = [LicenseReportEntry(package='github.com/org/otherfile')]
+        fallback = recognizers.CommonPrefixRecognizer('github.com/org/', 'MIT', 'miturl',
+                                                      self.cache)
+        recognizers.recognize_all(entries, [self.graphql, fallback])
+        self.assertEqual(entries[0].license_url, 'miturl')
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_cached_entries_are_not_requested(self):
+        self.cache.write(LicenseReportEntry(package='github.com/org/mit', license_name='MIT'))
+        entries = [
+            LicenseReportEntry(package='github.com/org/mit'),
+            LicenseReportEntry(package='github.com/org/apache')
+        ]
+        recognizers.recognize_all(entries, [self.graphql])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual(self.cache.reads, ['github.com/org/mit', 'github.com/org/apache'])
+        self.assertEqual(entries[0].license_name, 'MIT')
+        self.assertEqual(entries[1].license_name, 'Apache License 2.0')
+
+    def test_cached_failures_are_not_requested(self):
+        recognized_at = recognizers._secs_to_time_string(time.time())
+        self.cache.write(LicenseReportEntry(package='github.com/org/missing',
+                                            license_recognized_at=recognized_at,
+                                            license_failure=recognizers.FAILURE_NOT_FOUND))
+        entries = [
+            LicenseReportEntry(package='github.com/org/missing'),
+            LicenseReportEntry(package='github.com/org/apache')
+        ]
+        recognizers.recognize_all(entries, [self.graphql])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertNotIn('missing', self.server.requests[0]['body']['query'])
+        self.assertEqual(entries[0].license_failure, recognizers.FAILURE_NOT_FOUND)
+        self.assertEqual(entries[1].license_name, 'Apache License 2.0')
+
+    def test_failed_batch_falls_through(self):
+        self.server.close()
+        self.server = StandInServer(lambda request: (401, {}))
+        self.graphql.url = self.server.url + '/graphql'
+        self.graphql.http = HttpClient(retries=0)
+        self.graphql.batch_size = 50
+        entries = [LicenseReportEntry(package='github.com/org/repo%d' % i) for i in range(20)]
+        recognizers.recognize_all(entries, [self.graphql])
+        self.assertEqual(1, len(self.server.requests))
+        for entry in entries:
+            self.assertIsNone(entry.license_recognized_at)
+
+
+class TestGitHubRevalidation(unittest.TestCase):
+    def setUp(self):
+        self.licenses = {'unchanged': ('"v1"', 'MIT License'), 'changed': ('"v1"', 'BSD')}
+        self.server = StandInServer(self._rest_handler)
+        self.cache = _RecordingCache()
+        self.rate_limit = recognizers.GitHubRateLimit()
+        self.rate_limit.update(_FakeResponse(remaining=10, reset=int(time.time()) + 3600))
+        self.github = recognizers.GitHubRecognizer(self.cache,
+                                                   self.rate_limit,
+                                                   api_url=self.server.url)
+        self.mapped = recognizers.MappedToGitHubRecognizer(
+            {'myserver2.com/backoff': 'github.com/org/unchanged'}, self.cache, self.rate_limit)
+        self.mapped._github.api_url = self.server.url
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_validators_are_stored(self):
+        entries = [LicenseReportEntry(package='github.com/org/unchanged')]
+        recognizers.recognize_all(entries, [self.github])
+        self.assertEqual(entries[0].license_name, 'MIT License')
+        self.assertEqual(entries[0].license_etag, '"v1"')
+        self.assertEqual(entries[0].license_last_modified, 'Mon, 01 Jun 2020 00:00:00 GMT')
+        self.assertNotIn('If-None-Match', self.server.requests[0]['headers'])
+
+    def test_refresh_revalidates_cached_entries(self):
+        packages = ['github.com/org/unchanged', 'github.com/org/changed', 'myserver2.com/backoff']
+        recognizers.recognize_all([LicenseReportEntry(package=p) for p in packages],
+                                  [self.github, self.mapped])
+        self.cache.written = []
+
+        entries = [LicenseReportEntry(package=p) for p in packages]
+        recognizers.recognize_all(entries, [self.github, self.mapped])
+        self.assertEqual(3, len(self.server.requests))
+        self.assertEqual(self.cache.written, [])
+
+        self.licenses['changed'] = ('"v2"', 'Apache License 2.0')
+        entries = [LicenseReportEntry(package=p) for p in packages]
+        recognizers.recognize_all(entries, [self.github, self.mapped], refresh=True)
+        self.assertEqual(6, len(self.server.requests))
+        self.assertEqual(self.server.requests[3]['headers']['If-None-Match'], '"v1"')
+        self.assertEqual(entries[0].license_name, 'MIT License')
+        self.assertEqual(entries[1].license_name, 'Apache License 2.0')
+        self.assertEqual(entries[1].license_etag, '"v2"')
+        self.assertEqual(entries[2].license_name, 'MIT License')
+        self.assertEqual(entries[2].license_recognizer_name, 'MappedToGitHubRecognizer')
+        self.assertEqual(self.cache.written, ['github.com/org/changed'])
+
+    def test_not_modified_is_refunded(self):
+        recognizers.recognize_all([LicenseReportEntry(package='github.com/org/unchanged')],
+                                  [self.github])
+        self.rate_limit.update(_FakeResponse(remaining=1, reset=int(time.time()) + 7200))
+        recognizers.recognize_all([LicenseReportEntry(package='github.com/org/unchanged')],
+                                  [self.github],
+                                  refresh=True)
+        self.assertTrue(self.rate_limit.acquire())
+
+    def _rest_handler(self, request: Dict) -> (int, Dict, Dict):
+        (etag, name) = self.licenses[request['path'].split('/')[3]]
+        headers = {'ETag': etag, 'Last-Modified': 'Mon, 01 Jun 2020 00:00:00 GMT'}
+        if request['headers'].get('If-None-Match', None) == etag:
+            return (304, {}, headers)
+        body = {
+            'license': {'name': name},
+            'download_url': 'https://raw.githubusercontent.com%s' % request['path'],
+            'content': base64.b64encode(name.encode('utf-8')).decode('ascii')
+        }
+        return (200, body, headers)
+
+
+class TestNegativeCaching(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(self._rest_handler)
+        self.cache = _RecordingCache()
+        self.rate_limit = recognizers.GitHubRateLimit()
+        self.rate_limit.update(_FakeResponse(remaining=10, reset=int(time.time()) + 3600))
+        self.github = recognizers.GitHubRecognizer(self.cache,
+                                                   self.rate_limit,
+                                                   api_url=self.server.url)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_failures_are_cached(self):
+        entries = [LicenseReportEntry(package='github.com/org/missing')]
+        recognizers.recognize_all(entries, [self.github])
+        self.assertIsNone(entries[0].license_name)
+        self.assertEqual(entries[0].license_failure, recognizers.FAILURE_NOT_FOUND)
+        self.assertEqual(self.cache.written, ['github.com/org/missing'])
+
+        entries = [LicenseReportEntry(package='github.com/org/missing')]
+        recognizers.recognize_all(entries, [self.github])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual(entries[0].license_failure, recognizers.FAILURE_NOT_FOUND)
+
+    def test_expired_failures_are_retried(self):
+        recognized_at = recognizers._secs_to_time_string(time.time() - 7200)
+        self.cache.write(LicenseReportEntry(package='github.com/org/found',
+                                            license_recognized_at=recognized_at,
+                                            license_failure=recognizers.FAILURE_ERROR))
+        self.cache.write(LicenseReportEntry(package='github.com/org/missing',
+                                            license_recognized_at=recognized_at,
+                                            license_failure=recognizers.FAILURE_NOT_FOUND))
+        entries = [LicenseReportEntry(package='github.com/org/found'),
+                   LicenseReportEntry(package='github.com/org/missing')]
+        recognizers.recognize_all(entries, [self.github])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertEqual(entries[0].license_name, 'MIT License')
+        self.assertIsNone(entries[0].license_failure)
+        self.assertEqual(entries[1].license_failure, recognizers.FAILURE_NOT_FOUND)
+
+        entries = [LicenseReportEntry(package='github.com/org/missing')]
+        recognizers.recognize_all(entries,
+                                  [self.github],
+                                  negative_ttls={recognizers.FAILURE_NOT_FOUND: 3600})
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_rate_limited_failures(self):
+        self.rate_limit.update(_FakeResponse(remaining=0, reset=int(time.time()) + 3600))
+        fallback = recognizers.CommonPrefixRecognizer('github.com/org/', 'MIT', 'miturl',
+                                                      self.cache)
+        entries = [LicenseReportEntry(package='github.com/org/found'),
+                   LicenseReportEntry(package='github.com/other/found')]
+        recognizers.recognize_all(entries, [self.github, fallback])
+        self.assertEqual(0, len(self.server.requests))
+        self.assertEqual(entries[0].license_name, 'MIT')
+        self.assertIsNone(entries[1].license_recognized_at)
+        self.assertEqual(self.cache.written, ['github.com/org/found'])
+
+    def test_rate_limited_responses_are_not_cached(self):
+        entries = [LicenseReportEntry(package='github.com/org/limited')]
+        recognizers.recognize_all(entries, [self.github])
+        self.assertEqual(1, len(self.server.requests))
+        self.assertIsNone(entries[0].license_recognized_at)
+        self.assertIsNone(entries[0].license_failure)
+        self.assertEqual(self.cache.written, [])
+
+    @classmethod
+    def _rest_handler(cls, request: Dict) -> (int, Dict):
+        if request['path'].split('/')[3] == 'missing':
+            return (404, {'message': 'Not Found'})
+        if request['path'].split('/')[3] == 'limited':
+            return (403, {'message': 'API rate limit exceeded'}, {'X-RateLimit-Remaining': '0'})
+        body = {
+            'license': {'name': 'MIT License'},
+            'download_url': 'https://raw.githubusercontent.com%s' % request['path'],
+            'content': base64.b64encode(b'MIT').decode('ascii')
+        }
+        return (200, body)
+
+
+def _graphql_handler(request: Dict) -> (int, Dict):
+    licenses = {'mit': 'MIT License', 'apache': 'Apache License 2.0'}
+    data = {}
+    for (alias, owner, name) in re.findall(r'(r\d+): repository\(owner: "(.*?)", name: "(.*?)"\)',
+                                           request['body']['query']):
+        if name == 'missing':
+            data[alias] = None
+            continue
+        repository = {'defaultBranchRef': {'name': 'main'}, 'licenseInfo': None}
+        if name == 'otherfile':
+            repository['licenseInfo'] = {'name': 'MIT License'}
+        if name in licenses:
+            repository['licenseInfo'] = {'name': licenses[name]}
+            repository['f0'] = {'text': 'MIT text for %s/%s' % (owner, name)}
+        data[alias] = repository
+    return (200, {'data': data})
+
+
+class _BlockingHttp:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def get(self, url: str, headers: Dict = None):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        raise requests.exceptions.ConnectionError("no network")
+
+
+class _FakeResponse:
+    def __init__(self, remaining: int, reset: int):
+        self.headers = {
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(reset)
+        }
+
+
+class _RecordingCache(LicenseCache):
+    def __init__(self):
+        self.entries = {}
+        self.written = []
+        self.reads = []
+
+    def read(self, package: str) -> LicenseReportEntry:
+        self.reads.append(package)
+        return self.entries.get(package, None)
+
+    def write(self, entry: LicenseReportEntry):
+        self.entries[entry.package] = LicenseReportEntry(**entry.__dict__)
+        self.written.append(entry.package)
+
+
+_BOOST_LICENSE = """Boost Software License - Version 1.0 - August 17th, 2003
+
+Permission is hereby granted, free of charge, to any person or organization
+obtaining a copy of the software and accompanying documentation covered by
+this license (the "Software") to use, reproduce, display, distribute,
+execute, and transmit the Software, and to prepare derivative works of the
+Software, and to permit third-parties to whom the Software is furnished to
+do so, all subject to the following:
+
+The copyright notices in the Software and this entire statement, including
+the above license grant, this restriction and the following disclaimer,
+must be included in all copies of the Software, in whole or in part, and
+all derivative works of the Software, unless such copies or derivative
+works are solely in the form of machine-executable object code generated by
+a source language processor.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
 
 def _initial_entries() -> List[LicenseReportEntry]:
     return [
@@ -1,10 +1,15 @@
 
+import base64
+import os
 import tempfile
 import json
 import unittest
+from typing import Dict, List, Set, Tuple
 
 import license_scanner.reporters as reporters
-from license_scanner.cache import LicenseReportEntry
+from license_scanner.cache import JsonFileLicenseCache, LicenseReportEntry
+from license_scanner.executors import ProcessPoolExecutor
+from license_scanner.urlcache import UrlTextCache
 
 
 _CORRECT_LICENSE_ARRAY = [
@@ -74,6 +79,235 @@ class TestJsonReporter(unittest.TestCase):
         self.assertEqual(data['dependencies'], _CORRECT_LICENSE_ARRAY)
 
 
+class TestPdfReporter(unittest.TestCase):
+
+    def test_license_texts_are_prefetched(self):
+        http = _FakeHttp({
+            'https://golang.org/LICENSE': ('text/plain; charset=utf-8', 'BSD text'),
+            'https://example.com/LICENSE.html': ('text/html', '<html></html>')
+        })
+        entries = [
+            LicenseReportEntry(package='golang.org/x/sys',
+                               license_name='Go Standard Library License',
+                               license_url='https://golang.org/LICENSE'),
+            LicenseReportEntry(package='golang.org/x/text',
+                               license_name='Go Standard Library License',
+                               license_url='https://golang.org/LICENSE'),
+            LicenseReportEntry(package='example.com/html',
+                               license_name='MIT License',
+                               license_url='https://example.com/LICENSE.html'),
+            LicenseReportEntry(package='example.com/none', license_name='MIT License')
+        ]
+        filename = _temp_filename()
+        reporter = reporters.PdfReporter(filename, http=http)
+        reporters.report_all(entries, [], [reporter])
+
+        self.assertEqual(sorted(http.urls),
+                         ['https://example.com/LICENSE.html', 'https://golang.org/LICENSE'])
+        self.assertEqual(reporter.url_cache.read('https://golang.org/LICENSE'), 'BSD text')
+        for entry in entries:
+            self.assertIsNone(entry.license_encoded)
+        with open(filename, 'rb') as pdf_file:
+            self.assertTrue(pdf_file.read().startswith(b'%PDF'))
+
+    def test_cache_argument_is_ignored(self):
+        cache = JsonFileLicenseCache(_temp_filename())
+        reporter = reporters.PdfReporter(_temp_filename(), cache)
+        self.assertIsNot(reporter.http, cache)
+        with self.assertRaises(TypeError):
+            reporters.PdfReporter(_temp_filename(), cache, _FakeHttp({}))
+
+    def test_url_cache_is_shared(self):
+        http = _FakeHttp({'https://golang.org/LICENSE': ('text/plain', 'BSD text')})
+        url_cache = UrlTextCache(http=http)
+        for package in ['golang.org/x/sys', 'golang.org/x/text']:
+            entry = LicenseReportEntry(package=package,
+                                       license_name='Go Standard Library License',
+                                       license_url='https://golang.org/LICENSE')
+            reporter = reporters.PdfReporter(_temp_filename(), http=http, url_cache=url_cache)
+            reporters.report_all([entry], [], [reporter])
+        self.assertEqual(http.urls, ['https://golang.org/LICENSE'])
+
+    def test_appendix_layout(self):
+        entries = _text_entries(['MIT', 'BSD', 'MIT', 'MIT'])
+        pages_filename = _temp_filename()
+        reporters.report_all(entries, [], [reporters.PdfReporter(pages_filename)])
+        appendix_filename = _temp_filename()
+        reporter = reporters.PdfReporter(appendix_filename, layout='appendix')
+        reporters.report_all(entries, entries[1:2], [reporter])
+
+        # The summary, the package list and one page for each of the two texts.
+        self.assertEqual(_page_count(pages_filename), 5)
+        self.assertEqual(_page_count(appendix_filename), 4)
+        with self.assertRaises(ValueError):
+            reporters.PdfReporter(appendix_filename, layout='other')
+
+    def test_chunked_volumes(self):
+        entries = _text_entries(['MIT', 'BSD', 'MIT', 'MIT', 'BSD'])
+        reporter = reporters.PdfReporter(_temp_filename() + ".pdf",
+                                         chunk_size=2,
+                                         volumes=True,
+                                         render_executor=ProcessPoolExecutor(2))
+        reporters.report_all(entries, [], [reporter])
+        filenames = reporter.volume_filenames(3)
+        self.assertTrue(filenames[0].endswith("-1.pdf"))
+        self.assertEqual([_page_count(filename) for filename in filenames], [3, 2, 1])
+        for filename in filenames:
+            os.remove(filename)
+
+    @unittest.skipIf(reporters.pypdf is None, "pypdf is not installed")
+    def test_chunks_are_merged(self):
+        filename = _temp_filename()
+        reporter = reporters.PdfReporter(filename, chunk_size=2)
+        reporters.report_all(_text_entries(['MIT', 'BSD', 'MIT', 'MIT', 'BSD']), [], [reporter])
+        self.assertEqual(len(reporters.pypdf.PdfReader(filename).pages), 6)
+
+    def test_chunks_are_merged_in_order(self):
+        filename = _temp_filename()
+        fake_pypdf = _FakePypdf()
+        original_pypdf = reporters.pypdf
+        reporters.pypdf = fake_pypdf
+        try:
+            reporter = reporters.PdfReporter(filename, chunk_size=2)
+            reporter.generate_report(_text_entries(['MIT', 'BSD', 'MIT', 'MIT', 'BSD']), set())
+        finally:
+            reporters.pypdf = original_pypdf
+        self.assertEqual([os.path.basename(part) for part in fake_pypdf.appended],
+                         ['part-0.pdf', 'part-1.pdf', 'part-2.pdf'])
+        self.assertEqual(fake_pypdf.page_counts, [3, 2, 1])
+        with open(filename) as merged_file:
+            self.assertEqual(merged_file.read(), 'merged')
+
+    def test_chunk_options(self):
+        with self.assertRaises(ValueError):
+            reporters.PdfReporter.check_options('pages', 0, True)
+        with self.assertRaises(ValueError):
+            reporters.PdfReporter.check_options('pages', None, True)
+        reporters.PdfReporter.check_options('pages', None, False)
+        if reporters.pypdf is None:
+            with self.assertRaises(ValueError):
+                reporters.PdfReporter.check_options('pages', 10, False)
+
+
+class TestReportAll(unittest.TestCase):
+
+    def test_reporters_run_concurrently(self):
+        http = _FakeHttp({'https://golang.org/LICENSE': ('text/plain', 'BSD text')})
+        entries = _text_entries(['MIT', 'BSD'])
+        entries.append(LicenseReportEntry(package='golang.org/x/sys',
+                                          license_name='Go Standard Library License',
+                                          license_url='https://golang.org/LICENSE'))
+        json_filename = _temp_filename()
+        pdf_filename = _temp_filename()
+        pdf_reporter = reporters.PdfReporter(pdf_filename, http=http)
+        self.assertEqual(pdf_reporter.workload(), reporters.WORKLOAD_CPU)
+        timings = reporters.report_all(entries, [], [reporters.JsonReporter(json_filename),
+                                                     pdf_reporter])
+
+        self.assertEqual(len(timings), 2)
+        self.assertEqual(http.urls, ['https://golang.org/LICENSE'])
+        self.assertEqual(_page_count(pdf_filename), 4)
+        with open(json_filename) as json_file:
+            self.assertEqual(len(json.load(json_file)['dependencies']), 3)
+
+    def test_small_reports_stay_in_process(self):
+        pid_filename = _temp_filename()
+        reporter = _PidReporter(pid_filename)
+        reporters.report_all(_text_entries(['MIT']), [],
+                             [reporter, reporters.JsonReporter(_temp_filename())])
+        self.assertEqual(reporter.pid(), os.getpid())
+
+        original_min_entries = reporters._MIN_ENTRIES_PER_PROCESS
+        reporters._MIN_ENTRIES_PER_PROCESS = 1
+        try:
+            reporters.report_all(_text_entries(['MIT']), [],
+                                 [reporter, reporters.JsonReporter(_temp_filename())])
+        finally:
+            reporters._MIN_ENTRIES_PER_PROCESS = original_min_entries
+        self.assertNotEqual(reporter.pid(), os.getpid())
+
+    def test_process_pool_size(self):
+        with reporters._process_pool(0) as processes:
+            self.assertIsNone(processes)
+        with reporters._process_pool(1) as processes:
+            self.assertEqual(processes._max_workers, 1)
+
+    def test_failures_are_isolated(self):
+        json_filename = _temp_filename()
+        with self.assertRaises(OSError):
+            reporters.report_all(_text_entries(['MIT']), [],
+                                 [_FailingReporter(), reporters.JsonReporter(json_filename)])
+        self.assertTrue(os.path.exists(json_filename))
+
+
+class _FailingReporter(reporters.Reporter):
+    def generate_report(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
+        raise OSError("disk full")
+
+
+class _PidReporter(reporters.Reporter):
+    # Records the process the report was generated in.
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def workload(self) -> str:
+        return reporters.WORKLOAD_CPU
+
+    def generate_report(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
+        with open(self.filename, 'w') as outfile:
+            outfile.write(str(os.getpid()))
+
+    def pid(self) -> int:
+        with open(self.filename) as infile:
+            return int(infile.read())
+
+
+class _FakePypdf:
+    # Stands in for the pypdf module, recording the parts it is asked to merge.
+    def __init__(self):
+        self.appended = []
+        self.page_counts = []
+
+    def PdfWriter(self):
+        return self
+
+    def append(self, filename: str):
+        self.appended.append(filename)
+        self.page_counts.append(_page_count(filename))
+
+    def write(self, outfile):
+        outfile.write(b'merged')
+
+
+class _FakeHttp:
+    def __init__(self, texts: Dict[str, Tuple[str, str]]):
+        self.texts = texts
+        self.urls = []
+
+    def get(self, url: str, headers: dict = None):
+        self.urls.append(url)
+        (content_type, text) = self.texts[url]
+        return _FakeResponse(200, {'Content-Type': content_type}, text)
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, headers: Dict, text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+
+def _text_entries(names: List[str]) -> List[LicenseReportEntry]:
+    texts = {name: base64.b64encode(b'%s text' % name.encode()).decode() for name in set(names)}
+    return [LicenseReportEntry(package='example.com/package%d' % i,
+                               license_name='%s License' % name,
+                               license_encoded=texts[name])
+            for (i, name) in enumerate(names)]
+
+def _page_count(filename: str) -> int:
+    with open(filename, 'rb') as pdf_file:
+        return pdf_file.read().count(b'/Type /Page\n')
+
 def _temp_filename() -> str:
     tf = tempfile.NamedTemporaryFile(prefix="/tmp/license-scanner-reporter-test")
     name = tf.name
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+import license_scanner.rules as rules
+
+from license_scanner.rules import RuleSet, load_rule_set
+
+
+class TestRuleSet(unittest.TestCase):
+    def setUp(self):
+        self.rules = {
+            "prefixes": [
+                {"prefix": "golang.org/x/tools", "license": "Tools", "url": "toolsurl"},
+                {"prefix": "golang.org", "license": "Go", "url": "gourl"},
+                {"prefix": "golang.org/x", "license": "Unused"}
+            ],
+            "mappings": {
+                "gotest.tools": "github.com/gotestyourself/gotest.tools"
+            }
+        }
+
+    def test_prefix_rules(self):
+        rule_set = RuleSet.from_json(self.rules)
+        self.assertEqual(rule_set.prefix_rule("golang.org/x/tools/cmd")['license'], "Tools")
+        self.assertEqual(rule_set.prefix_rule("golang.org/x/net")['license'], "Go")
+        self.assertIsNone(rule_set.prefix_rule("gopkg.in/yaml.v2"))
+        self.assertEqual(rule_set.prefixes(),
+                         ["golang.org/x/tools", "golang.org", "golang.org/x", "gotest.tools"])
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            RuleSet.from_json({"prefixes": [{"prefix": "golang.org"}]})
+        with self.assertRaises(ValueError):
+            RuleSet.from_json({"mappings": ["gotest.tools"]})
+
+    def test_load_json(self):
+        filename = _temp_filename() + ".json"
+        try:
+            with open(filename, 'w') as outfile:
+                json.dump(self.rules, outfile)
+            rule_set = load_rule_set(filename)
+            self.assertEqual(rule_set.prefix_rule("golang.org/x/net")['license'], "Go")
+            self.assertEqual(rule_set.mappings,
+                             {"gotest.tools": "github.com/gotestyourself/gotest.tools"})
+        finally:
+            _remove(filename)
+
+    @unittest.skipIf(rules.tomllib is None, "TOML is not supported by this Python")
+    def test_load_toml(self):
+        filename = _temp_filename() + ".toml"
+        try:
+            with open(filename, 'w') as outfile:
+                outfile.write('[[prefixes]]\n'
+                              'prefix = "gopkg.in"\n'
+                              'license = "GoPkg License"\n'
+                              '\n'
+                              '[mappings]\n'
+                              '"gotest.tools" = "github.com/gotestyourself/gotest.tools"\n')
+            rule_set = load_rule_set(filename)
+            self.assertEqual(rule_set.prefix_rule("gopkg.in/yaml.v2")['license'], "GoPkg License")
+            self.assertEqual(rule_set.mappings,
+                             {"gotest.tools": "github.com/gotestyourself/gotest.tools"})
+        finally:
+            _remove(filename)
+
+    def test_load_invalid_file(self):
+        filename = _temp_filename() + ".json"
+        try:
+            with open(filename, 'w') as outfile:
+                outfile.write('{"prefixes": [')
+            with self.assertRaises(ValueError):
+                load_rule_set(filename)
+        finally:
+            _remove(filename)
+
+
+def _temp_filename() -> str:
+    tf = tempfile.NamedTemporaryFile(prefix="/tmp/license-scanner-rules-test")
+    name = tf.name
+    tf.close()
+    return name
+
+def _remove(filename: str):
+    if os.path.exists(filename):
+        os.remove(filename)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List, Set
+
+import license_scanner.scanner as scanner
+from license_scanner.cache import LicenseReportEntry
+from license_scanner.dependancies import DependancyScanner
+from license_scanner.executors import ThreadPoolExecutor
+from license_scanner.recognizers import CommonPrefixRecognizer
+from license_scanner.reporters import Reporter
+
+
+class TestScanModules(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="/tmp/license-scanner-modules-test")
+        self.modules = {
+            "": [("mymit/package1", True), ("mybsd/package1", False)],
+            "services/one": [("mymit/package1", False), ("unknown/package", True)],
+            "services/two": [("mybsd/package1", False)],
+            "vendor/skipped": [("mymit/skipped", False)]
+        }
+        for module in self.modules:
+            os.makedirs(os.path.join(self.root, module), exist_ok=True)
+            with open(os.path.join(self.root, module, "go.mod"), "w") as outfile:
+                outfile.write("module example.com/%s\n" % module)
+        self.recognizer = _CountingRecognizer()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_scan_modules(self):
+        reporters = {}
+        combined_reporter = _RecordingReporter()
+        (entries, unaccepted, modules) = scanner.scan_modules(
+            self.root,
+            [_ModuleScanner(self.root, self.modules)],
+            [self.recognizer],
+            license_reporters=[combined_reporter],
+            module_reporters=lambda d: [reporters.setdefault(d, _RecordingReporter())],
+            executor=ThreadPoolExecutor(4))
+
+        self.assertEqual([e.package for e in entries],
+                         ["mybsd/package1", "mymit/package1", "unknown/package"])
+        self.assertEqual(sorted(self.recognizer.packages),
+                         ["mybsd/package1", "mymit/package1", "unknown/package"])
+        self.assertFalse(entries[1].dependancy_is_indirect)
+        self.assertTrue(entries[2].dependancy_is_indirect)
+        self.assertEqual(len(unaccepted), 3)
+        self.assertEqual(combined_reporter.packages, ["mybsd/package1", "mymit/package1",
+                                                      "unknown/package"])
+
+        one = os.path.join(self.root, "services/one")
+        self.assertEqual(sorted(modules.keys()),
+                         [self.root, one, os.path.join(self.root, "services/two")])
+        (module_entries, module_unaccepted) = modules[one]
+        self.assertEqual([(e.package, e.license_name, e.dependancy_is_indirect)
+                          for e in module_entries],
+                         [("mymit/package1", "MIT", False), ("unknown/package", None, True)])
+        self.assertEqual(len(module_unaccepted), 2)
+        self.assertEqual(reporters[one].packages, ["mymit/package1", "unknown/package"])
+        self.assertTrue(modules[self.root][0][1].dependancy_is_indirect)
+
+    def test_no_modules(self):
+        shutil.rmtree(self.root)
+        os.makedirs(self.root)
+        with self.assertRaises(RuntimeError):
+            scanner.scan_modules(self.root, [_ModuleScanner(self.root, {})], [self.recognizer])
+
+
+class _ModuleScanner(DependancyScanner):
+    def __init__(self, root: str, modules: dict):
+        self.root = root
+        self.modules = modules
+
+    def can_handle(self, directory: str) -> bool:
+        return True
+
+    def scan(self, directory: str) -> List[LicenseReportEntry]:
+        module = os.path.relpath(directory, self.root)
+        return [LicenseReportEntry(package=p, dependancy_is_indirect=i)
+                for (p, i) in self.modules["" if module == "." else module]]
+
+
+class _CountingRecognizer(CommonPrefixRecognizer):
+    def __init__(self):
+        CommonPrefixRecognizer.__init__(self, "mymit", "MIT", "miturl", None)
+        self.packages = []
+
+    def do_recognize(self, entry: LicenseReportEntry) -> bool:
+        self.packages.append(entry.package)
+        return CommonPrefixRecognizer.do_recognize(self, entry)
+
+    def prefixes(self) -> List[str]:
+        return None
+
+
+class _RecordingReporter(Reporter):
+    def __init__(self):
+        self.packages = None
+
+    def generate_report(self, entries: List[LicenseReportEntry], unaccepted_packages: Set[str]):
+        self.packages = [e.package for e in entries]
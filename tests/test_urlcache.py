@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from typing import Dict
+
+import requests
+
+from license_scanner.urlcache import UrlTextCache
+
+
+class TestUrlTextCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="/tmp/license-scanner-urlcache-test")
+        self.filename = os.path.join(self.directory, "urls.json")
+        self.http = _FakeHttp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_texts_are_read_once(self):
+        cache = UrlTextCache(self.filename, self.http)
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        self.assertEqual(len(self.http.requests), 1)
+        self.assertTrue(cache.save())
+        self.assertFalse(cache.save())
+
+        cache = UrlTextCache(self.filename, self.http)
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        self.assertEqual(len(self.http.requests), 1)
+
+    def test_expired_texts_are_revalidated(self):
+        cache = UrlTextCache(self.filename, self.http, max_age=0)
+        cache.read('https://example.com/LICENSE')
+        self.http.text = 'changed'
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        self.assertEqual(self.http.requests[1][1], {'If-None-Match': '"v1"'})
+
+        self.http.etag = '"v2"'
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'changed')
+
+    def test_failed_revalidations_use_the_cached_text(self):
+        cache = UrlTextCache(self.filename, self.http, max_age=0)
+        cache.read('https://example.com/LICENSE')
+        self.http.etag = '"v2"'
+        self.http.status_code = 503
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        self.http.error = requests.exceptions.ConnectionError('unreachable')
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'MIT text')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            cache.read('https://example.com/OTHER')
+
+        self.http.error = None
+        self.http.status_code = 200
+        self.http.text = 'changed'
+        self.assertEqual(cache.read('https://example.com/LICENSE'), 'changed')
+
+    def test_concurrent_reads_share_one_request(self):
+        cache = UrlTextCache(None, self.http)
+        self.http.delay = 0.1
+        threads = [threading.Thread(target=cache.read, args=('https://example.com/LICENSE',))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.http.requests), 1)
+
+    def test_bad_responses_are_not_cached(self):
+        cache = UrlTextCache(None, self.http)
+        self.http.content_type = 'text/html'
+        with self.assertRaises(ValueError):
+            cache.read('https://example.com/LICENSE')
+        self.http.status_code = 404
+        with self.assertRaises(ValueError):
+            cache.read('https://example.com/LICENSE')
+        self.assertEqual(len(self.http.requests), 2)
+        self.assertFalse(cache.save())
+
+
+class _FakeHttp:
+    def __init__(self):
+        self.requests = []
+        self.status_code = 200
+        self.content_type = 'text/plain; charset=utf-8'
+        self.text = 'MIT text'
+        self.etag = '"v1"'
+        self.delay = 0
+        self.error = None
+
+    def get(self, url: str, headers: Dict = None):
+        self.requests.append((url, headers))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        if headers is not None and headers.get('If-None-Match', None) == self.etag:
+            return _FakeResponse(304, {}, '')
+        return _FakeResponse(self.status_code,
+                             {'Content-Type': self.content_type, 'ETag': self.etag},
+                             self.text)
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, headers: Dict, text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text